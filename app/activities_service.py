@@ -1,28 +1,24 @@
 from fastapi import APIRouter, HTTPException, Query
 import boto3
-import json
-from decimal import Decimal
 from boto3.dynamodb.conditions import Key
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+from app.http_cache import CachedResponseRoute
+from app.pagination import MAX_PAGE_SIZE, build_projection, paginate, paginate_catalog, parse_fields
+from app.activity_catalog import activity_catalog
+from app.activity_loader import batch_get_activities
+from app.geo_index import geo_index
+from app.opening_hours import opening_hours_index
+from app.activity_projection import ACTIVITY_PROJECTION, FEES_PROJECTION, FastJSONResponse
 
-# Crear un router para este módulo
-router = APIRouter()
+# Crear un router para este módulo (respuestas con ETag, Cache-Control y compresión)
+router = APIRouter(route_class=CachedResponseRoute)
 
 # Cliente de DynamoDB
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('tutur-activities')
 
-# Función para convertir objetos Decimal a tipos serializables por JSON
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        # Convertir a entero o flotante según el caso
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    raise TypeError
-
 class ActivityRequest(BaseModel):
     principalId: str
 
@@ -31,45 +27,89 @@ class PrincipalIdsRequest(BaseModel):
     principalIds: List[str]  # Usar List en lugar de list
 
 
+# Campos que devuelven /all-activities y /get-activity
+ACTIVITY_FIELDS = ACTIVITY_PROJECTION.names
+
+
 @router.get("/all-activities")
-def get_all_activities():
+def get_all_activities(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma separated list of fields to return")
+):
     try:
-        # Escanear todos los registros en la tabla
-        response = table.scan()
-      
-        # Extraer solo los campos necesarios
-        filtered_items = []
-        for item in response['Items']:
-            
-            filtered_item = {
-                'principalId': item.get('principalId'),
-                'name': item.get('name', ''),
-                'totalScore': format(float(item.get('fees_redutotalScoreced_entrance_fee', 0)), '.2f') if item.get('totalScore') else '0.00',
-                'reviewsCount': item.get('reviewsCount', 0),
-                    'estimated_time': item.get('estimated_time'),
-                    'destinationId': item.get('destinationId'),
-                    'city': item.get('city'),
-                    'description': item.get('description'),
-                    'location_lat': item.get('location_lat'),
-                    'location_lng': item.get('location_lng'),
-                    'opening_hours': item.get('opening_hours'),
-                    's3Images': item.get('s3Images'),
-                    'fees_currency': item.get('fees_currency', ''),
-                    'fees_entrance_fee': format(float(item.get('fees_entrance_fee', 0)), '.2f') if item.get('fees_entrance_fee') else '0.00',
-                    'fees_reduced_entrance_fee': format(float(item.get('fees_reduced_entrance_fee', 0)), '.2f') if item.get('fees_reduced_entrance_fee') else '0.00'
-            }
-            filtered_items.append(filtered_item)
-           
-        # Convertir los objetos Decimal en la respuesta de DynamoDB
-        items = json.loads(json.dumps(filtered_items, default=decimal_default))
-        
-        return {'activities': items}
+        requested_fields = parse_fields(fields, allowed=ACTIVITY_FIELDS)
+
+        # Servir desde el catálogo en memoria y solo ir a DynamoDB si no está cargado
+        catalog_page = paginate_catalog(activity_catalog, limit=limit, cursor=cursor)
+        if catalog_page is not None:
+            raw_items, next_cursor = catalog_page
+        else:
+            # Pedir a DynamoDB solo los atributos necesarios para los campos solicitados
+            scan_params = build_projection(['principalId'] + requested_fields) if requested_fields else {}
+
+            # Escanear la tabla por páginas siguiendo LastEvaluatedKey
+            raw_items, next_cursor = paginate(table.scan, scan_params, limit=limit, cursor=cursor)
+
+        # Extraer solo los campos necesarios, ya en tipos JSON
+        items = ACTIVITY_PROJECTION.project_many(raw_items, requested_fields)
+
+        return FastJSONResponse({'activities': items, 'nextCursor': next_cursor})
     
+    except HTTPException as http_ex:
+        raise http_ex
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar DynamoDB: {str(e)}")
 
 
 
+@router.get("/nearby-activities")
+def get_nearby_activities(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radiusKm: float = Query(5.0, gt=0, le=50),
+    destinationId: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=200),
+    openAt: Optional[str] = Query(None, description="Only activities open at YYYY-MM-DD HH:MM:SS"),
+    durationMinutes: int = Query(60, ge=1, le=24 * 60),
+    fields: Optional[str] = Query(None, description="Comma separated list of fields to return")
+):
+    try:
+        requested_fields = parse_fields(fields, allowed=ACTIVITY_FIELDS)
+        open_at = None
+        if openAt:
+            try:
+                open_at = datetime.strptime(openAt, "%Y-%m-%d %H:%M:%S")
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=f"Invalid openAt. Use 'YYYY-MM-DD HH:MM:SS'. {ve}")
+
+        # El índice espacial se construye a partir del catálogo en memoria
+        if not geo_index.ready:
+            raise HTTPException(status_code=503, detail="Activity catalog not loaded yet")
+
+        results = geo_index.nearby(lat, lng, radiusKm, destination_id=destinationId, limit=None if open_at else limit)
+        if open_at is not None:
+            # Filtro vectorizado con los horarios compilados al cargar el catálogo
+            start_minute = open_at.hour * 60 + open_at.minute
+            is_open = opening_hours_index.open_during(
+                [item['principalId'] for item, _ in results], open_at.weekday(), start_minute, start_minute + durationMinutes
+            )
+            results = [result for result, open_now in zip(results, is_open) if open_now][:limit]
+        only = frozenset(requested_fields) if requested_fields else None
+        activities = []
+        for item, distance in results:
+            activity = ACTIVITY_PROJECTION.project(item, only)
+            activity['distanceKm'] = round(float(distance), 3)
+            activities.append(activity)
+
+        return FastJSONResponse({'activities': activities})
+
+    except HTTPException as http_ex:
+        raise http_ex
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar actividades cercanas: {str(e)}")
+
+
 @router.post("/get-activity")
 def get_activity_by_principal_id(request: ActivityRequest):
     try:
@@ -80,44 +120,27 @@ def get_activity_by_principal_id(request: ActivityRequest):
         if not principalId:
             raise HTTPException(status_code=400, detail="principalId is required")
 
+        # Buscar primero en el catálogo en memoria
+        cached_item = activity_catalog.get(principalId)
+        if cached_item is not None:
+            return FastJSONResponse({'activity': ACTIVITY_PROJECTION.project(cached_item)})
+
         # Realizar la consulta a DynamoDB
+        # La proyección usa alias para todos los atributos ("name" es palabra reservada en DynamoDB)
         response = table.query(
             KeyConditionExpression=Key('principalId').eq(principalId),
-            ProjectionExpression='principalId, #nm, totalScore, reviewsCount, estimated_time, destinationId, city, description, location_lat, location_lng, opening_hours, s3Images, fees_currency, fees_entrance_fee, fees_reduced_entrance_fee',
-            ExpressionAttributeNames={  # Se necesita usar alias para "name" ya que es una palabra reservada en DynamoDB
-                '#nm': 'name'
-            }
+            **build_projection(ACTIVITY_PROJECTION.attributes)
         )
         
         # Si no hay registros, devolver un error
         if 'Items' not in response or len(response['Items']) == 0:
             raise HTTPException(status_code=404, detail="Record not found")
         
-        item = response['Items'][0]
-        filtered_item = {
-                'principalId': item.get('principalId'),
-                'name': item.get('name', ''),
-                'totalScore': format(float(item.get('fees_redutotalScoreced_entrance_fee', 0)), '.2f') if item.get('totalScore') else '0.00',
-                'reviewsCount': item.get('reviewsCount', 0),
-                    'estimated_time': item.get('estimated_time'),
-                    'destinationId': item.get('destinationId'),
-                    'city': item.get('city'),
-                    'description': item.get('description'),
-                    'location_lat': item.get('location_lat'),
-                    'location_lng': item.get('location_lng'),
-                    'opening_hours': item.get('opening_hours'),
-                    's3Images': item.get('s3Images'),
-                    'fees_currency': item.get('fees_currency', ''),
-                    'fees_entrance_fee': format(float(item.get('fees_entrance_fee', 0)), '.2f') if item.get('fees_entrance_fee') else '0.00',
-                    'fees_reduced_entrance_fee': format(float(item.get('fees_reduced_entrance_fee', 0)), '.2f') if item.get('fees_reduced_entrance_fee') else '0.00'
-            }
-        
-        
-        # Devolver el primer registro encontrado, manejando los objetos Decimal
-        item = json.loads(json.dumps(filtered_item, default=decimal_default))
-        
-        return {'activity': item}
+        # Devolver el primer registro encontrado (la proyección convierte los Decimal)
+        return FastJSONResponse({'activity': ACTIVITY_PROJECTION.project(response['Items'][0])})
     
+    except HTTPException as http_ex:
+        raise http_ex
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar DynamoDB: {str(e)}")
     
@@ -131,35 +154,24 @@ def get_activities_by_principal_ids(request: PrincipalIdsRequest):
         if not principal_ids:
             raise HTTPException(status_code=400, detail="principalIds list is required")
         
-        # Realizar consultas individuales para cada principalId
-        result = []
-        for pid in principal_ids:
-            response = table.get_item(
-                Key={
-                    'principalId': pid.strip()  # Asegurarse de que principalId es una cadena
-                },
-                ProjectionExpression='principalId, #name, fees_currency, fees_entrance_fee, fees_reduced_entrance_fee',  # Utilizar alias para name
-                ExpressionAttributeNames={
-                    "#name": "name"  # Alias para el campo 'name' que es una palabra reservada en DynamoDB
-                }
-            )
-            item = response.get('Item')
-            if item:
-                # Crear un diccionario con los campos solicitados
-                formatted_item = {
-                    'principalId': item.get('principalId', ''),
-                    'name': item.get('name', ''),
-                    'fees_currency': item.get('fees_currency', ''),
-                    'fees_entrance_fee': format(float(item.get('fees_entrance_fee', 0)), '.2f') if item.get('fees_entrance_fee') else '0.00',
-                    'fees_reduced_entrance_fee': format(float(item.get('fees_reduced_entrance_fee', 0)), '.2f') if item.get('fees_reduced_entrance_fee') else '0.00'
-                }
-                result.append(formatted_item)
+        # Asegurarse de que cada principalId es una cadena sin espacios
+        principal_ids = [pid.strip() for pid in principal_ids]
+
+        # Resolver desde el catálogo en memoria y leer los faltantes en batch (chunks de 100 en paralelo)
+        items, missing_ids = activity_catalog.get_many(principal_ids)
+        if missing_ids:
+            items.update(batch_get_activities(missing_ids, attributes=FEES_PROJECTION.attributes))
+
+        # Mantener el orden de entrada del cliente
+        result = [FEES_PROJECTION.project(items[pid]) for pid in principal_ids if pid in items]
         
         if not result:
             raise HTTPException(status_code=404, detail="No records found for the provided principalIds")
         
         # Devolver los resultados en formato JSON
-        return {'activities': result}
+        return FastJSONResponse({'activities': result})
     
+    except HTTPException as http_ex:
+        raise http_ex
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar DynamoDB: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,235 @@
+import bisect
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+
+from app import config
+from app.activity_projection import decode_item
+from app.metrics import record_consumed_capacity
+
+
+class CatalogTooLarge(Exception):
+    pass
+
+
+class _ScanBudget:
+    # Límite de actividades y bytes compartido por todos los segmentos del scan: el primero
+    # que lo supera detiene a los demás en su siguiente página
+    def __init__(self, max_items, max_bytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = 0
+        self.size_bytes = 0
+        self._exceeded = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        if self._exceeded is not None:
+            raise CatalogTooLarge(self._exceeded)
+
+    def add(self, items, size_bytes):
+        with self._lock:
+            self.items += items
+            self.size_bytes += size_bytes
+            if self._exceeded is None:
+                if self.items > self.max_items:
+                    self._exceeded = f"El catálogo supera {self.max_items} actividades"
+                elif self.size_bytes > self.max_bytes:
+                    self._exceeded = f"El catálogo supera {self.max_bytes} bytes"
+        self.check()
+
+
+class CatalogSnapshot:
+    # Vista inmutable del catálogo: se reemplaza completa en cada refresco
+    def __init__(self, items, version, size_bytes):
+        self.version = version
+        self.size_bytes = size_bytes
+        self.loaded_at = datetime.now(timezone.utc)
+        self.by_principal_id = {item['principalId']: item for item in items if 'principalId' in item}
+        # Listas ordenadas por principalId (y sus claves) para paginar con bisect
+        self.principal_ids = sorted(self.by_principal_id)
+        self.items = [self.by_principal_id[principal_id] for principal_id in self.principal_ids]
+        self.by_destination = {}
+        self.destination_keys = {}
+        for principal_id, item in zip(self.principal_ids, self.items):
+            destination_id = item.get('destinationId')
+            if destination_id is not None:
+                self.by_destination.setdefault(destination_id, []).append(item)
+                self.destination_keys.setdefault(destination_id, []).append(principal_id)
+
+
+class ActivityCatalog:
+    def __init__(self, table_name, segments, refresh_seconds, max_items, max_bytes):
+        self.table_name = table_name
+        self.segments = segments
+        self.refresh_seconds = refresh_seconds
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._client = boto3.client('dynamodb', region_name='us-east-1')
+        self._snapshot = None
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+        self._listeners = []
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def ready(self):
+        return self._snapshot is not None
+
+    def add_listener(self, callback):
+        # callback(snapshot) se ejecuta tras cada carga exitosa del catálogo
+        if callback in self._listeners:
+            return
+        self._listeners.append(callback)
+        if self._snapshot is not None:
+            callback(self._snapshot)
+
+    def _scan_segment(self, segment, budget):
+        # (principalId, item, item serializado) de cada actividad del segmento
+        entries = []
+        params = {
+            'TableName': self.table_name, 'Segment': segment, 'TotalSegments': self.segments,
+            'ReturnConsumedCapacity': 'TOTAL'
+        }
+        while True:
+            budget.check()
+            response = self._client.scan(**params)
+            record_consumed_capacity('Scan', response)
+            page = []
+            for raw_item in response.get('Items', []):
+                item = decode_item(raw_item)
+                serialized = json.dumps(item, sort_keys=True, separators=(',', ':'))
+                page.append((str(item.get('principalId')), item, serialized))
+            budget.add(len(page), sum(len(serialized) + 1 for _, _, serialized in page))
+            entries.extend(page)
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return entries
+            params['ExclusiveStartKey'] = last_key
+
+    def load(self):
+        start_time = time.monotonic()
+
+        # Scan paralelo por segmentos: cada hilo recorre su segmento siguiendo LastEvaluatedKey
+        budget = _ScanBudget(self.max_items, self.max_bytes)
+        with ThreadPoolExecutor(max_workers=self.segments, thread_name_prefix="tutur-catalog") as executor:
+            segments = list(executor.map(lambda segment: self._scan_segment(segment, budget), range(self.segments)))
+        entries = [entry for segment_entries in segments for entry in segment_entries]
+
+        # La versión es un hash del contenido: estable entre refrescos e instancias si nada cambió.
+        # Equivale a serializar la lista ordenada, reutilizando lo serializado durante el scan
+        entries.sort(key=lambda entry: entry[0])
+        serialized = '[' + ','.join(serialized for _, _, serialized in entries) + ']'
+        version = hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+        items = [item for _, item, _ in entries]
+
+        snapshot = CatalogSnapshot(items, version, len(serialized))
+
+        # Los índices derivados (geo, destinos, horarios) se reconstruyen antes de publicar el
+        # snapshot: el ETag de /v1/tutur/info usa su versión, y una respuesta armada con los
+        # índices anteriores no debe quedar cacheada bajo la versión nueva
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error al notificar la recarga del catálogo: {e}")
+
+        # Reemplazo atómico de la referencia: los lectores ven el snapshot anterior o el nuevo
+        self._snapshot = snapshot
+
+        print(f"Catálogo cargado: {len(items)} actividades en {time.monotonic() - start_time:.2f} segundos")
+        return snapshot
+
+    def _next_refresh_delay(self):
+        # Si aún no hay catálogo (falló la carga inicial) reintentar antes
+        return self.refresh_seconds if self.ready else min(60, self.refresh_seconds)
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self._next_refresh_delay()):
+            try:
+                self.load()
+            except Exception as e:
+                # Se conserva el snapshot anterior si la recarga falla
+                print(f"Error al refrescar el catálogo de actividades: {e}")
+
+    def start_background_refresh(self):
+        if self._refresh_thread is not None:
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="tutur-catalog-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._refresh_thread = None
+
+    def get(self, principal_id):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return snapshot.by_principal_id.get(principal_id)
+
+    def get_many(self, principal_ids):
+        # Devuelve (encontrados por principalId, ids que hay que buscar en DynamoDB)
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {}, list(principal_ids)
+        found = {}
+        missing = []
+        for principal_id in principal_ids:
+            item = snapshot.by_principal_id.get(principal_id)
+            if item is None:
+                missing.append(principal_id)
+            else:
+                found[principal_id] = item
+        return found, missing
+
+    def list_page(self, destination_id=None, limit=None, after_principal_id=None):
+        # (página ordenada por principalId, último principalId, versión); None si el catálogo
+        # no puede responder
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if destination_id is None:
+            items, keys = snapshot.items, snapshot.principal_ids
+        else:
+            items = snapshot.by_destination.get(destination_id)
+            keys = snapshot.destination_keys.get(destination_id)
+            if not items:
+                return None
+
+        start = bisect.bisect_right(keys, after_principal_id) if after_principal_id is not None else 0
+        end = start + limit if limit else len(items)
+        page_items = items[start:end]
+        last_principal_id = page_items[-1]['principalId'] if page_items and end < len(items) else None
+        return page_items, last_principal_id, snapshot.version
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {'ready': False}
+        return {
+            'ready': True,
+            'version': snapshot.version,
+            'activities': len(snapshot.by_principal_id),
+            'destinations': len(snapshot.by_destination),
+            'sizeBytes': snapshot.size_bytes,
+            'loadedAt': snapshot.loaded_at.isoformat(),
+        }
+
+
+activity_catalog = ActivityCatalog(
+    table_name=config.ACTIVITIES_TABLE,
+    segments=config.CATALOG_SCAN_SEGMENTS,
+    refresh_seconds=config.CATALOG_REFRESH_SECONDS,
+    max_items=config.CATALOG_MAX_ITEMS,
+    max_bytes=config.CATALOG_MAX_BYTES
+)
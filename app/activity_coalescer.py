@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+from app import config
+from app.async_utils import run_blocking
+
+
+class CoalescingActivityLoader:
+    # Estilo DataLoader: junta las claves pedidas por todas las peticiones en vuelo durante
+    # una ventana corta y las resuelve con una sola lectura deduplicada
+    def __init__(self, fetch, window_ms=config.COALESCE_WINDOW_MS, max_batch=config.COALESCE_MAX_BATCH):
+        self.fetch = fetch
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending = {}
+        self._flush_handle = None
+        self._stats_lock = threading.Lock()
+        self.loads = 0
+        self.batches = 0
+        self.keys_requested = 0
+        self.keys_fetched = 0
+        self.max_batch_seen = 0
+
+    async def load_many(self, principal_ids):
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for principal_id in dict.fromkeys(principal_ids):
+            future = self._pending.get(principal_id)
+            if future is None:
+                future = loop.create_future()
+                self._pending[principal_id] = future
+            futures[principal_id] = future
+
+        with self._stats_lock:
+            self.loads += 1
+            self.keys_requested += len(futures)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._pending and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+
+        # shield: si una petición se cancela no debe cancelar el futuro compartido con otras
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return {
+            principal_id: item
+            for principal_id, item in zip(futures, results)
+            if item is not None
+        }
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        with self._stats_lock:
+            self.batches += 1
+            self.keys_fetched += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        try:
+            items = await run_blocking(self.fetch, list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for principal_id, future in batch.items():
+            if not future.done():
+                future.set_result(items.get(principal_id))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'windowMs': self.window_seconds * 1000,
+                'maxBatch': self.max_batch,
+                'loads': self.loads,
+                'batches': self.batches,
+                'keysRequested': self.keys_requested,
+                'keysFetched': self.keys_fetched,
+                'avgBatchSize': round(self.keys_fetched / self.batches, 2) if self.batches else 0.0,
+                'maxBatchSize': self.max_batch_seen,
+                # Claves pedidas por las peticiones / claves realmente leídas de DynamoDB
+                'coalescingRatio': round(self.keys_requested / self.keys_fetched, 3) if self.keys_fetched else 0.0,
+            }
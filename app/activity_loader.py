@@ -0,0 +1,74 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from app import config
+from app.activity_projection import decode_item
+from app.metrics import record_consumed_capacity
+from app.pagination import build_projection
+
+# Límite de claves por llamada a batch_get_item impuesto por DynamoDB
+BATCH_GET_LIMIT = 100
+
+dynamodb = boto3.client('dynamodb', region_name='us-east-1')
+
+# Executor propio para los chunks: no comparte hilos con quien llama (evita bloqueos mutuos)
+_chunk_executor = ThreadPoolExecutor(max_workers=config.BATCH_GET_THREADS, thread_name_prefix="tutur-batch-get")
+
+
+class UnprocessedKeysError(Exception):
+    pass
+
+
+def _backoff(attempt):
+    # Backoff exponencial con "full jitter"
+    ceiling = min(config.BATCH_GET_BACKOFF_MAX_SECONDS, config.BATCH_GET_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    time.sleep(random.uniform(0, ceiling))
+
+
+def _fetch_chunk(principal_ids, attributes):
+    table_request = {'Keys': [{'principalId': {'S': principal_id}} for principal_id in principal_ids]}
+    if attributes:
+        table_request.update(build_projection(attributes))
+    request_items = {config.ACTIVITIES_TABLE: table_request}
+
+    items = []
+    attempt = 0
+    while True:
+        response = dynamodb.batch_get_item(RequestItems=request_items, ReturnConsumedCapacity='TOTAL')
+        record_consumed_capacity('BatchGetItem', response)
+        items.extend(response.get('Responses', {}).get(config.ACTIVITIES_TABLE, []))
+
+        # DynamoDB devuelve en UnprocessedKeys lo que no pudo leer por throttling o tamaño
+        unprocessed = response.get('UnprocessedKeys') or {}
+        if not unprocessed.get(config.ACTIVITIES_TABLE, {}).get('Keys'):
+            return items
+
+        attempt += 1
+        if attempt > config.BATCH_GET_MAX_RETRIES:
+            pending = len(unprocessed[config.ACTIVITIES_TABLE]['Keys'])
+            raise UnprocessedKeysError(f"{pending} claves sin procesar tras {config.BATCH_GET_MAX_RETRIES} reintentos")
+        _backoff(attempt)
+        request_items = unprocessed
+
+
+def batch_get_activities(principal_ids, attributes=None):
+    # Devuelve {principalId: item} leyendo en chunks de 100 claves en paralelo
+    unique_ids = list(dict.fromkeys(principal_id for principal_id in principal_ids if principal_id))
+    if not unique_ids:
+        return {}
+
+    chunks = [unique_ids[i:i + BATCH_GET_LIMIT] for i in range(0, len(unique_ids), BATCH_GET_LIMIT)]
+    if len(chunks) == 1:
+        raw_chunks = [_fetch_chunk(chunks[0], attributes)]
+    else:
+        raw_chunks = list(_chunk_executor.map(lambda chunk: _fetch_chunk(chunk, attributes), chunks))
+
+    items = {}
+    for raw_items in raw_chunks:
+        for raw_item in raw_items:
+            item = decode_item(raw_item)
+            items[item['principalId']] = item
+    return items
@@ -0,0 +1,167 @@
+import json
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el serializador estándar
+    orjson = None
+
+
+def _json_default(value):
+    # Solo se llama para tipos que el serializador no conoce (un Decimal que se escapó de la proyección)
+    converted = to_json_value(value)
+    if converted is value:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return converted
+
+
+class FastJSONResponse(JSONResponse):
+    # Para datos ya proyectados: los endpoints la devuelven directamente, así FastAPI no recorre
+    # el contenido con jsonable_encoder, y se serializa con orjson si está instalado
+    def render(self, content):
+        if orjson is None:
+            return json.dumps(
+                content, ensure_ascii=False, allow_nan=False, separators=(',', ':'), default=_json_default
+            ).encode('utf-8')
+        return orjson.dumps(content, default=_json_default)
+
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _decode_map(value):
+    return {key: decode_value(raw) for key, raw in value.items()}
+
+
+def _decode_list(value):
+    return [decode_value(raw) for raw in value]
+
+
+_DECODERS = {
+    'S': lambda value: value,
+    'N': _number,
+    'BOOL': lambda value: value,
+    'NULL': lambda value: None,
+    'M': _decode_map,
+    'L': _decode_list,
+    'SS': list,
+    'NS': lambda value: [_number(number) for number in value],
+    'B': lambda value: value,
+    'BS': list,
+}
+
+
+def decode_value(raw):
+    # {'N': '4.5'} -> 4.5: directamente a tipos JSON, sin pasar por Decimal
+    (type_name, value), = raw.items()
+    return _DECODERS[type_name](value)
+
+
+def decode_item(raw_item):
+    # Item de bajo nivel de DynamoDB ({'S': ..}, {'N': ..}) -> dict listo para serializar
+    return {key: decode_value(raw) for key, raw in raw_item.items()}
+
+
+def to_json_value(value):
+    # Items del recurso de boto3 (Decimal, sets) -> tipos JSON; el resto se devuelve tal cual
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    if isinstance(value, dict):
+        return {key: to_json_value(inner) for key, inner in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(inner) for inner in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((to_json_value(inner) for inner in value), key=str)
+    return value
+
+
+def _money(value):
+    return format(float(value), '.2f') if value else '0.00'
+
+
+class Projection:
+    # Lista fija de (campo de salida, atributo, conversión, valor por defecto) que se recorre
+    # por item; attributes es la ProjectionExpression necesaria para leer solo esos campos
+    def __init__(self, fields, always=('principalId',)):
+        self.fields = tuple(fields)
+        self.always = frozenset(always)
+        self.names = [output for output, _, _, _ in self.fields]
+        self.attributes = list(dict.fromkeys(attribute for _, attribute, _, _ in self.fields))
+
+    def project(self, item, only=None):
+        get = item.get
+        result = {}
+        for output, attribute, convert, default in self.fields:
+            if only is not None and output not in only and output not in self.always:
+                continue
+            value = get(attribute, default)
+            result[output] = convert(value) if convert is not None else value
+        return result
+
+    def project_many(self, items, only=None):
+        only = frozenset(only) if only else None
+        return [self.project(item, only) for item in items]
+
+
+# /all-activities, /get-activity y /nearby-activities
+ACTIVITY_PROJECTION = Projection([
+    ('principalId', 'principalId', None, None),
+    ('name', 'name', None, ''),
+    ('totalScore', 'totalScore', _money, None),
+    ('reviewsCount', 'reviewsCount', to_json_value, 0),
+    ('estimated_time', 'estimated_time', None, None),
+    ('destinationId', 'destinationId', None, None),
+    ('city', 'city', None, None),
+    ('description', 'description', None, None),
+    ('location_lat', 'location_lat', to_json_value, None),
+    ('location_lng', 'location_lng', to_json_value, None),
+    ('opening_hours', 'opening_hours', None, None),
+    ('s3Images', 's3Images', to_json_value, None),
+    ('fees_currency', 'fees_currency', None, ''),
+    ('fees_entrance_fee', 'fees_entrance_fee', _money, None),
+    ('fees_reduced_entrance_fee', 'fees_reduced_entrance_fee', _money, None),
+])
+
+# /activities-by-principal-ids
+FEES_PROJECTION = Projection([
+    ('principalId', 'principalId', None, ''),
+    ('name', 'name', None, ''),
+    ('fees_currency', 'fees_currency', None, ''),
+    ('fees_entrance_fee', 'fees_entrance_fee', _money, None),
+    ('fees_reduced_entrance_fee', 'fees_reduced_entrance_fee', _money, None),
+])
+
+# Atributos que lee el enriquecimiento de los itinerarios generados
+ENRICHMENT_ATTRIBUTES = [
+    'principalId', 'description', 'location_lat', 'location_lng', 'totalScore', 'reviewsCount',
+    'estimated_time', 'opening_hours', 's3Images', 'destinationId', 'city'
+]
+
+
+def format_enrichment_item(item):
+    s3_images = item.get('s3Images') or {}
+    return {
+        'principalId': item['principalId'],
+        'description': item.get('description', ''),
+        'coordinates': {
+            'latitude': float(item.get('location_lat', 0.0)),
+            'longitude': float(item.get('location_lng', 0.0))
+        },
+        'totalScore': float(item.get('totalScore', 0.0)),
+        'reviewsCount': int(item.get('reviewsCount', 0)),
+        'estimated_time': item.get('estimated_time', ''),
+        'opening_hours': item.get('opening_hours', ''),
+        's3Images': {
+            's3MainImageUrl': s3_images.get('s3MainImageUrl', ''),
+            's3DetailImageUrl': s3_images.get('s3DetailImageUrl', ''),
+            's3ExpandImageUrl': s3_images.get('s3ExpandImageUrl', '')
+        },
+        'destinationId': item.get('destinationId', ''),
+        'destination': item.get('city', '')
+    }
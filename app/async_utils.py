@@ -0,0 +1,31 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+
+# Executor propio para las librerías sin soporte asyncio (boto3, psycopg2).
+# Así las llamadas cortas a DynamoDB/Postgres no compiten con el threadpool de Starlette
+# y el event loop nunca se bloquea mientras esperamos la respuesta del LLM.
+blocking_executor = ThreadPoolExecutor(
+    max_workers=config.BLOCKING_IO_THREADS,
+    thread_name_prefix="tutur-io"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
+
+
+def submit_background(func, *args, **kwargs):
+    # Ejecutar una tarea "fire and forget" registrando cualquier error en lugar de perderlo
+    future = blocking_executor.submit(func, *args, **kwargs)
+
+    def _log_error(done):
+        error = done.exception()
+        if error is not None:
+            print(f"Error en tarea en segundo plano {getattr(func, '__name__', func)}: {error}")
+
+    future.add_done_callback(_log_error)
+    return future
@@ -0,0 +1,122 @@
+import os
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Caché de itinerarios generados por el LLM (/generate-guide)
+GUIDE_CACHE_ENABLED = _env_bool("TUTUR_GUIDE_CACHE_ENABLED", True)
+GUIDE_CACHE_MAX_ENTRIES = int(os.getenv("TUTUR_GUIDE_CACHE_MAX_ENTRIES", "512"))
+GUIDE_CACHE_TTL_SECONDS = int(os.getenv("TUTUR_GUIDE_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+# Ruta opcional de un archivo SQLite para el nivel en disco (vacío = solo memoria)
+GUIDE_CACHE_DISK_PATH = os.getenv("TUTUR_GUIDE_CACHE_DISK_PATH", "")
+
+# Hilos dedicados a llamadas bloqueantes (boto3, psycopg2) desde el código async
+BLOCKING_IO_THREADS = int(os.getenv("TUTUR_BLOCKING_IO_THREADS", "32"))
+
+# Modo de trabajos asíncronos (/generate-guide/jobs)
+GUIDE_JOB_WORKERS = int(os.getenv("TUTUR_GUIDE_JOB_WORKERS", "8"))
+GUIDE_JOB_MAX_QUEUE = int(os.getenv("TUTUR_GUIDE_JOB_MAX_QUEUE", "100"))
+GUIDE_JOB_TTL_SECONDS = int(os.getenv("TUTUR_GUIDE_JOB_TTL_SECONDS", str(60 * 60)))
+# "memory" o "postgres" (tabla iti.guide_jobs)
+GUIDE_JOB_STORE = os.getenv("TUTUR_GUIDE_JOB_STORE", "memory")
+# Trabajos 'queued'/'running' sin actualizar desde hace más de esto al arrancar: su instancia murió
+GUIDE_JOB_STALE_SECONDS = int(os.getenv("TUTUR_GUIDE_JOB_STALE_SECONDS", str(15 * 60)))
+
+# Catálogo de actividades en memoria (tabla tutur-activities)
+ACTIVITIES_TABLE = os.getenv("TUTUR_ACTIVITIES_TABLE", "tutur-activities")
+CATALOG_ENABLED = _env_bool("TUTUR_CATALOG_ENABLED", True)
+CATALOG_SCAN_SEGMENTS = int(os.getenv("TUTUR_CATALOG_SCAN_SEGMENTS", "4"))
+CATALOG_REFRESH_SECONDS = int(os.getenv("TUTUR_CATALOG_REFRESH_SECONDS", str(60 * 60)))
+CATALOG_MAX_ITEMS = int(os.getenv("TUTUR_CATALOG_MAX_ITEMS", "50000"))
+CATALOG_MAX_BYTES = int(os.getenv("TUTUR_CATALOG_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Lecturas batch_get_item de actividades
+BATCH_GET_THREADS = int(os.getenv("TUTUR_BATCH_GET_THREADS", "8"))
+BATCH_GET_MAX_RETRIES = int(os.getenv("TUTUR_BATCH_GET_MAX_RETRIES", "6"))
+BATCH_GET_BACKOFF_BASE_SECONDS = float(os.getenv("TUTUR_BATCH_GET_BACKOFF_BASE_SECONDS", "0.05"))
+BATCH_GET_BACKOFF_MAX_SECONDS = float(os.getenv("TUTUR_BATCH_GET_BACKOFF_MAX_SECONDS", "2"))
+
+# Agrupación de lecturas de actividades entre peticiones concurrentes
+COALESCE_WINDOW_MS = float(os.getenv("TUTUR_COALESCE_WINDOW_MS", "5"))
+COALESCE_MAX_BATCH = int(os.getenv("TUTUR_COALESCE_MAX_BATCH", "300"))
+
+# Índice agregado de destinos y países (/all-destinations, /country-codes)
+# Ruta opcional de un archivo JSON para persistir el índice entre reinicios
+DESTINATION_INDEX_PATH = os.getenv("TUTUR_DESTINATION_INDEX_PATH", "")
+
+# Caché HTTP de los routers /v1/tutur/info
+HTTP_CACHE_MAX_AGE_SECONDS = int(os.getenv("TUTUR_HTTP_CACHE_MAX_AGE_SECONDS", "300"))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("TUTUR_HTTP_CACHE_MAX_ENTRIES", "256"))
+HTTP_COMPRESSION_MIN_BYTES = int(os.getenv("TUTUR_HTTP_COMPRESSION_MIN_BYTES", "1024"))
+
+# Regla de distancia entre actividades de un mismo día
+MAX_ACTIVITY_DISTANCE_KM = float(os.getenv("TUTUR_MAX_ACTIVITY_DISTANCE_KM", "5"))
+REPAIR_DISTANCE_VIOLATIONS = _env_bool("TUTUR_REPAIR_DISTANCE_VIOLATIONS", True)
+
+# Recuperación de contexto para el LLM
+VECTOR_STORE = os.getenv("TUTUR_VECTOR_STORE", "pinecone")  # "pinecone" o "local"
+RETRIEVAL_FILTER_ENABLED = _env_bool("TUTUR_RETRIEVAL_FILTER_ENABLED", True)
+RETRIEVAL_TOP_K = int(os.getenv("TUTUR_RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_FETCH_K = int(os.getenv("TUTUR_RETRIEVAL_FETCH_K", "24"))
+RETRIEVAL_DESTINATION_FIELD = os.getenv("TUTUR_RETRIEVAL_DESTINATION_FIELD", "destinationId")
+RETRIEVAL_CITY_FIELD = os.getenv("TUTUR_RETRIEVAL_CITY_FIELD", "city")
+RETRIEVAL_CATEGORY_FIELD = os.getenv("TUTUR_RETRIEVAL_CATEGORY_FIELD", "category")
+
+# Caché de recuperación: embeddings de la consulta y resultados top-k
+RETRIEVAL_CACHE_ENABLED = _env_bool("TUTUR_RETRIEVAL_CACHE_ENABLED", True)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("TUTUR_EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+EMBEDDING_CACHE_DISK_PATH = os.getenv("TUTUR_EMBEDDING_CACHE_DISK_PATH", "")
+EMBEDDING_CACHE_DISK_MAX_ROWS = int(os.getenv("TUTUR_EMBEDDING_CACHE_DISK_MAX_ROWS", "100000"))
+RETRIEVAL_RESULTS_CACHE_MAX_ENTRIES = int(os.getenv("TUTUR_RETRIEVAL_RESULTS_CACHE_MAX_ENTRIES", "1024"))
+RETRIEVAL_RESULTS_CACHE_TTL_SECONDS = int(os.getenv("TUTUR_RETRIEVAL_RESULTS_CACHE_TTL_SECONDS", "900"))
+
+# Planificador local: "off", "fallback" (si el LLM falla o excede el timeout) o "primary"
+PLANNER_MODE = os.getenv("TUTUR_PLANNER_MODE", "fallback")
+LLM_TIMEOUT_SECONDS = float(os.getenv("TUTUR_LLM_TIMEOUT_SECONDS", "45"))
+# Salida estructurada del LLM (response_format con el esquema JSON del itinerario)
+LLM_STRUCTURED_OUTPUT = _env_bool("TUTUR_LLM_STRUCTURED_OUTPUT", True)
+
+# Generación por lotes (/generate-guides/batch)
+BATCH_MAX_REQUESTS = int(os.getenv("TUTUR_BATCH_MAX_REQUESTS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("TUTUR_BATCH_CONCURRENCY", "8"))
+
+# Reserva de IDs de itinerario por bloques de la secuencia
+ID_ALLOCATOR_ENABLED = _env_bool("TUTUR_ID_ALLOCATOR_ENABLED", True)
+ID_BLOCK_SIZE = int(os.getenv("TUTUR_ID_BLOCK_SIZE", "100"))
+ID_BLOCK_LOW_WATERMARK = int(os.getenv("TUTUR_ID_BLOCK_LOW_WATERMARK", "25"))
+
+# Cola de persistencia write-behind para iti.client_itineraries
+PERSIST_QUEUE_ENABLED = _env_bool("TUTUR_PERSIST_QUEUE_ENABLED", True)
+PERSIST_QUEUE_MAX = int(os.getenv("TUTUR_PERSIST_QUEUE_MAX", "1000"))
+PERSIST_WORKERS = int(os.getenv("TUTUR_PERSIST_WORKERS", "2"))
+PERSIST_BATCH_SIZE = int(os.getenv("TUTUR_PERSIST_BATCH_SIZE", "50"))
+PERSIST_FLUSH_INTERVAL_MS = int(os.getenv("TUTUR_PERSIST_FLUSH_INTERVAL_MS", "200"))
+PERSIST_MAX_RETRIES = int(os.getenv("TUTUR_PERSIST_MAX_RETRIES", "5"))
+PERSIST_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("TUTUR_PERSIST_ENQUEUE_TIMEOUT_SECONDS", "5"))
+PERSIST_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("TUTUR_PERSIST_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+
+# Pool de conexiones a Postgres
+DB_POOL_MIN = int(os.getenv("TUTUR_DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("TUTUR_DB_POOL_MAX", "10"))
+DB_POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("TUTUR_DB_POOL_ACQUIRE_TIMEOUT_SECONDS", "5"))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("TUTUR_DB_POOL_HEALTH_CHECK_SECONDS", "30"))
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("TUTUR_DB_CONNECT_TIMEOUT_SECONDS", "5"))
+
+# Lectura de itinerarios guardados (/itineraries, /clients/{clientId}/itineraries)
+ITINERARY_CACHE_MAX_ENTRIES = int(os.getenv("TUTUR_ITINERARY_CACHE_MAX_ENTRIES", "2048"))
+ITINERARY_CACHE_TTL_SECONDS = int(os.getenv("TUTUR_ITINERARY_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+ITINERARY_PAGE_SIZE = int(os.getenv("TUTUR_ITINERARY_PAGE_SIZE", "20"))
+ITINERARY_MAX_PAGE_SIZE = int(os.getenv("TUTUR_ITINERARY_MAX_PAGE_SIZE", "100"))
+
+# Secretos de AWS Secrets Manager (caché en proceso) y arranque
+SECRETS_REGION = os.getenv("TUTUR_SECRETS_REGION", "us-east-1")
+SECRETS_TTL_SECONDS = int(os.getenv("TUTUR_SECRETS_TTL_SECONDS", "3600"))
+PINECONE_SECRET_NAME = os.getenv("TUTUR_PINECONE_SECRET_NAME", "pinecone-tutur-test")
+OPENAI_SECRET_NAME = os.getenv("TUTUR_OPENAI_SECRET_NAME", "gpt-tutur-test")
+DB_SECRET_NAME = os.getenv("TUTUR_DB_SECRET_NAME", "rds!db-68ff39fd-1e78-4126-b204-763b8e165933")
+WARMUP_ENABLED = _env_bool("TUTUR_WARMUP_ENABLED", True)
@@ -1,25 +1,16 @@
 from fastapi import APIRouter, HTTPException
-import boto3
-import json
+from app.http_cache import CachedResponseRoute
+from app.destination_index import destination_index
 
-# Crear un router para este módulo
-router = APIRouter()
-
-# Cliente de DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('tutur-activities')
+# Crear un router para este módulo (respuestas con ETag, Cache-Control y compresión)
+router = APIRouter(route_class=CachedResponseRoute)
 
 @router.get("/country-codes")
 def get_country_codes():
     try:
-        # Consultar usando el GSI de countryCode
-        response = table.scan(
-            IndexName='CountryCodeIndex',
-            ProjectionExpression='countryCode'
-        )
-        
-        # Obtener los códigos únicos de país
-        country_codes = set([item['countryCode'] for item in response['Items']])
+        # Obtener los códigos únicos de país desde el índice agregado de destinos
+        destination_index.ensure_ready()
+        country_codes = destination_index.country_codes()
         
         return {'countryCodes': list(country_codes)}
     
@@ -1,41 +1,237 @@
+import threading
+import time
+from collections import deque
+
 import psycopg2
-from psycopg2 import pool
-from app.secrets import get_secret
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from app import config
+from app.secrets import secret_cache
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class BoundedConnectionPool:
+    # Pool seguro entre hilos: si no hay conexiones libres se espera hasta el timeout en lugar
+    # de fallar; las conexiones inactivas se verifican antes de reutilizarse y las que quedan
+    # rotas o en mitad de una transacción fallida se descartan al devolverse.
+    # getconn bloquea: desde asyncio debe llamarse a través de run_blocking.
+    def __init__(self, minconn, maxconn, acquire_timeout, health_check_seconds, connect):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check_seconds = health_check_seconds
+        self.connect = connect
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _connect(self):
+        conn = self.connect()
+        with self._cond:
+            self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.recycled += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_seconds:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        # Abre las conexiones mínimas por adelantado
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.maxconn:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise PoolTimeout(f"No hay conexiones libres tras {timeout} segundos")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                if self._idle:
+                    # LIFO: la conexión usada más recientemente es la que menos probabilidad tiene de estar caída
+                    conn, idle_since = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use += 1
+                self.acquisitions += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            self._in_use -= 1
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                # Transacción abierta o fallida: rollback antes de reutilizarla, o descartarla
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+        if close or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'inUse': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'minConnections': self.minconn,
+                'maxConnections': self.maxconn,
+                'acquisitions': self.acquisitions,
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'recycled': self.recycled,
+                'avgWaitMs': round(self.wait_seconds / self.acquisitions * 1000, 2) if self.acquisitions else 0.0,
+                'maxWaitMs': round(self.max_wait_seconds * 1000, 2),
+            }
+
+
+def _is_auth_error(error):
+    return 'password authentication failed' in str(error)
+
 
 class Database:
-    def __init__(self, db_config):
-        # Crear un pool de conexiones para reutilizar las conexiones
-        self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,  # Puedes ajustar el número máximo de conexiones según tus necesidades
-            host=db_config['host'],
-            database=db_config['database'],
-            user=db_config['user'],
-            password=db_config['password']
+    def __init__(self, secret_name, host, database):
+        # Las credenciales se resuelven al abrir la primera conexión, no al importar el módulo
+        self.secret_name = secret_name
+        self.host = host
+        self.database = database
+        # Pool de conexiones compartido por los hilos de peticiones y de escritura en segundo plano
+        self.connection_pool = BoundedConnectionPool(
+            minconn=config.DB_POOL_MIN,
+            maxconn=config.DB_POOL_MAX,
+            acquire_timeout=config.DB_POOL_ACQUIRE_TIMEOUT_SECONDS,
+            health_check_seconds=config.DB_POOL_HEALTH_CHECK_SECONDS,
+            connect=self._connect
         )
 
+    def _connect(self):
+        try:
+            return self._open(secret_cache.get(self.secret_name))
+        except psycopg2.OperationalError as e:
+            # Credenciales rotadas en Secrets Manager: releer el secreto y reintentar una vez
+            if not _is_auth_error(e) or not secret_cache.refresh(self.secret_name):
+                raise
+            return self._open(secret_cache.get(self.secret_name))
+
+    def _open(self, secret):
+        return psycopg2.connect(
+            host=self.host,
+            database=self.database,
+            user=secret.get('username'),
+            password=secret.get('password'),
+            connect_timeout=config.DB_CONNECT_TIMEOUT_SECONDS
+        )
+
+    def warm(self):
+        # Abrir las conexiones mínimas del pool antes de la primera petición
+        self.connection_pool.warm()
+
     def get_connection(self):
-        # Obtener una conexión del pool
+        # Obtener una conexión del pool (espera hasta el timeout si están todas en uso)
         return self.connection_pool.getconn()
 
-    def release_connection(self, conn):
-        # Liberar la conexión de vuelta al pool
-        self.connection_pool.putconn(conn)
+    def release_connection(self, conn, close=False):
+        # Liberar la conexión de vuelta al pool; close=True la descarta
+        self.connection_pool.putconn(conn, close=close)
 
     def close_all_connections(self):
         # Cerrar todas las conexiones cuando la aplicación termina
         self.connection_pool.closeall()
 
-db_secret = get_secret("rds!db-68ff39fd-1e78-4126-b204-763b8e165933")
-# Configuración de la base de datos
-db_config = {
-    'host': 'tutur-rds-pg-itineraries.cjq4e22go12v.us-east-1.rds.amazonaws.com',
-    'database': "tutur_itinerary",
-    'user': db_secret.get('username'),
-    'password': db_secret.get('password')
-}
 
 # Crear una instancia de la clase Database
-db = Database(db_config)
-
-
+db = Database(
+    secret_name=config.DB_SECRET_NAME,
+    host='tutur-rds-pg-itineraries.cjq4e22go12v.us-east-1.rds.amazonaws.com',
+    database="tutur_itinerary"
+)
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+
+import boto3
+
+from app import config
+from app.activity_projection import decode_item
+
+
+def _combination(item):
+    if not item or item.get('destinationId') is None:
+        return None
+    return (item['destinationId'], item.get('city', None), item.get('countryCode'))
+
+
+class DestinationIndex:
+    # Agregado destinationId/city/countryCode -> número de actividades.
+    # Se construye completo una vez y luego se mantiene con cambios incrementales,
+    # así /all-destinations y /country-codes cuestan O(resultado) y no O(tabla)
+    def __init__(self, table_name, persist_path=None):
+        self.table_name = table_name
+        self.persist_path = persist_path
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._ready = False
+        self._destinations = None
+        self._country_codes = None
+        self._previous_items = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def rebuild(self, items):
+        counts = {}
+        for item in items:
+            combination = _combination(item)
+            if combination is not None:
+                counts[combination] = counts.get(combination, 0) + 1
+        with self._lock:
+            self._counts = counts
+            self._invalidate()
+            self._ready = True
+        self.persist()
+
+    def rebuild_from_table(self):
+        # Reconstrucción completa leyendo solo las tres columnas necesarias, siguiendo LastEvaluatedKey
+        client = boto3.client('dynamodb', region_name='us-east-1')
+        params = {
+            'TableName': self.table_name,
+            'ProjectionExpression': 'destinationId, city, countryCode'
+        }
+        items = []
+        while True:
+            response = client.scan(**params)
+            items.extend(decode_item(raw_item) for raw_item in response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            params['ExclusiveStartKey'] = last_key
+        self.rebuild(items)
+
+    def ensure_ready(self):
+        # Sin catálogo ni índice persistido: una sola reconstrucción desde la tabla
+        if self._ready:
+            return
+        with self._build_lock:
+            if not self._ready:
+                self.rebuild_from_table()
+
+    def apply_change(self, old_item=None, new_item=None):
+        # Actualización incremental: alta (solo new), baja (solo old) o modificación (ambos)
+        old_combination = _combination(old_item)
+        new_combination = _combination(new_item)
+        if old_combination == new_combination:
+            return False
+        with self._lock:
+            if old_combination is not None and old_combination in self._counts:
+                self._counts[old_combination] -= 1
+                if self._counts[old_combination] <= 0:
+                    del self._counts[old_combination]
+            if new_combination is not None:
+                self._counts[new_combination] = self._counts.get(new_combination, 0) + 1
+            self._invalidate()
+        return True
+
+    def on_catalog_loaded(self, snapshot):
+        # Primera carga: reconstrucción completa; siguientes: solo las diferencias entre snapshots
+        current_items = snapshot.by_principal_id
+        previous_items = self._previous_items
+        self._previous_items = current_items
+
+        if previous_items is None or not self._ready:
+            self.rebuild(current_items.values())
+            return
+
+        changed = False
+        for principal_id, item in current_items.items():
+            changed |= self.apply_change(previous_items.get(principal_id), item)
+        for principal_id, item in previous_items.items():
+            if principal_id not in current_items:
+                changed |= self.apply_change(item, None)
+        if changed:
+            self.persist()
+
+    def _invalidate(self):
+        self._destinations = None
+        self._country_codes = None
+
+    def destinations(self):
+        with self._lock:
+            if self._destinations is None:
+                self._destinations = [
+                    {'destinationId': destinationId, 'city': city, 'countryCode': countryCode, 'activityCount': count}
+                    for (destinationId, city, countryCode), count in self._counts.items()
+                ]
+            return self._destinations
+
+    def country_codes(self):
+        with self._lock:
+            if self._country_codes is None:
+                self._country_codes = sorted({
+                    countryCode for (_, _, countryCode) in self._counts if countryCode is not None
+                })
+            return self._country_codes
+
+    def persist(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            payload = [
+                {'destinationId': destinationId, 'city': city, 'countryCode': countryCode, 'activityCount': count}
+                for (destinationId, city, countryCode), count in self._counts.items()
+            ]
+        try:
+            temp_path = f"{self.persist_path}.tmp"
+            with open(temp_path, 'w') as index_file:
+                json.dump(payload, index_file, ensure_ascii=False)
+            os.replace(temp_path, self.persist_path)
+        except OSError as e:
+            print(f"Error al persistir el índice de destinos: {e}")
+
+    def load_persisted(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return False
+        try:
+            with open(self.persist_path) as index_file:
+                payload = json.load(index_file)
+        except (OSError, ValueError) as e:
+            print(f"Error al leer el índice de destinos persistido: {e}")
+            return False
+        with self._lock:
+            self._counts = {
+                (entry['destinationId'], entry.get('city'), entry.get('countryCode')): entry['activityCount']
+                for entry in payload
+            }
+            self._invalidate()
+            self._ready = True
+        return True
+
+
+destination_index = DestinationIndex(
+    table_name=config.ACTIVITIES_TABLE,
+    persist_path=config.DESTINATION_INDEX_PATH or None
+)
@@ -1,48 +1,30 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 import boto3
-import json
-from decimal import Decimal
 from boto3.dynamodb.conditions import Key
 from pydantic import BaseModel
+from typing import Optional
+from app.http_cache import CachedResponseRoute
+from app.pagination import MAX_PAGE_SIZE, build_projection, paginate, paginate_catalog, parse_fields
+from app.activity_catalog import activity_catalog
+from app.destination_index import destination_index
+from app.activity_projection import FastJSONResponse, to_json_value
 
-# Crear un router para este módulo
-router = APIRouter()
+# Crear un router para este módulo (respuestas con ETag, Cache-Control y compresión)
+router = APIRouter(route_class=CachedResponseRoute)
 
 # Cliente de DynamoDB
 dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
 table = dynamodb.Table('tutur-activities')
 
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    raise TypeError
-
 class DestinationRequest(BaseModel):
     destinationId: str
 
 @router.get("/all-destinations")
 def get_unique_combinations():
     try:
-        # Escanear todos los registros con `destinationId`, `city`, y `countryCode`
-        response = table.scan(
-            ProjectionExpression='destinationId, city, countryCode'
-        )
-        
-        # Usar un conjunto para asegurarse de que solo se mantengan combinaciones únicas
-        unique_items = set()
-        
-        for item in response['Items']:
-            # Crear una tupla de los valores únicos y agregarla al conjunto
-            unique_items.add((item['destinationId'], item.get('city', None), item['countryCode']))
-        
-        # Convertir el conjunto en una lista de diccionarios para devolver en la respuesta
-        unique_items_list = [
-            {'destinationId': destinationId, 'city': city, 'countryCode': countryCode}
-            for destinationId, city, countryCode in unique_items
-        ]
+        # Combinaciones únicas de `destinationId`, `city` y `countryCode` desde el índice agregado
+        destination_index.ensure_ready()
+        unique_items_list = destination_index.destinations()
         
         return {'uniqueItems': unique_items_list}
     
@@ -50,7 +32,12 @@ def get_unique_combinations():
         raise HTTPException(status_code=500, detail=f"Error al consultar DynamoDB: {str(e)}")
     
 @router.post("/activities-by-destination")
-def get_activities_by_destination(request: DestinationRequest):
+def get_activities_by_destination(
+    request: DestinationRequest,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma separated list of fields to return")
+):
     try:
         # Obtener el destinationId del cuerpo de la solicitud
         destinationId = request.destinationId
@@ -59,20 +46,38 @@ def get_activities_by_destination(request: DestinationRequest):
         if not destinationId:
             raise HTTPException(status_code=400, detail="destinationId is required")
 
-        # Consultar todos los registros por `destinationId`
-        response = table.query(
-            KeyConditionExpression=Key('destinationId').eq(destinationId),
-            IndexName='DestinationIdIndex'
-        )
+        requested_fields = parse_fields(fields)
+
+        # Servir desde el catálogo en memoria; si no conoce el destino, consultar DynamoDB
+        catalog_page = paginate_catalog(activity_catalog, limit=limit, cursor=cursor, destination_id=destinationId)
+        if catalog_page is not None:
+            raw_items, next_cursor = catalog_page
+            if requested_fields:
+                raw_items = [
+                    {key: value for key, value in item.items() if key == 'principalId' or key in requested_fields}
+                    for item in raw_items
+                ]
+        else:
+            query_params = {
+                'KeyConditionExpression': Key('destinationId').eq(destinationId),
+                'IndexName': 'DestinationIdIndex'
+            }
+            if requested_fields:
+                # principalId siempre se devuelve para identificar cada registro
+                query_params.update(build_projection(['principalId'] + requested_fields))
+
+            # Consultar los registros por `destinationId` siguiendo LastEvaluatedKey
+            raw_items, next_cursor = paginate(table.query, query_params, limit=limit, cursor=cursor)
+            # El recurso de boto3 devuelve Decimal; el catálogo ya guarda tipos JSON
+            raw_items = [to_json_value(item) for item in raw_items]
         
         # Si no hay registros, devolver un error
-        if 'Items' not in response or len(response['Items']) == 0:
+        if not raw_items and not cursor:
             raise HTTPException(status_code=404, detail="No records found")
 
-        # Devolver la respuesta, manejando los objetos Decimal
-        items = json.loads(json.dumps(response['Items'], default=decimal_default))
-        
-        return {'activities': items}
+        return FastJSONResponse({'activities': raw_items, 'nextCursor': next_cursor})
     
+    except HTTPException as http_ex:
+        raise http_ex
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar DynamoDB: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,202 @@
+import math
+import threading
+
+import numpy as np
+
+from app import config
+
+EARTH_RADIUS_KM = 6371.0088
+# Tamaño de celda de la grilla en grados (~5.5 km de latitud)
+GRID_CELL_DEGREES = 0.05
+
+
+def haversine_km(lat, lng, lats, lngs):
+    # Distancia vectorizada desde un punto (grados) a arreglos de puntos (grados)
+    lat1 = math.radians(lat)
+    lng1 = math.radians(lng)
+    lat2 = np.radians(lats)
+    lng2 = np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def item_coordinates(item):
+    try:
+        lat = float(item.get('location_lat'))
+        lng = float(item.get('location_lng'))
+    except (TypeError, ValueError):
+        return None
+    # (0, 0) es el valor por defecto cuando la actividad no tiene coordenadas
+    if lat == 0.0 and lng == 0.0:
+        return None
+    return lat, lng
+
+
+class SpatialGrid:
+    # Grilla fija de celdas lat/lng con los índices de cada celda; la distancia exacta
+    # se calcula con NumPy solo sobre las celdas que intersectan el radio buscado
+    def __init__(self, items):
+        located = [(item, item_coordinates(item)) for item in items]
+        located = [(item, coordinates) for item, coordinates in located if coordinates is not None]
+        self.items = [item for item, _ in located]
+        self.lats = np.array([coordinates[0] for _, coordinates in located], dtype=np.float64)
+        self.lngs = np.array([coordinates[1] for _, coordinates in located], dtype=np.float64)
+
+        cells = {}
+        rows = np.floor(self.lats / GRID_CELL_DEGREES).astype(np.int64)
+        cols = np.floor(self.lngs / GRID_CELL_DEGREES).astype(np.int64)
+        for index, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            cells.setdefault(cell, []).append(index)
+        self.cells = {cell: np.array(indexes, dtype=np.int64) for cell, indexes in cells.items()}
+
+    def _candidates(self, lat, lng, radius_km):
+        lat_span = radius_km / 111.0
+        lng_span = radius_km / max(111.0 * math.cos(math.radians(lat)), 1e-6)
+        row_min = math.floor((lat - lat_span) / GRID_CELL_DEGREES)
+        row_max = math.floor((lat + lat_span) / GRID_CELL_DEGREES)
+        col_min = math.floor((lng - lng_span) / GRID_CELL_DEGREES)
+        col_max = math.floor((lng + lng_span) / GRID_CELL_DEGREES)
+
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            return np.arange(len(self.items))
+        found = [
+            self.cells[(row, col)]
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)
+            if (row, col) in self.cells
+        ]
+        return np.concatenate(found) if found else np.array([], dtype=np.int64)
+
+    def nearby(self, lat, lng, radius_km, limit=None):
+        candidates = self._candidates(lat, lng, radius_km)
+        if len(candidates) == 0:
+            return []
+        distances = haversine_km(lat, lng, self.lats[candidates], self.lngs[candidates])
+        within = distances <= radius_km
+        candidates = candidates[within]
+        distances = distances[within]
+        order = np.argsort(distances, kind='stable')
+        if limit:
+            order = order[:limit]
+        return [(self.items[candidates[i]], float(distances[i])) for i in order]
+
+
+class GeoIndex:
+    def __init__(self, max_distance_km):
+        self.max_distance_km = max_distance_km
+        self._all = None
+        self._by_destination = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._all is not None
+
+    def on_catalog_loaded(self, snapshot):
+        all_grid = SpatialGrid(snapshot.items)
+        by_destination = {
+            destination_id: SpatialGrid(items)
+            for destination_id, items in snapshot.by_destination.items()
+        }
+        with self._lock:
+            self._all = all_grid
+            self._by_destination = by_destination
+
+    def nearby(self, lat, lng, radius_km, destination_id=None, limit=None):
+        grid = self._all if destination_id is None else self._by_destination.get(destination_id)
+        if grid is None:
+            return []
+        return grid.nearby(lat, lng, radius_km, limit)
+
+    def _distance_matrix(self, points):
+        # Matriz de distancias del día (pocas actividades: O(n^2) vectorizado)
+        lats = np.array([point[0] for point in points])
+        lngs = np.array([point[1] for point in points])
+        return np.vstack([haversine_km(lat, lng, lats, lngs) for lat, lng in points])
+
+    def repair_day(self, day, used_ids, formatter, rules=None):
+        # Conserva el grupo de actividades más compacto del día y reemplaza las que rompen
+        # la regla de distancia por actividades cercanas del catálogo, sin llamar al LLM.
+        # rules (planner.ReplacementRules) filtra por categoría, horario y tiempo del día;
+        # si ninguna candidata cumple, la actividad se elimina sin reemplazo
+        activities = day.get('activities', [])
+        located = [
+            (index, (activity.get('coordinates') or {}).get('latitude'), (activity.get('coordinates') or {}).get('longitude'))
+            for index, activity in enumerate(activities)
+        ]
+        located = [(index, lat, lng) for index, lat, lng in located if lat and lng]
+        if len(located) < 2:
+            return 0
+
+        distances = self._distance_matrix([(lat, lng) for _, lat, lng in located])
+        limit = self.max_distance_km
+        if (distances <= limit).all():
+            return 0
+
+        # Ancla: la actividad con más vecinas dentro del límite
+        anchor = int(np.argmax((distances <= limit).sum(axis=1)))
+        kept = [anchor]
+        for position in range(len(located)):
+            if position != anchor and all(distances[position, other] <= limit for other in kept):
+                kept.append(position)
+        dropped = [position for position in range(len(located)) if position not in kept]
+
+        anchor_activity = activities[located[anchor][0]]
+        destination_id = anchor_activity.get('destinationId') or None
+        kept_points = [(located[position][1], located[position][2]) for position in kept]
+
+        dropped_indexes = {located[position][0] for position in dropped}
+        replacements = {}
+        if self.ready:
+            # Toda candidata a menos de 5 km de las conservadas lo está de la primera
+            candidates = [item for item, _ in self.nearby(kept_points[0][0], kept_points[0][1], limit, destination_id=destination_id)]
+            candidates.sort(key=lambda item: float(item.get('totalScore', 0) or 0), reverse=True)
+            remaining = [activity for index, activity in enumerate(activities) if index not in dropped_indexes]
+            for position in dropped:
+                pool = [item for item in candidates if item['principalId'] not in used_ids]
+                if rules is not None:
+                    pool = rules.filter(pool, rules.used_minutes(remaining))
+                if not pool:
+                    break
+                # Distancia máxima de cada candidata a las actividades conservadas, en bloque
+                kept_lats = np.array([point[0] for point in kept_points])
+                kept_lngs = np.array([point[1] for point in kept_points])
+                pool_points = [item_coordinates(item) for item in pool]
+                pool_lats = np.array([point[0] for point in pool_points])
+                pool_lngs = np.array([point[1] for point in pool_points])
+                farthest = np.max([haversine_km(lat, lng, pool_lats, pool_lngs) for lat, lng in zip(kept_lats, kept_lngs)], axis=0)
+                within = np.flatnonzero(farthest <= limit)
+                if not len(within):
+                    continue
+                item = pool[within[0]]
+                principal_id = item['principalId']
+                used_ids.add(principal_id)
+                kept_points.append(pool_points[within[0]])
+                replacement = dict(formatter(item), principalId=principal_id, name=item.get('name', ''))
+                replacements[located[position][0]] = replacement
+                remaining.append(replacement)
+
+        day['activities'] = [
+            replacements.get(index, activity)
+            for index, activity in enumerate(activities)
+            if index not in dropped_indexes or index in replacements
+        ]
+        return len(dropped)
+
+    def repair_itinerary(self, itinerary, formatter, rules_for_day=None):
+        # rules_for_day(índice del día) -> reglas de reemplazo de ese día
+        used_ids = {
+            activity.get('principalId')
+            for day in itinerary
+            for activity in day.get('activities', [])
+        }
+        repaired = 0
+        for index, day in enumerate(itinerary):
+            rules = rules_for_day(index) if rules_for_day is not None else None
+            repaired += self.repair_day(day, used_ids, formatter, rules)
+        if repaired:
+            print(f"Actividades fuera del radio de {self.max_distance_km} km corregidas: {repaired}")
+        return repaired
+
+
+geo_index = GeoIndex(max_distance_km=config.MAX_ACTIVITY_DISTANCE_KM)
@@ -0,0 +1,130 @@
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from app import config
+from app.lru_cache import LRUCache
+
+
+def build_guide_cache_key(request, start_dt, end_dt):
+    # Normalizar la solicitud: dos peticiones que producirían el mismo itinerario
+    # (misma ciudad, categorías, participantes y patrón de días) comparten clave
+    num_days = max((end_dt.date() - start_dt.date()).days + 1, 1)
+    weekdays = [(start_dt.date() + timedelta(days=offset)).weekday() for offset in range(num_days)]
+
+    normalized = {
+        'country': request.country.strip().lower(),
+        'city': request.city.strip().lower(),
+        'activities': sorted({str(activity).strip().lower() for activity in request.activities}),
+        'participants': sorted(
+            [str(key).strip().lower(), str(value).strip().lower()]
+            for key, value in request.participants.items()
+        ),
+        'days': num_days,
+        'weekdays': weekdays,
+    }
+    raw_key = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+class _DiskTier:
+    # Nivel persistente en SQLite para sobrevivir reinicios y compartir entre workers
+    def __init__(self, path, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS guide_cache ("
+                "cache_key TEXT PRIMARY KEY, expires_at REAL NOT NULL, body TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, body FROM guide_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= time.time():
+                self._conn.execute("DELETE FROM guide_cache WHERE cache_key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(row[1])
+
+    def put(self, key, body):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO guide_cache (cache_key, expires_at, body) VALUES (?, ?, ?)",
+                (key, time.time() + self.ttl_seconds, json.dumps(body, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM guide_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+
+class GuideCache:
+    # Guarda la respuesta del LLM (antes del enriquecimiento con DynamoDB) por clave normalizada
+    def __init__(self, max_entries, ttl_seconds, disk_path=None):
+        self._memory = LRUCache(max_entries, ttl_seconds)
+        self._disk = _DiskTier(disk_path, ttl_seconds) if disk_path else None
+        if self._disk:
+            self._disk.purge_expired()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        body = self._memory.get(key)
+        if body is None and self._disk:
+            body = self._disk.get(key)
+            if body is not None:
+                self._memory.put(key, body)
+                with self._lock:
+                    self.disk_hits += 1
+
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # Copia profunda: el merge con DynamoDB modifica el itinerario en sitio
+        return copy.deepcopy(body)
+
+    def put(self, key, body):
+        body = copy.deepcopy(body)
+        self._memory.put(key, body)
+        if self._disk:
+            try:
+                self._disk.put(key, body)
+            except sqlite3.Error as e:
+                print(f"Error al guardar en la caché de disco: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._memory),
+                'diskEnabled': self._disk is not None,
+            }
+
+
+guide_cache = GuideCache(
+    max_entries=config.GUIDE_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.GUIDE_CACHE_TTL_SECONDS,
+    disk_path=config.GUIDE_CACHE_DISK_PATH or None
+) if config.GUIDE_CACHE_ENABLED else None
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from app import config
+from app.async_utils import run_blocking
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Error de los trabajos que no llegan a terminar porque la instancia se apaga o murió
+INTERRUPTED_ERROR = {'status': 503, 'detail': "The service restarted before the job finished. Please resubmit it."}
+
+
+class GuideJobQueueFull(Exception):
+    pass
+
+
+class InMemoryJobStore:
+    # Estado de los trabajos en memoria del proceso; los terminados expiran tras el TTL
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, request_payload):
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._purge_expired()
+            self._jobs[job_id] = {
+                'jobId': job_id,
+                'status': JOB_QUEUED,
+                'request': request_payload,
+                'result': None,
+                'error': None,
+                'createdAt': now,
+                'updatedAt': now,
+                '_finished_at': None,
+            }
+
+    def update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update({
+                'status': status,
+                'result': result,
+                'error': error,
+                'updatedAt': datetime.now(timezone.utc).isoformat(),
+            })
+            if status in (JOB_SUCCEEDED, JOB_FAILED):
+                job['_finished_at'] = time.monotonic()
+
+    def fail_stale(self, stale_seconds, error):
+        # El estado en memoria muere con el proceso: al arrancar no hay trabajos huérfanos
+        return 0
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if not key.startswith('_')}
+
+    def _purge_expired(self):
+        limit = time.monotonic() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['_finished_at'] is not None and job['_finished_at'] < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class PostgresJobStore:
+    # Estado compartido entre instancias en la tabla iti.guide_jobs
+    def __init__(self, database):
+        self.db = database
+
+    def _execute(self, query, params, fetch=False):
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                row = cursor.fetchone() if fetch else cursor.rowcount
+            conn.commit()
+            return row
+        finally:
+            self.db.release_connection(conn)
+
+    def create(self, job_id, request_payload):
+        self._execute(
+            "INSERT INTO iti.guide_jobs (job_id, status, request, created_at, updated_at) "
+            "VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP);",
+            (job_id, JOB_QUEUED, json.dumps(request_payload))
+        )
+
+    def update(self, job_id, status, result=None, error=None):
+        self._execute(
+            "UPDATE iti.guide_jobs SET status = %s, result = %s, error = %s, updated_at = CURRENT_TIMESTAMP "
+            "WHERE job_id = %s;",
+            (
+                status,
+                json.dumps(result) if result is not None else None,
+                json.dumps(error) if error is not None else None,
+                job_id
+            )
+        )
+
+    def fail_stale(self, stale_seconds, error):
+        # La cola vive en memoria: los trabajos 'queued'/'running' de una instancia que murió
+        # no los retoma nadie. El umbral evita tocar los que otra instancia sigue procesando
+        return self._execute(
+            "UPDATE iti.guide_jobs SET status = %s, error = %s, updated_at = CURRENT_TIMESTAMP "
+            "WHERE status IN (%s, %s) AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s);",
+            (JOB_FAILED, json.dumps(error), JOB_QUEUED, JOB_RUNNING, stale_seconds)
+        )
+
+    def get(self, job_id):
+        row = self._execute(
+            "SELECT job_id, status, request, result, error, created_at, updated_at "
+            "FROM iti.guide_jobs WHERE job_id = %s;",
+            (job_id,),
+            fetch=True
+        )
+        if row is None:
+            return None
+        return {
+            'jobId': row[0],
+            'status': row[1],
+            'request': row[2],
+            'result': row[3],
+            'error': row[4],
+            'createdAt': row[5].isoformat() if row[5] else None,
+            'updatedAt': row[6].isoformat() if row[6] else None,
+        }
+
+
+class GuideJobPool:
+    # Separa la admisión de peticiones del throughput del LLM: la cola acota los trabajos
+    # pendientes y el número de workers fija cuántas generaciones corren a la vez
+    def __init__(self, handler, store, workers, max_queue):
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = None
+        self._tasks = []
+        self._in_flight = set()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        try:
+            failed = await run_blocking(self.store.fail_stale, config.GUIDE_JOB_STALE_SECONDS, INTERRUPTED_ERROR)
+            if failed:
+                print(f"Trabajos huérfanos marcados como fallidos al arrancar: {failed}")
+        except Exception as e:
+            print(f"Error al recuperar los trabajos huérfanos: {e}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Los trabajos cancelados y los que seguían en la cola no se van a procesar:
+        # se marcan fallidos para que el cliente no espere un 'running' para siempre
+        pending = list(self._in_flight)
+        self._in_flight.clear()
+        while self._queue is not None and not self._queue.empty():
+            job_id, _ = self._queue.get_nowait()
+            pending.append(job_id)
+        for job_id in pending:
+            await self._fail(job_id, INTERRUPTED_ERROR)
+
+    async def submit(self, request):
+        if self._queue is None:
+            await self.start()
+        if self._queue.full():
+            raise GuideJobQueueFull()
+
+        job_id = uuid.uuid4().hex
+        await run_blocking(self.store.create, job_id, request.model_dump())
+        try:
+            self._queue.put_nowait((job_id, request))
+        except asyncio.QueueFull:
+            await run_blocking(self.store.update, job_id, JOB_FAILED, None, {'status': 503, 'detail': "Queue full"})
+            raise GuideJobQueueFull()
+        return job_id
+
+    async def get(self, job_id):
+        return await run_blocking(self.store.get, job_id)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'maxQueue': self.max_queue,
+            'queued': self._queue.qsize() if self._queue else 0,
+        }
+
+    async def _worker(self):
+        while True:
+            job_id, request = await self._queue.get()
+            self._in_flight.add(job_id)
+            try:
+                await run_blocking(self.store.update, job_id, JOB_RUNNING)
+                result = await self.handler(request)
+                await run_blocking(self.store.update, job_id, JOB_SUCCEEDED, result)
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as http_ex:
+                await self._fail(job_id, {'status': http_ex.status_code, 'detail': http_ex.detail})
+            except Exception as e:
+                await self._fail(job_id, {'status': 500, 'detail': str(e)})
+            finally:
+                self._queue.task_done()
+            # Si se canceló no se llega aquí: stop() marca el trabajo como fallido
+            self._in_flight.discard(job_id)
+
+    async def _fail(self, job_id, error):
+        try:
+            await run_blocking(self.store.update, job_id, JOB_FAILED, None, error)
+        except Exception as e:
+            print(f"Error al actualizar el trabajo {job_id}: {e}")
+
+
+def build_job_store():
+    if config.GUIDE_JOB_STORE == "postgres":
+        from app.db import db
+        return PostgresJobStore(db)
+    return InMemoryJobStore(config.GUIDE_JOB_TTL_SECONDS)
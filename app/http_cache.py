@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+
+from app import config
+from app.activity_catalog import activity_catalog
+from app.lru_cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Cuerpos ya serializados y comprimidos por (hash base, encoding)
+_body_cache = LRUCache(config.HTTP_CACHE_MAX_ENTRIES)
+
+_ENCODING_SUFFIXES = ('br', 'gzip')
+
+
+def _cache_headers(etag):
+    return {
+        'ETag': etag,
+        'Cache-Control': f"public, max-age={config.HTTP_CACHE_MAX_AGE_SECONDS}",
+        'Vary': 'Accept-Encoding',
+    }
+
+
+def _representation_etag(base, content_encoding):
+    # Un ETag fuerte identifica los bytes enviados: cada codificación lleva su sufijo
+    if content_encoding:
+        return '"%s-%s"' % (base, content_encoding)
+    return '"%s"' % base
+
+
+def _matching_etag(request, base, encoding):
+    # Devuelve el ETag a reenviar con el 304 si If-None-Match contiene cualquier variante
+    # del mismo contenido (sin comprimir, -br o -gzip), porque solo cambia la codificación
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+    variants = {base} | {f"{base}-{suffix}" for suffix in _ENCODING_SUFFIXES}
+    for candidate in (candidate.strip() for candidate in header.split(',')):
+        if candidate == '*':
+            return _representation_etag(base, encoding)
+        value = candidate[2:] if candidate.startswith('W/') else candidate
+        if value.strip('"') in variants:
+            return value
+    return None
+
+
+def _negotiate_encoding(request):
+    accepted = request.headers.get('accept-encoding', '').lower()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding):
+    if encoding is None or len(body) < config.HTTP_COMPRESSION_MIN_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=5), 'br'
+    return gzip.compress(body, compresslevel=6), 'gzip'
+
+
+def _catalog_hash(request):
+    # Mientras el catálogo está cargado la respuesta solo depende de su versión y de la URL,
+    # así que el ETag se conoce sin ejecutar el endpoint ni serializar nada
+    snapshot = activity_catalog.snapshot
+    if snapshot is None:
+        return None
+    query = '&'.join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    raw = f"{snapshot.version}|{request.url.path}?{query}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _build_response(body, content_encoding, media_type, headers):
+    if content_encoding:
+        headers = dict(headers, **{'Content-Encoding': content_encoding})
+    return Response(content=body, status_code=200, media_type=media_type, headers=headers)
+
+
+class CachedResponseRoute(APIRoute):
+    # ETag fuerte por codificación + If-None-Match -> 304, Cache-Control y compresión gzip/brotli
+    # para los endpoints de solo lectura de /v1/tutur/info
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+
+        async def cached_handler(request):
+            encoding = _negotiate_encoding(request)
+
+            if request.method != 'GET':
+                response = await original_handler(request)
+                body = getattr(response, 'body', None)
+                if response.status_code != 200 or body is None:
+                    return response
+                compressed, content_encoding = _compress(body, encoding)
+                headers = {'Vary': 'Accept-Encoding'}
+                return _build_response(compressed, content_encoding, response.media_type, headers)
+
+            base = _catalog_hash(request)
+            if base is not None:
+                matched = _matching_etag(request, base, encoding)
+                if matched is not None:
+                    return Response(status_code=304, headers=_cache_headers(matched))
+                cached = _body_cache.get((base, encoding))
+                if cached is not None:
+                    body, content_encoding, media_type = cached
+                    etag = _representation_etag(base, content_encoding)
+                    return _build_response(body, content_encoding, media_type, _cache_headers(etag))
+
+            response = await original_handler(request)
+            body = getattr(response, 'body', None)
+            if response.status_code != 200 or body is None:
+                return response
+
+            if base is None:
+                # Sin catálogo: ETag a partir del contenido
+                base = hashlib.sha1(body).hexdigest()
+                matched = _matching_etag(request, base, encoding)
+                if matched is not None:
+                    return Response(status_code=304, headers=_cache_headers(matched))
+
+            compressed, content_encoding = _compress(body, encoding)
+            _body_cache.put((base, encoding), (compressed, content_encoding, response.media_type))
+            etag = _representation_etag(base, content_encoding)
+            return _build_response(compressed, content_encoding, response.media_type, _cache_headers(etag))
+
+        return cached_handler
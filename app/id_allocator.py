@@ -0,0 +1,105 @@
+import datetime
+import threading
+from collections import deque
+
+from app import config
+from app.async_utils import run_blocking, submit_background
+from app.db import db
+
+
+def format_itinerary_id(sequence_value):
+    # Fecha juliana YYDDD (5 dígitos) + secuencia de 11 dígitos = ID de 16 dígitos
+    current_date = datetime.datetime.now().strftime('%y%j')
+    return f"{current_date}{str(sequence_value).zfill(11)}"
+
+
+class ItineraryIdAllocator:
+    # Reserva bloques de valores de iti.tutur_seq_itinerary_id en una sola consulta y los
+    # entrega desde memoria; al bajar de la marca mínima se recarga en segundo plano
+    def __init__(self, database, block_size, low_watermark):
+        self.db = database
+        self.block_size = block_size
+        self.low_watermark = low_watermark
+        self._values = deque()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+        self.blocks_fetched = 0
+        self.ids_served = 0
+
+    def _fetch_block(self):
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval('iti.tutur_seq_itinerary_id') FROM generate_series(1, %s);",
+                    (self.block_size,)
+                )
+                values = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            return values
+        finally:
+            self.db.release_connection(conn)
+
+    def _refill_if_below(self, threshold):
+        # Un solo hilo consulta la secuencia a la vez; los demás reutilizan su bloque
+        with self._refill_lock:
+            with self._lock:
+                if len(self._values) > threshold:
+                    return
+            values = self._fetch_block()
+            with self._lock:
+                self._values.extend(values)
+                self.blocks_fetched += 1
+
+    def refill(self):
+        try:
+            self._refill_if_below(self.low_watermark)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def try_next_id(self):
+        # Nunca hace I/O con el lock tomado: es seguro llamarlo desde el event loop
+        with self._lock:
+            if not self._values:
+                return None
+            value = self._values.popleft()
+            self.ids_served += 1
+            start_refill = len(self._values) <= self.low_watermark and not self._refilling
+            if start_refill:
+                self._refilling = True
+        if start_refill:
+            submit_background(self.refill)
+        return format_itinerary_id(value)
+
+    def next_id(self):
+        while True:
+            itinerary_id = self.try_next_id()
+            if itinerary_id is not None:
+                return itinerary_id
+            # Bloque agotado antes de que llegara la recarga anticipada: recargar en este hilo
+            self._refill_if_below(0)
+
+    async def next_id_async(self):
+        itinerary_id = self.try_next_id()
+        if itinerary_id is None:
+            itinerary_id = await run_blocking(self.next_id)
+        return itinerary_id
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': len(self._values),
+                'blockSize': self.block_size,
+                'lowWatermark': self.low_watermark,
+                'blocksFetched': self.blocks_fetched,
+                'idsServed': self.ids_served,
+            }
+
+
+itinerary_id_allocator = ItineraryIdAllocator(
+    db,
+    block_size=config.ID_BLOCK_SIZE,
+    low_watermark=config.ID_BLOCK_LOW_WATERMARK
+) if config.ID_ALLOCATOR_ENABLED else None
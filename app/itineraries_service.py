@@ -0,0 +1,64 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app import config
+from app.async_utils import run_blocking
+from app.itinerary_store import itinerary_store
+from app.pagination import decode_cursor, encode_cursor
+
+# Guías ya generadas y guardadas en iti.client_itineraries
+router = APIRouter()
+
+_ITINERARY_ID = re.compile(r'^\d{16}$')
+
+
+def _decode_itinerary_cursor(cursor):
+    key = decode_cursor(cursor)
+    if key is None:
+        return None
+    try:
+        return datetime.fromisoformat(key['createdAt']), str(key['touristGuideId'])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/itineraries/{touristGuideId}")
+async def get_itinerary(touristGuideId: str):
+    if not _ITINERARY_ID.match(touristGuideId):
+        raise HTTPException(status_code=400, detail="Invalid touristGuideId")
+
+    # Caché en el event loop; solo los fallos pasan al executor de Postgres
+    record = itinerary_store.get_cached(touristGuideId)
+    if record is None:
+        try:
+            record = await run_blocking(itinerary_store.load, touristGuideId)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al consultar el itinerario: {str(e)}")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return record
+
+
+@router.get("/clients/{clientId}/itineraries")
+async def list_client_itineraries(
+    clientId: str,
+    limit: Optional[int] = Query(None, ge=1, le=config.ITINERARY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    includeDetails: bool = Query(False, description="Include the full guideDetails of each itinerary")
+):
+    after = _decode_itinerary_cursor(cursor)
+    try:
+        items, next_key = await run_blocking(
+            itinerary_store.list_by_client, clientId, limit or config.ITINERARY_PAGE_SIZE, after, includeDetails
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar los itinerarios: {str(e)}")
+
+    next_cursor = None
+    if next_key is not None:
+        created_at, itinerary_id = next_key
+        next_cursor = encode_cursor({'createdAt': created_at.isoformat(), 'touristGuideId': itinerary_id})
+    return {'clientId': clientId, 'itineraries': items, 'nextCursor': next_cursor}
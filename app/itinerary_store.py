@@ -0,0 +1,137 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+from app import config
+from app.db import db
+from app.lru_cache import LRUCache
+
+
+def _load_json(value):
+    # psycopg2 ya decodifica JSONB; se acepta texto por si la columna llega como string
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _record(itinerary_id, client_id, client_itinerary, created_at):
+    return {
+        'touristGuideId': itinerary_id,
+        'clientId': client_id,
+        'createdAt': created_at.isoformat() if created_at is not None else None,
+        'guideDetails': client_itinerary,
+    }
+
+
+class ItineraryStore:
+    # Lectura de iti.client_itineraries con caché read-through: un itinerario guardado no cambia,
+    # así que reabrirlo no vuelve a pasar por Postgres (ni por el LLM)
+    def __init__(self, database, max_entries, ttl_seconds):
+        self.db = database
+        self.cache = LRUCache(max_entries, ttl_seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _query(self, query, params):
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            self.db.release_connection(conn)
+
+    def remember(self, itinerary_id, client_id, client_itinerary, created_at=None):
+        # Se llama al encolar la escritura: la guía se puede reabrir antes de que la cola la persista
+        record = _record(itinerary_id, client_id, client_itinerary, created_at or datetime.now(timezone.utc))
+        self.cache.put(itinerary_id, record)
+        return record
+
+    def forget(self, itinerary_id):
+        # La escritura pendiente falló: no seguir sirviendo una guía que no está en Postgres
+        self.cache.pop(itinerary_id)
+
+    def get_cached(self, itinerary_id):
+        record = self.cache.get(itinerary_id)
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return record
+
+    def get(self, itinerary_id):
+        record = self.get_cached(itinerary_id)
+        if record is not None:
+            return record
+        return self.load(itinerary_id)
+
+    def load(self, itinerary_id):
+        rows = self._query(
+            "SELECT id, client_id, client_itinerary, created_at FROM iti.client_itineraries WHERE id = %s;",
+            (itinerary_id,)
+        )
+        if not rows:
+            return None
+        itinerary_id, client_id, client_itinerary, created_at = rows[0]
+        record = _record(itinerary_id, client_id, _load_json(client_itinerary), created_at)
+        self.cache.put(itinerary_id, record)
+        return record
+
+    def list_by_client(self, client_id, limit, after=None, include_details=False):
+        # Keyset sobre (client_id, created_at DESC, id DESC): cada página es un range scan del índice
+        # idx_client_itineraries_client_created sin OFFSET. after = (created_at, id) del último item.
+        details = "client_itinerary" if include_details else "NULL"
+        params = [client_id]
+        keyset = ""
+        if after is not None:
+            keyset = "AND (created_at, id) < (%s, %s)"
+            params.extend(after)
+        params.append(limit + 1)
+        rows = self._query(
+            f"""
+            SELECT id, created_at, jsonb_array_length(COALESCE(client_itinerary->'itinerary', '[]'::jsonb)), {details}
+            FROM iti.client_itineraries
+            WHERE client_id = %s {keyset}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s;
+            """,
+            params
+        )
+
+        items = []
+        for itinerary_id, created_at, days, client_itinerary in rows[:limit]:
+            item = {
+                'touristGuideId': itinerary_id,
+                'createdAt': created_at.isoformat() if created_at is not None else None,
+                'days': days,
+            }
+            if include_details:
+                client_itinerary = _load_json(client_itinerary)
+                item['guideDetails'] = client_itinerary
+                self.cache.put(itinerary_id, _record(itinerary_id, client_id, client_itinerary, created_at))
+            items.append(item)
+
+        next_key = None
+        if len(rows) > limit:
+            last_id, last_created_at = rows[limit - 1][0], rows[limit - 1][1]
+            next_key = (last_created_at, last_id)
+        return items, next_key
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+itinerary_store = ItineraryStore(
+    db,
+    max_entries=config.ITINERARY_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ITINERARY_CACHE_TTL_SECONDS
+)
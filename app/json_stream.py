@@ -0,0 +1,74 @@
+import json
+import re
+
+
+class ItineraryStreamParser:
+    # Parser incremental: recibe fragmentos de texto del LLM y devuelve cada objeto
+    # del arreglo "itinerary" en cuanto se cierra, sin esperar al JSON completo
+    def __init__(self, array_key='itinerary'):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+        self._pending = ''
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current = []
+        self.text = ''
+
+    def feed(self, chunk):
+        self.text += chunk
+        if self._finished:
+            return []
+
+        if not self._in_array:
+            self._pending += chunk
+            match = self._key_pattern.search(self._pending)
+            if not match:
+                # Conservar solo la cola por si la clave llega partida entre fragmentos
+                self._pending = self._pending[-64:]
+                return []
+            chunk = self._pending[match.end():]
+            self._pending = ''
+            self._in_array = True
+
+        return self._consume(chunk)
+
+    def _consume(self, chunk):
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._current = [char]
+                elif char == ']':
+                    self._finished = True
+                    break
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    raw_object = ''.join(self._current)
+                    self._current = []
+                    try:
+                        completed.append(json.loads(raw_object))
+                    except json.JSONDecodeError as e:
+                        print(f"Día del itinerario no decodificable en streaming: {e}")
+        return completed
+
+    @property
+    def finished(self):
+        return self._finished
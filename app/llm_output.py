@@ -0,0 +1,198 @@
+import json
+import re
+import threading
+
+from app.json_stream import ItineraryStreamParser
+from app.metrics import Counter, registry
+
+# Forma de la respuesta del LLM: {itinerary: [{day, activities: [{principalId, name}]}]}.
+# En modo strict OpenAI exige todas las propiedades en required y additionalProperties=false
+ITINERARY_JSON_SCHEMA = {
+    'name': 'tourist_itinerary',
+    'strict': True,
+    'schema': {
+        'type': 'object',
+        'properties': {
+            'itinerary': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'day': {'type': 'integer'},
+                        'activities': {
+                            'type': 'array',
+                            'items': {
+                                'type': 'object',
+                                'properties': {
+                                    'principalId': {'type': 'string'},
+                                    'name': {'type': 'string'}
+                                },
+                                'required': ['principalId', 'name'],
+                                'additionalProperties': False
+                            }
+                        }
+                    },
+                    'required': ['day', 'activities'],
+                    'additionalProperties': False
+                }
+            }
+        },
+        'required': ['itinerary'],
+        'additionalProperties': False
+    }
+}
+
+ITINERARY_RESPONSE_FORMAT = {'type': 'json_schema', 'json_schema': ITINERARY_JSON_SCHEMA}
+
+llm_output_total = registry.register(Counter(
+    'tutur_llm_output_total', 'Respuestas del LLM por resultado del parseo (parsed, repaired, failed)', ('outcome',)
+))
+llm_dropped_activities = registry.register(Counter(
+    'tutur_llm_dropped_activities_total', 'Actividades del LLM descartadas antes del enriquecimiento', ('reason',)
+))
+
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.S)
+_decoder = json.JSONDecoder()
+
+
+class ItineraryOutputError(ValueError):
+    pass
+
+
+def _as_itinerary(value):
+    # Un arreglo suelto de días también se acepta como itinerario
+    if isinstance(value, list):
+        return {'itinerary': value}
+    if isinstance(value, dict) and isinstance(value.get('itinerary'), list):
+        return value
+    raise ItineraryOutputError("La respuesta del modelo no contiene un arreglo 'itinerary'")
+
+
+def _decode_first_value(text):
+    # Primer valor JSON completo desde la primera llave o corchete; ignora el texto de alrededor
+    # (explicaciones del modelo o la respuesta repetida al final del stream con response_format)
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    if not starts:
+        return None
+    try:
+        value, _ = _decoder.raw_decode(text, min(starts))
+    except json.JSONDecodeError:
+        return None
+    return value
+
+
+class LLMOutputStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outcomes = {'parsed': 0, 'repaired': 0, 'failed': 0}
+        self._dropped = {}
+
+    def record_outcome(self, outcome):
+        llm_output_total.inc(outcome=outcome)
+        with self._lock:
+            self._outcomes[outcome] += 1
+
+    def record_dropped(self, dropped):
+        with self._lock:
+            for reason, count in dropped.items():
+                self._dropped[reason] = self._dropped.get(reason, 0) + count
+        for reason, count in dropped.items():
+            llm_dropped_activities.inc(count, reason=reason)
+
+    def stats(self):
+        with self._lock:
+            outcomes = dict(self._outcomes)
+            dropped = dict(self._dropped)
+        total = sum(outcomes.values())
+        return {
+            **outcomes,
+            'total': total,
+            'repairRate': round(outcomes['repaired'] / total, 4) if total else 0.0,
+            'failureRate': round(outcomes['failed'] / total, 4) if total else 0.0,
+            'droppedActivities': dropped,
+        }
+
+
+llm_output_stats = LLMOutputStats()
+
+
+def parse_itinerary_output(text):
+    # Devuelve el itinerario del texto del modelo; si no es JSON válido intenta repararlo
+    # antes de fallar, porque cada error obliga al cliente a repetir toda la llamada al LLM
+    text = (text or '').strip()
+    if not text:
+        llm_output_stats.record_outcome('failed')
+        raise ItineraryOutputError("Empty response from the model.")
+
+    try:
+        body = _as_itinerary(json.loads(text))
+        llm_output_stats.record_outcome('parsed')
+        return body
+    except (json.JSONDecodeError, ItineraryOutputError):
+        pass
+
+    # Envuelto en un bloque ```json (cerrado o no) o con texto antes y después
+    fence = _FENCE.search(text)
+    candidate = fence.group(1) if fence else text
+    value = _decode_first_value(candidate)
+    if value is not None:
+        try:
+            body = _as_itinerary(value)
+            llm_output_stats.record_outcome('repaired')
+            return body
+        except ItineraryOutputError:
+            pass
+
+    # Truncado (límite de tokens o stream cortado): se conservan los días que llegaron completos
+    days = ItineraryStreamParser().feed(candidate)
+    if days:
+        print(f"Respuesta del modelo reparada: {len(days)} días completos recuperados")
+        llm_output_stats.record_outcome('repaired')
+        return {'itinerary': days}
+
+    llm_output_stats.record_outcome('failed')
+    raise ItineraryOutputError("No se pudo recuperar un itinerario de la respuesta del modelo")
+
+
+class ItineraryValidator:
+    # Filtra las actividades antes de consultar DynamoDB: sin principalId, repetidas o que no
+    # existen (is_known). Se usa día a día en el streaming, por eso guarda los ids ya vistos
+    def __init__(self, is_known=None):
+        self.is_known = is_known
+        self.seen = set()
+        self.dropped = {}
+
+    def _drop(self, reason):
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+
+    def day(self, day, index):
+        if not isinstance(day, dict):
+            self._drop('invalidDay')
+            return None
+        activities = []
+        raw_activities = day.get('activities')
+        for activity in raw_activities if isinstance(raw_activities, list) else []:
+            principal_id = activity.get('principalId') if isinstance(activity, dict) else None
+            if not isinstance(principal_id, str) or not principal_id.strip():
+                self._drop('missingId')
+            elif principal_id in self.seen:
+                self._drop('duplicate')
+            elif self.is_known is not None and not self.is_known(principal_id):
+                self._drop('unknownId')
+            else:
+                self.seen.add(principal_id)
+                activities.append(activity)
+        return {**day, 'day': day.get('day', index + 1), 'activities': activities}
+
+    def flush_stats(self):
+        if self.dropped:
+            print(f"Actividades del modelo descartadas: {self.dropped}")
+            llm_output_stats.record_dropped(self.dropped)
+            self.dropped = {}
+
+
+def validate_itinerary(body, is_known=None):
+    validator = ItineraryValidator(is_known)
+    days = [validator.day(day, index) for index, day in enumerate(body.get('itinerary', []))]
+    validator.flush_stats()
+    return {**body, 'itinerary': [day for day in days if day is not None]}
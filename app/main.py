@@ -1,117 +1,186 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import json
+import copy
 from datetime import datetime
-from app.utils import  insert_itinerary_in_background,generate_unique_id
-from app.secrets import get_secret
+from app.utils import generate_unique_id_async, schedule_itinerary_insert
+from app.persistence_queue import PersistenceQueueFull, itinerary_write_queue
+from app.async_utils import run_blocking, submit_background
+from app.id_allocator import itinerary_id_allocator
+from app.db import db
+from app.secrets import get_secrets, secret_cache
+from app.startup import startup, warm_dynamodb_clients
+from app.metrics import GaugeCallback, MetricsMiddleware, llm_tokens, record_stage, registry, stage
 from pinecone import Pinecone
 from langchain_pinecone import PineconeVectorStore
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
-import boto3
+from langchain_core.callbacks import AsyncCallbackHandler
 from app.country_code_service import router as country_code_router 
 from app.activities_service import router as activities_router
 from app.destinations_service import router as destination_router
-from typing import Optional
+from app.itineraries_service import router as itineraries_router
+from app.itinerary_store import itinerary_store
+from app.guide_cache import guide_cache, build_guide_cache_key
+from app.json_stream import ItineraryStreamParser
+from app.llm_output import (
+    ITINERARY_RESPONSE_FORMAT,
+    ItineraryOutputError,
+    ItineraryValidator,
+    llm_output_stats,
+    parse_itinerary_output,
+    validate_itinerary,
+)
+from app.guide_jobs import GuideJobPool, GuideJobQueueFull, build_job_store
+from app import config
+from app.activity_catalog import activity_catalog
+from app.destination_index import destination_index
+from app.geo_index import geo_index
+from app.opening_hours import opening_hours_index
+from app.retrieval import HashingEmbeddings, LocalVectorStore, ScopedActivityRetriever, build_retrieval_scope, retrieval_scope
+from app.planner import plan_itinerary, replacement_rules
+from app.retrieval_cache import CachedVectorStore, wrap_embeddings, wrap_vector_store
+from app.activity_loader import batch_get_activities
+from app.activity_projection import ENRICHMENT_ATTRIBUTES, format_enrichment_item
+from app.activity_coalescer import CoalescingActivityLoader
+from typing import List, Optional
+from collections import OrderedDict
 import threading
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+async def warm_up():
+    # Arranque en paralelo: secretos y catálogo primero; después la cadena QA, los clientes de
+    # DynamoDB, el pool de Postgres y el bloque de IDs. /health no responde "ok" hasta terminar
+    startup.begin()
+    first = [('secrets', get_secrets, [config.PINECONE_SECRET_NAME, config.OPENAI_SECRET_NAME, config.DB_SECRET_NAME])]
+    if config.CATALOG_ENABLED:
+        # Sin catálogo los endpoints siguen funcionando contra DynamoDB
+        first.append(('catalog', activity_catalog.load))
+    await startup.run_parallel(first)
+    if config.CATALOG_ENABLED:
+        activity_catalog.start_background_refresh()
+
+    second = [
+        ('qaChain', initialize_services),
+        ('dynamodb', warm_dynamodb_clients),
+        ('postgresPool', db.warm),
+    ]
+    if itinerary_id_allocator is not None:
+        # Reservar el primer bloque de IDs antes de la primera petición
+        second.append(('idBlock', itinerary_id_allocator.refill))
+    await startup.run_parallel(second)
+    startup.finish()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # El índice de destinos se mantiene con cada recarga del catálogo
+    destination_index.load_persisted()
+    activity_catalog.add_listener(destination_index.on_catalog_loaded)
+    activity_catalog.add_listener(geo_index.on_catalog_loaded)
+    activity_catalog.add_listener(opening_hours_index.on_catalog_loaded)
+    warm_up_task = None
+    if config.WARMUP_ENABLED:
+        warm_up_task = asyncio.create_task(warm_up())
+    else:
+        if config.CATALOG_ENABLED:
+            try:
+                await run_blocking(activity_catalog.load)
+            except Exception as e:
+                # Sin catálogo los endpoints siguen funcionando contra DynamoDB
+                print(f"Error al cargar el catálogo de actividades: {e}")
+            activity_catalog.start_background_refresh()
+        if itinerary_id_allocator is not None:
+            submit_background(itinerary_id_allocator.refill)
+        startup.begin()
+        startup.finish()
+    if itinerary_write_queue is not None:
+        itinerary_write_queue.start()
+    await guide_job_pool.start()
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await guide_job_pool.stop()
+    if itinerary_write_queue is not None:
+        # Escribir los itinerarios pendientes antes de terminar el proceso
+        await run_blocking(itinerary_write_queue.stop, config.PERSIST_SHUTDOWN_TIMEOUT_SECONDS)
+    db.close_all_connections()
+    activity_catalog.stop()
 
 # Inicializamos FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# Latencia por ruta en /metrics y cabecera Server-Timing con las etapas de cada petición
+app.add_middleware(MetricsMiddleware)
 
 # Reutilización de Pinecone y LangChain
 pinecone_client = None
 vector_store = None
 llm = None
 qa_chain = None
-dynamodb = boto3.client('dynamodb')
 
 def remove_duplicates(principal_ids):
-    # Convertir la lista en un conjunto para eliminar duplicados y luego convertir de nuevo a lista
-    return list(set(principal_ids))
-
-def query_dynamo(principal_ids):
-    try:
-        print(f"Data input: {principal_ids}")
-        ids = remove_duplicates(principal_ids)
-        print(f"Data sin duplicados: {ids}")
-        # Preparar la estructura de Keys para batch_get_item
-        keys = [{'principalId': {'S': principal_id}} for principal_id in ids]
-
-       
-        
-        # Realizar la consulta en batch
-        response = dynamodb.batch_get_item(
-            RequestItems={
-                'tutur-activities': {
-                    'Keys': keys,
-                    'ProjectionExpression': 'principalId, description,location_lat,location_lng,totalScore, reviewsCount, estimated_time, opening_hours, s3Images,destinationId, city'
-                }
-            }
-        )
-        
-        # Procesar los resultados
-        items = response.get('Responses', {}).get('tutur-activities', [])
-        
-        # Formatear los resultados
-        result = []
-        for item in items:
-            # Extraer los datos de s3Images si existen
-            s3_images = item.get('s3Images', {}).get('M', {})  # Acceder al mapa dentro de s3Images
-            
-            formatted_item = {
-                'principalId': item['principalId']['S'],
-                'description': item.get('description', {}).get('S', ''),
-                'coordinates': {
-                    'latitude':float(item.get('location_lat', {}).get('N', 0.0)),
-                    'longitude':float(item.get('location_lng', {}).get('N', 0.0))
-                },
-                'totalScore': float(item.get('totalScore', {}).get('N', 0.0)),
-                'reviewsCount': int(item.get('reviewsCount', {}).get('N', 0)),
-                'estimated_time': item.get('estimated_time', {}).get('S', ''),
-                'opening_hours': item.get('opening_hours', {}).get('S', ''),
-                's3Images': {
-                    's3MainImageUrl': s3_images.get('s3MainImageUrl', {}).get('S', ''),
-                    's3DetailImageUrl': s3_images.get('s3DetailImageUrl', {}).get('S', ''),
-                    's3ExpandImageUrl': s3_images.get('s3ExpandImageUrl', {}).get('S', '')
-                },
-                'destinationId': item.get('destinationId', {}).get('S', ''),
-                'destination': item.get('city', {}).get('S', '')
-            }
-            result.append(formatted_item)
-        
-        return result
-    
-    except Exception as e:
-        print(f"Error al consultar DynamoDB: {str(e)}")
-        return None
+    # Elimina duplicados conservando el orden de aparición
+    return list(dict.fromkeys(principal_ids))
 
 
+_services_lock = threading.Lock()
 
 def initialize_services():
+    # Doble verificación: bajo concurrencia solo una petición construye los clientes
+    if qa_chain is not None:
+        return
+    with _services_lock:
+        if qa_chain is None:
+            _build_services()
+
+def _build_services():
     global pinecone_client, vector_store, llm, qa_chain
-    if not pinecone_client:
-        # Obtener secretos solo una vez
-        pinecone_secrets = get_secret("pinecone-tutur-test")
-        openai_secrets = get_secret("gpt-tutur-test")
-        
-        pinecone_api_key = pinecone_secrets.get('api-key')
-        openai_api_key = openai_secrets.get('api-key')
+    # Ambos secretos en paralelo (normalmente ya están en la caché del arranque)
+    secrets = get_secrets([config.PINECONE_SECRET_NAME, config.OPENAI_SECRET_NAME])
+
+    pinecone_api_key = secrets[config.PINECONE_SECRET_NAME].get('api-key')
+    openai_api_key = secrets[config.OPENAI_SECRET_NAME].get('api-key')
 
+    if config.VECTOR_STORE == "local":
+        # Vector store en memoria construido desde el catálogo, sin Pinecone ni embeddings remotos
+        embeddings = wrap_embeddings(HashingEmbeddings())
+        vector_store = LocalVectorStore.from_catalog(activity_catalog.snapshot, embeddings)
+    else:
         pinecone_client = Pinecone(api_key=pinecone_api_key)
         index = pinecone_client.Index("tutur-vector")
-        embeddings = OpenAIEmbeddings(model="text-embedding-ada-002", openai_api_key=openai_api_key)
+        # Caché de embeddings de la consulta y de resultados top-k delante de OpenAI y Pinecone
+        embeddings = wrap_embeddings(OpenAIEmbeddings(model="text-embedding-ada-002", openai_api_key=openai_api_key))
         vector_store = PineconeVectorStore(index=index, embedding=embeddings)
-        
-        retriever = vector_store.as_retriever()
-        llm = ChatOpenAI(model="gpt-4o-mini", openai_api_key=openai_api_key)
-
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True
-        )
+    vector_store = wrap_vector_store(vector_store, embeddings)
+
+    # Búsqueda acotada al destino y categorías de la petición, deduplicada por principalId
+    retriever = ScopedActivityRetriever(
+        vector_store=vector_store,
+        embeddings=embeddings,
+        k=config.RETRIEVAL_TOP_K,
+        fetch_k=max(config.RETRIEVAL_FETCH_K, config.RETRIEVAL_TOP_K)
+    )
+    # streaming=True permite recibir los tokens por callback en /generate-guide/stream;
+    # stream_usage=True mantiene el conteo de tokens también en streaming
+    llm_options = {}
+    if config.LLM_STRUCTURED_OUTPUT:
+        # El modelo solo puede responder con JSON que cumpla el esquema del itinerario
+        llm_options["model_kwargs"] = {"response_format": ITINERARY_RESPONSE_FORMAT}
+    llm = ChatOpenAI(
+        model="gpt-4o-mini", openai_api_key=openai_api_key, streaming=True, stream_usage=True,
+        callbacks=[_LLMMetricsHandler("gpt-4o-mini")], **llm_options
+    )
+
+    qa_chain = RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=retriever,
+        return_source_documents=True
+    )
 
 # Función para hacer el merge de los datos de DynamoDB con las actividades del itinerario
 def merge_activity_data(itinerary, dynamo_dict):
@@ -152,134 +221,641 @@ class GuideRequest(BaseModel):
     endDatetime: str = Field(..., description="End datetime in format YYYY-MM-DD HH:MM:SS")
     
 
-@app.post("/generate-guide")
-def generate_guide(request: GuideRequest):
+GUIDE_PROMPT_TEMPLATE = """
+Actúa como un asistente de viajes especializado en turismo familiar en {city}, {country}. 
+Tu objetivo es generar un itinerario turístico personalizado para un grupo familiar compuesto por {participants}. 
+Las actividades deben ser de estas categorias: {activities} y el itinerario se desarrollará entre {startDatetime} y {endDatetime}. 
+A continuación se detallan las reglas que debes seguir:
+
+Proporciona lugares exclusivamente dentro del destino {city} ESTO ES OBLIGATORIO.
+Todos los lugares seleccionados deben coincidir con la necesidad de actividad solicitada: {activities}.
+Asegúrate de que los lugares estén abiertos en las fechas y horas seleccionadas, respetando los horarios de apertura y cierre de cada lugar.
+El tiempo total de todas las actividades en un día debe ser menor o igual a 10 horas. Usa el tiempo estimado de cada actividad para realizar este cálculo.
+Determina el lugar que más se ajusta a las respuestas del formulario en términos de popularidad, reseñas, y adecuación para el grupo familiar (TOP 1).
+La distancia entre cada actividad seleccionada no debe exceder los 5 km lineales.
+El itinerario debe estar segmentado por día iniciando de 1 a N.
+Si no hay actividades suficientes que cumplan con todos los requisitos, ajusta las opciones cercanas dentro del destino {city}, 
+pero siempre asegúrate de que la suma de tiempo sea menor o igual a las 10 horas diarias y que los lugares estén abiertos en los horarios indicados.
+Si todavía queda tiempo que cubrir, no lo hagas; deja la guía hasta ese punto.
+No incluyas actividades de otras ciudades diferentes a {city}.
+No repitas actividades.
+
+Datos adicionales:
+Fecha de inicio: {startDatetime}
+Fecha de finalización: {endDatetime}
+Participantes: {participants}
+
+Para cada lugar del itinerario, proporciona los siguientes datos NO INCLUIR NADA ADICIONAL A ESTOS 4 ATRIBUTOS:
+- Id unico o PrincipalId (este campo es mandatorio y debe salir de la base de conocimientos no autogeneres ni te inventes) y el nombre de esta eqtiqueta simepre debe ser principalId
+- Nombre del lugar (este campo es mandatorio y debe salir de la base de conocimientos no autogeneres ni te inventes)y el nombre de esta eqtiqueta simepre debe ser name
+
+El formato de salida debe ser formato json (las claves deben estar en ingles en formato lower camel case) y formateado a utf-8 y todo debe ser envuelto en un objeto padre llamado itinerary que sera un array de los días, no incluyas nada adicional que no sea la respuesta.
+"""
+
+guide_prompt = PromptTemplate(
+    template=GUIDE_PROMPT_TEMPLATE,
+    input_variables=["country", "city", "participants", "activities", "startDatetime", "endDatetime"]
+)
+
+
+def parse_guide_dates(request):
     try:
-              
-        initialize_services()
-                
-        try:
-            start_dt = datetime.strptime(request.startDatetime, "%Y-%m-%d %H:%M:%S")
-            end_dt = datetime.strptime(request.endDatetime, "%Y-%m-%d %H:%M:%S")
-        except ValueError as ve:
-            raise HTTPException(status_code=400, detail=f"Invalid date format. Use 'YYYY-MM-DD HH:MM:SS'. {ve}")
-        
-        formatted_start_datetime = start_dt.strftime("%Y-%m-%d %H:%M:%S")
-        formatted_end_datetime = end_dt.strftime("%Y-%m-%d %H:%M:%S")
- 
-        participants_text = ', '.join([f"{key}: {value}" for key, value in request.participants.items()])
-        activities_text = ', '.join(request.activities)
-
-        prompt_template = """
-        Actúa como un asistente de viajes especializado en turismo familiar en {city}, {country}. 
-        Tu objetivo es generar un itinerario turístico personalizado para un grupo familiar compuesto por {participants}. 
-        Las actividades deben ser de estas categorias: {activities} y el itinerario se desarrollará entre {startDatetime} y {endDatetime}. 
-        A continuación se detallan las reglas que debes seguir:
-
-        Proporciona lugares exclusivamente dentro del destino {city} ESTO ES OBLIGATORIO.
-        Todos los lugares seleccionados deben coincidir con la necesidad de actividad solicitada: {activities}.
-        Asegúrate de que los lugares estén abiertos en las fechas y horas seleccionadas, respetando los horarios de apertura y cierre de cada lugar.
-        El tiempo total de todas las actividades en un día debe ser menor o igual a 10 horas. Usa el tiempo estimado de cada actividad para realizar este cálculo.
-        Determina el lugar que más se ajusta a las respuestas del formulario en términos de popularidad, reseñas, y adecuación para el grupo familiar (TOP 1).
-        La distancia entre cada actividad seleccionada no debe exceder los 5 km lineales.
-        El itinerario debe estar segmentado por día iniciando de 1 a N.
-        Si no hay actividades suficientes que cumplan con todos los requisitos, ajusta las opciones cercanas dentro del destino {city}, 
-        pero siempre asegúrate de que la suma de tiempo sea menor o igual a las 10 horas diarias y que los lugares estén abiertos en los horarios indicados.
-        Si todavía queda tiempo que cubrir, no lo hagas; deja la guía hasta ese punto.
-        No incluyas actividades de otras ciudades diferentes a {city}.
-        No repitas actividades.
-
-        Datos adicionales:
-        Fecha de inicio: {startDatetime}
-        Fecha de finalización: {endDatetime}
-        Participantes: {participants}
-
-        Para cada lugar del itinerario, proporciona los siguientes datos NO INCLUIR NADA ADICIONAL A ESTOS 4 ATRIBUTOS:
-        - Id unico o PrincipalId (este campo es mandatorio y debe salir de la base de conocimientos no autogeneres ni te inventes) y el nombre de esta eqtiqueta simepre debe ser principalId
-        - Nombre del lugar (este campo es mandatorio y debe salir de la base de conocimientos no autogeneres ni te inventes)y el nombre de esta eqtiqueta simepre debe ser name
-
-        El formato de salida debe ser formato json (las claves deben estar en ingles en formato lower camel case) y formateado a utf-8 y todo debe ser envuelto en un objeto padre llamado itinerary que sera un array de los días, no incluyas nada adicional que no sea la respuesta.
-        """
-
-        prompt = PromptTemplate(
-            template=prompt_template,
-            input_variables=["country", "city", "participants", "activities", "startDatetime", "endDatetime"]
+        start_dt = datetime.strptime(request.startDatetime, "%Y-%m-%d %H:%M:%S")
+        end_dt = datetime.strptime(request.endDatetime, "%Y-%m-%d %H:%M:%S")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format. Use 'YYYY-MM-DD HH:MM:SS'. {ve}")
+    return start_dt, end_dt
+
+
+def build_guide_prompt(request, start_dt, end_dt):
+    participants_text = ', '.join([f"{key}: {value}" for key, value in request.participants.items()])
+    activities_text = ', '.join(request.activities)
+
+    return guide_prompt.format(
+        country=request.country,
+        city=request.city,
+        participants=participants_text,
+        activities=activities_text,
+        startDatetime=start_dt.strftime("%Y-%m-%d %H:%M:%S"),
+        endDatetime=end_dt.strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+
+def known_activity_check(result=None):
+    # principalId válidos: los del catálogo en memoria y los de los documentos recuperados
+    # para el prompt; None si no hay con qué validar (se filtran luego al enriquecer)
+    source_ids = {
+        document.metadata.get('principalId') for document in (result or {}).get('source_documents') or []
+    }
+    source_ids.discard(None)
+    if not activity_catalog.ready and not source_ids:
+        return None
+    return lambda principal_id: principal_id in source_ids or activity_catalog.get(principal_id) is not None
+
+
+def parse_model_output(result):
+    output_text = result.get('result', '')
+
+    try:
+        # Tolera bloques ```json, texto adicional y respuestas truncadas
+        body = parse_itinerary_output(output_text)
+    except ItineraryOutputError as e:
+        # Imprimir el error y la parte problemática del texto para depuración
+        print(f"Error al decodificar JSON: {e}")
+        print(f"Texto problemático: {output_text}")
+        raise HTTPException(status_code=500, detail=f"Error al decodificar la respuesta JSON: {str(e)}")
+
+    # Descartar ids inventados o repetidos antes de consultar DynamoDB
+    body = validate_itinerary(body, known_activity_check(result))
+    print(f"respuesta IA:{body}")
+    return body
+
+
+def extract_principal_ids(body):
+    # Usar una list comprehension para extraer todos los 'principalId'
+    return [
+        activity['principalId']
+        for day in body['itinerary']
+        for activity in day['activities']
+        if 'principalId' in activity  # Verificamos si 'principalId' existe
+    ]
+
+
+def apply_activity_data(body, db_response):
+    # Verificar si db_response es None
+    if db_response is None:
+        raise HTTPException(status_code=500, detail="Error al consultar DynamoDB o no se encontraron resultados.")
+    # Crear un diccionario de acceso rápido con principalId como clave
+    dynamo_dict = {item['principalId']: item for item in db_response}
+    # Hacer el merge de los datos de DynamoDB con el itinerario
+    body['itinerary'] = merge_activity_data(body['itinerary'], dynamo_dict)
+    return body
+
+
+def fetch_enrichment_items(principal_ids):
+    return batch_get_activities(principal_ids, attributes=ENRICHMENT_ATTRIBUTES)
+
+
+# Agrupa en una sola lectura las claves que piden las peticiones concurrentes
+activity_coalescer = CoalescingActivityLoader(fetch=fetch_enrichment_items)
+
+
+async def query_dynamo_async(principal_ids):
+    try:
+        with stage('enrichment'):
+            ids = remove_duplicates(principal_ids)
+
+            # Resolver primero desde el catálogo en memoria
+            cached_items, missing_ids = activity_catalog.get_many(ids)
+            items = list(cached_items.values())
+
+            if missing_ids:
+                # boto3 no tiene soporte asyncio: el lote agrupado corre en el executor de I/O
+                fetched_items = await activity_coalescer.load_many(missing_ids)
+                items.extend(fetched_items.values())
+
+            return [format_enrichment_item(item) for item in items]
+
+    except Exception as e:
+        print(f"Error al consultar DynamoDB: {str(e)}")
+        return None
+
+
+async def generate_itinerary_with_llm(request, start_dt, end_dt):
+    with stage('init'):
+        await run_blocking(initialize_services)
+    formatted_prompt = build_guide_prompt(request, start_dt, end_dt)
+
+    # Ejecutar el flujo de QA sin ocupar un hilo mientras esperamos al modelo
+    qa_start_time = datetime.now()
+    retrieval_scope.set(build_retrieval_scope(request))
+    result = await qa_chain.ainvoke({"query": formatted_prompt})
+    qa_end_time = datetime.now()
+    print(f"Tiempo de ejecución del flujo QA: {(qa_end_time - qa_start_time).total_seconds()} segundos")
+
+    with stage('parse'):
+        return parse_model_output(result)
+
+
+def plan_locally(request, start_dt, end_dt):
+    plan_start_time = datetime.now()
+    with stage('planner'):
+        body = plan_itinerary(request, start_dt, end_dt)
+    if body is not None:
+        print(f"Itinerario generado por el planificador local en: {(datetime.now() - plan_start_time).total_seconds()} segundos")
+    return body
+
+
+async def generate_itinerary(request, start_dt, end_dt):
+    # Devuelve (itinerario, generado_por_llm); el planificador local responde en modo
+    # "primary" o, en modo "fallback", cuando el LLM falla, excede el timeout o no devuelve JSON
+    if config.PLANNER_MODE == "primary":
+        body = plan_locally(request, start_dt, end_dt)
+        if body is not None:
+            return body, False
+
+    if config.PLANNER_MODE != "fallback":
+        return await generate_itinerary_with_llm(request, start_dt, end_dt), True
+
+    try:
+        body = await asyncio.wait_for(generate_itinerary_with_llm(request, start_dt, end_dt), config.LLM_TIMEOUT_SECONDS)
+        return body, True
+    except Exception as e:
+        body = plan_locally(request, start_dt, end_dt)
+        if body is None:
+            raise
+        print(f"Error en el flujo QA, se usa el planificador local: {e!r}")
+        return body, False
+
+
+async def build_guide_details(request, enrich=None):
+    # Itinerario enriquecido sin ID ni persistencia; enrich permite compartir lecturas en un lote
+    start_dt, end_dt = parse_guide_dates(request)
+
+    # Buscar primero en la caché de itinerarios para evitar la llamada al LLM
+    cache_key = build_guide_cache_key(request, start_dt, end_dt) if guide_cache else None
+    body = guide_cache.get(cache_key) if guide_cache else None
+
+    if body is None:
+        body, from_llm = await generate_itinerary(request, start_dt, end_dt)
+        # Solo se cachean las respuestas del LLM: el planificador es determinista y barato
+        if guide_cache and from_llm and body.get('itinerary'):
+            guide_cache.put(cache_key, body)
+    else:
+        print(f"Itinerario recuperado de la caché: {cache_key}")
+
+    db_response = await (enrich or query_dynamo_async)(extract_principal_ids(body))
+    body = apply_activity_data(body, db_response)
+    if config.REPAIR_DISTANCE_VIOLATIONS:
+        # Corregir las actividades que incumplen la regla de los 5 km sin volver a llamar al LLM
+        # Los reemplazos respetan categorías, horarios y el tiempo de cada día
+        geo_index.repair_itinerary(
+            body['itinerary'], format_enrichment_item,
+            lambda index: replacement_rules(request, start_dt, end_dt, index)
         )
+    return body
 
-        formatted_prompt = prompt.format(
-            country=request.country,
-            city=request.city,
-            participants=participants_text,
-            activities=activities_text,
-            startDatetime=formatted_start_datetime,
-            endDatetime=formatted_end_datetime
+
+async def persist_guide(tourist_guide_id, client_id, body):
+    # Reabrir la guía recién generada no depende de que la escritura ya esté en Postgres;
+    # se guarda antes de encolar para que un fallo temprano de la escritura la pueda retirar
+    itinerary_store.remember(tourist_guide_id, client_id, body)
+    try:
+        await schedule_itinerary_insert(tourist_guide_id, client_id, body, on_failure=itinerary_store.forget)
+    except PersistenceQueueFull:
+        itinerary_store.forget(tourist_guide_id)
+        raise HTTPException(
+            status_code=503,
+            detail="Too many pending itinerary writes, retry later",
+            headers={"Retry-After": "5"}
         )
-        # Ejecutar el flujo de QA
-        qa_start_time = datetime.now()
-        result = qa_chain.invoke({"query": formatted_prompt})
-        qa_end_time = datetime.now()
-        print(f"Tiempo de ejecución del flujo QA: {(qa_end_time - qa_start_time).total_seconds()} segundos")
 
-        output_text = result.get('result', '')
 
-        if not output_text.strip():
-            raise HTTPException(status_code=500, detail="Empty response from the model.")
-        
-        # Remover cualquier contenido adicional que no sea JSON
-        output_text = output_text.strip()
+async def build_guide(request: GuideRequest):
+    body = await build_guide_details(request)
 
-        # Remover la posible envoltura de markdown y caracteres extraños
-        if output_text.startswith("```json"):
-            output_text = output_text[7:-3].strip()  # Eliminar los delimitadores "```json"
+    # Generar el touristGuideId y persistir en segundo plano
+    db_start_time = datetime.now()
+    tourist_guide_id = await generate_unique_id_async()
+    await persist_guide(tourist_guide_id, request.clientId, body)
+    db_end_time = datetime.now()
+    print(f"Tiempo de ejecución alamcenamiento de la bd: {(db_end_time - db_start_time).total_seconds()} segundos")
 
-        try:
-            body = json.loads(output_text)
+    return {
+        "touristGuideId": tourist_guide_id,
+        "guideDetails": body
+    }
 
-        except json.JSONDecodeError as e:
-            # Imprimir el error y la parte problemática del texto para depuración
-            print(f"Error al decodificar JSON: {e}")
-            print(f"Texto problemático: {output_text}")
-            raise HTTPException(status_code=500, detail=f"Error al decodificar la respuesta JSON: {str(e)}")
-        
-        print(f"respuesta IA:{body}")
-        # Usar una list comprehension para extraer todos los 'principalId'
-        principal_ids = [
-            activity['principalId']
-            for day in body['itinerary']
-            for activity in day['activities']
-            if 'principalId' in activity  # Verificamos si 'principalId' existe
-        ]
-        db_response = query_dynamo(principal_ids)
-        # Verificar si db_response es None
-        if db_response is None:
-            raise HTTPException(status_code=500, detail="Error al consultar DynamoDB o no se encontraron resultados.")
-        # Crear un diccionario de acceso rápido con principalId como clave
-        dynamo_dict = {item['principalId']: item for item in db_response}
-        # Hacer el merge de los datos de DynamoDB con el itinerario
-        merged_itinerary = merge_activity_data(body['itinerary'], dynamo_dict)
-        body['itinerary'] = merged_itinerary
-        # Generar un código aleatorio para touristGuideId
-        db_start_time = datetime.now()
-        tourist_guide_id = generate_unique_id()
-        thread = threading.Thread(target=insert_itinerary_in_background, args=(tourist_guide_id,request.clientId, body))
-        thread.start() 
-        db_end_time = datetime.now()
-        print(f"Tiempo de ejecución alamcenamiento de la bd: {(db_end_time - db_start_time).total_seconds()} segundos")
-
-        # Devolver la respuesta
-        return {
-            "touristGuideId": tourist_guide_id,
-            "guideDetails": body
-        }
+
+@app.post("/generate-guide")
+async def generate_guide(request: GuideRequest):
+    try:
+        return await build_guide(request)
 
     except HTTPException as http_ex:
         raise http_ex  # Relanzar excepciones HTTP ya manejadas
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class _LLMMetricsHandler(AsyncCallbackHandler):
+    # Duración de cada llamada al modelo y tokens consumidos, para /metrics y Server-Timing
+    def __init__(self, model):
+        self.model = model
+        self._started = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    async def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            record_stage('llm', time.perf_counter() - started)
+        prompt_tokens, completion_tokens = 0, 0
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        if usage:
+            prompt_tokens, completion_tokens = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+        else:
+            # En streaming el uso llega en los metadatos del mensaje
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                    prompt_tokens += metadata.get('input_tokens', 0)
+                    completion_tokens += metadata.get('output_tokens', 0)
+        if prompt_tokens:
+            llm_tokens.inc(prompt_tokens, model=self.model, type='prompt')
+        if completion_tokens:
+            llm_tokens.inc(completion_tokens, model=self.model, type='completion')
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+
+class _TokenQueueHandler(AsyncCallbackHandler):
+    # Recibe los tokens del LLM a medida que se generan
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def on_llm_new_token(self, token, **kwargs):
+        self.queue.put_nowait(token)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def enrich_day(day, used_ids, rules=None):
+    ids = [activity['principalId'] for activity in day.get('activities', []) if 'principalId' in activity]
+    db_response = await query_dynamo_async(ids)
+    if db_response is None:
+        raise HTTPException(status_code=500, detail="Error al consultar DynamoDB o no se encontraron resultados.")
+    dynamo_dict = {item['principalId']: item for item in db_response}
+    day = merge_activity_data([day], dynamo_dict)[0]
+    # used_ids acumula las actividades ya emitidas para no repetirlas en los reemplazos
+    used_ids.update(ids)
+    if config.REPAIR_DISTANCE_VIOLATIONS:
+        geo_index.repair_day(day, used_ids, format_enrichment_item, rules)
+    return day
+
+
+async def stream_llm_days(request, start_dt, end_dt):
+    # Días del itinerario a medida que el LLM los genera; en modo "fallback" el timeout
+    # aplica hasta recibir el primer día
+    with stage('init'):
+        await run_blocking(initialize_services)
+    formatted_prompt = build_guide_prompt(request, start_dt, end_dt)
+    parser = ItineraryStreamParser()
+    validator = ItineraryValidator(known_activity_check())
+    handler = _TokenQueueHandler()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.LLM_TIMEOUT_SECONDS if config.PLANNER_MODE == "fallback" else None
+    days_emitted = 0
+
+    qa_start_time = datetime.now()
+    # La tarea copia el contexto actual, incluido el alcance de la recuperación
+    retrieval_scope.set(build_retrieval_scope(request))
+    task = asyncio.ensure_future(qa_chain.ainvoke({"query": formatted_prompt}, config={"callbacks": [handler]}))
+    task.add_done_callback(lambda _: handler.queue.put_nowait(None))
+    try:
+        while True:
+            timeout = deadline - loop.time() if deadline is not None and not days_emitted else None
+            token = await asyncio.wait_for(handler.queue.get(), timeout)
+            if token is None:
+                break
+            for day in parser.feed(token):
+                day = validator.day(day, days_emitted)
+                if day is None:
+                    continue
+                if not days_emitted:
+                    print(f"Primer día recibido en: {(datetime.now() - qa_start_time).total_seconds()} segundos")
+                days_emitted += 1
+                yield day
+        # Propaga cualquier error de la cadena una vez agotados los tokens
+        result = await task
+    finally:
+        if not task.done():
+            task.cancel()
+    print(f"Tiempo de ejecución del flujo QA: {(datetime.now() - qa_start_time).total_seconds()} segundos")
+    validator.flush_stats()
+
+    if days_emitted:
+        # Sin el cierre del arreglo la respuesta llegó truncada: solo se enviaron los días completos
+        llm_output_stats.record_outcome('parsed' if parser.finished else 'repaired')
+    else:
+        # Si el modelo no emitió tokens parseables, usar la respuesta completa
+        for day in parse_model_output(result).get('itinerary', []):
+            yield day
+
+
+async def stream_guide_events(request: GuideRequest):
+    try:
+        start_dt, end_dt = parse_guide_dates(request)
+        cache_key = build_guide_cache_key(request, start_dt, end_dt) if guide_cache else None
+        cached_body = guide_cache.get(cache_key) if guide_cache else None
+
+        raw_days = []
+        enriched_days = []
+        used_ids = set()
+
+        def day_rules():
+            # Reglas de reemplazo del día que se está enriqueciendo
+            return replacement_rules(request, start_dt, end_dt, len(enriched_days))
+
+        if cached_body is not None:
+            print(f"Itinerario recuperado de la caché: {cache_key}")
+            for day in cached_body.get('itinerary', []):
+                enriched_day = await enrich_day(day, used_ids, day_rules())
+                enriched_days.append(enriched_day)
+                yield sse_event("day", enriched_day)
+        else:
+            planned_body = plan_locally(request, start_dt, end_dt) if config.PLANNER_MODE == "primary" else None
+            if planned_body is None:
+                llm_days = stream_llm_days(request, start_dt, end_dt)
+                try:
+                    async for day in llm_days:
+                        raw_days.append(copy.deepcopy(day))
+                        enriched_day = await enrich_day(day, used_ids, day_rules())
+                        enriched_days.append(enriched_day)
+                        yield sse_event("day", enriched_day)
+                except Exception as e:
+                    # Solo se puede cambiar al planificador si aún no se envió ningún día
+                    if config.PLANNER_MODE != "fallback" or raw_days:
+                        raise
+                    planned_body = plan_locally(request, start_dt, end_dt)
+                    if planned_body is None:
+                        raise
+                    print(f"Error en el flujo QA, se usa el planificador local: {e!r}")
+                finally:
+                    # Cancela la llamada al LLM si el cliente se desconecta a mitad del stream
+                    await llm_days.aclose()
+
+            if planned_body is not None:
+                for day in planned_body['itinerary']:
+                    enriched_day = await enrich_day(day, used_ids, day_rules())
+                    enriched_days.append(enriched_day)
+                    yield sse_event("day", enriched_day)
+            elif guide_cache and raw_days:
+                guide_cache.put(cache_key, {'itinerary': raw_days})
+
+        body = {'itinerary': enriched_days}
+        tourist_guide_id = await generate_unique_id_async()
+        await persist_guide(tourist_guide_id, request.clientId, body)
+        yield sse_event("done", {"touristGuideId": tourist_guide_id, "days": len(enriched_days)})
+
+    except HTTPException as http_ex:
+        yield sse_event("error", {"status": http_ex.status_code, "detail": http_ex.detail})
+    except Exception as e:
+        yield sse_event("error", {"status": 500, "detail": str(e)})
+
+
+@app.post("/generate-guide/stream")
+async def generate_guide_stream(request: GuideRequest):
+    # Server-Sent Events: un evento "day" por cada día enriquecido y un "done" final con el touristGuideId
+    return StreamingResponse(
+        stream_guide_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+class GuideBatchRequest(BaseModel):
+    requests: List[GuideRequest] = Field(..., description="Guide requests to generate")
+
+
+def ndjson_line(data):
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+async def stream_guide_batch(requests):
+    # Peticiones idénticas se generan una sola vez; cada elemento recibe su propio
+    # touristGuideId y los repetidos indican con duplicateOf el índice que se generó
+    groups = OrderedDict()
+    for index, request in enumerate(requests):
+        key = json.dumps(request.model_dump(), sort_keys=True, ensure_ascii=False)
+        groups.setdefault(key, []).append(index)
+
+    semaphore = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+    enrichment = {}
+
+    async def enrich(principal_ids):
+        # Actividades ya leídas por otro elemento del lote no se vuelven a pedir; las lecturas
+        # concurrentes de los elementos en curso se agrupan en el coalescer
+        missing = [principal_id for principal_id in remove_duplicates(principal_ids) if principal_id not in enrichment]
+        if missing:
+            fetched = await query_dynamo_async(missing)
+            if fetched is None:
+                return None
+            enrichment.update((item['principalId'], item) for item in fetched)
+        return [enrichment[principal_id] for principal_id in remove_duplicates(principal_ids) if principal_id in enrichment]
+
+    def error_line(http_ex):
+        return {"status": http_ex.status_code, "detail": http_ex.detail}
+
+    async def persist_item(index, request, body):
+        try:
+            tourist_guide_id = await generate_unique_id_async()
+            # La cola write-behind agrupa las filas del lote en INSERT multi-fila
+            await persist_guide(tourist_guide_id, request.clientId, body)
+            return index, {"touristGuideId": tourist_guide_id, "guideDetails": body}, None
+        except HTTPException as http_ex:
+            return index, None, error_line(http_ex)
+        except Exception as e:
+            return index, None, {"status": 500, "detail": str(e)}
+
+    async def run_group(indexes):
+        async with semaphore:
+            request = requests[indexes[0]]
+            try:
+                body = await build_guide_details(request, enrich)
+            except HTTPException as http_ex:
+                return [(index, None, error_line(http_ex)) for index in indexes]
+            except Exception as e:
+                return [(index, None, {"status": 500, "detail": str(e)}) for index in indexes]
+            return [await persist_item(index, request, copy.deepcopy(body) if index != indexes[0] else body)
+                    for index in indexes]
+
+    tasks = [asyncio.ensure_future(run_group(indexes)) for indexes in groups.values()]
+    first_index = {index: indexes[0] for indexes in groups.values() for index in indexes}
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for index, result, error in await next_done:
+                line = {"index": index}
+                if first_index[index] != index:
+                    line["duplicateOf"] = first_index[index]
+                if result is not None:
+                    succeeded += 1
+                    yield ndjson_line({**line, **result})
+                else:
+                    yield ndjson_line({**line, "error": error})
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    yield ndjson_line({
+        "done": True, "total": len(requests), "succeeded": succeeded, "failed": len(requests) - succeeded,
+        "duplicates": len(requests) - len(groups)
+    })
+
+
+@app.post("/generate-guides/batch")
+async def generate_guides_batch(batch: GuideBatchRequest):
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="The batch must contain at least one request")
+    if len(batch.requests) > config.BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"The batch cannot contain more than {config.BATCH_MAX_REQUESTS} requests")
+    # NDJSON: una línea por petición a medida que termina (con su index) y una línea final de resumen
+    return StreamingResponse(stream_guide_batch(batch.requests), media_type="application/x-ndjson")
+
+
+# Pool acotado de workers para el modo de trabajos: reutiliza el mismo flujo de /generate-guide
+guide_job_pool = GuideJobPool(
+    handler=build_guide,
+    store=build_job_store(),
+    workers=config.GUIDE_JOB_WORKERS,
+    max_queue=config.GUIDE_JOB_MAX_QUEUE
+)
+
+
+@app.post("/generate-guide/jobs", status_code=202)
+async def create_guide_job(request: GuideRequest):
+    try:
+        job_id = await guide_job_pool.submit(request)
+    except GuideJobQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many pending guide jobs, retry later",
+            headers={"Retry-After": "5"}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"jobId": job_id, "status": "queued"}
+
+
+@app.get("/generate-guide/jobs/{job_id}")
+async def get_guide_job(job_id: str):
+    try:
+        job = await guide_job_pool.get(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/generate-guide/cache-stats")
+def get_guide_cache_stats():
+    if not guide_cache:
+        return {"enabled": False}
+    return {"enabled": True, **guide_cache.stats()}
+
+@app.get("/activity-loader/stats")
+def get_activity_loader_stats():
+    return activity_coalescer.stats()
+
+@app.get("/retrieval-cache/stats")
+def get_retrieval_cache_stats():
+    if not isinstance(vector_store, CachedVectorStore):
+        return {"enabled": False}
+    return {"enabled": True, **vector_store.stats()}
+
+@app.get("/persistence/stats")
+def get_persistence_stats():
+    if itinerary_write_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **itinerary_write_queue.stats()}
+
+# Estado de otros módulos expuesto como gauges al generar /metrics
+registry.register(GaugeCallback(
+    'tutur_db_pool_in_use', 'Conexiones de Postgres en uso', lambda: db.connection_pool.stats()['inUse']
+))
+registry.register(GaugeCallback(
+    'tutur_db_pool_idle', 'Conexiones de Postgres libres', lambda: db.connection_pool.stats()['idle']
+))
+registry.register(GaugeCallback(
+    'tutur_db_pool_waiting', 'Hilos esperando una conexión de Postgres', lambda: db.connection_pool.stats()['waiting']
+))
+registry.register(GaugeCallback(
+    'tutur_persist_queue_depth', 'Itinerarios pendientes de escribir en Postgres',
+    lambda: itinerary_write_queue.stats()['queueDepth'] if itinerary_write_queue is not None else None
+))
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/itineraries-cache/stats")
+def get_itineraries_cache_stats():
+    return itinerary_store.stats()
+
+@app.get("/db-pool/stats")
+def get_db_pool_stats():
+    return db.connection_pool.stats()
+
+@app.get("/catalog/stats")
+def get_catalog_stats():
+    return activity_catalog.stats()
+
 app.include_router(country_code_router, prefix="/v1/tutur/info")
 app.include_router(activities_router, prefix="/v1/tutur/info")
 app.include_router(destination_router, prefix="/v1/tutur/info")
+app.include_router(itineraries_router)
 @app.get("/health")
 def health_check():
-    return {"status": "ok heath"}
+    # Readiness: 503 mientras el arranque sigue calentando servicios
+    status = startup.status()
+    if not startup.ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/secrets/stats")
+def get_secrets_stats():
+    return secret_cache.stats()
+
+@app.get("/llm-output/stats")
+def get_llm_output_stats():
+    return {"structuredOutput": config.LLM_STRUCTURED_OUTPUT, **llm_output_stats.stats()}
@@ -0,0 +1,186 @@
+import re
+import unicodedata
+
+import numpy as np
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+
+_DAY_NAMES = {
+    'monday': 0, 'mon': 0, 'lunes': 0, 'lun': 0,
+    'tuesday': 1, 'tues': 1, 'tue': 1, 'martes': 1, 'mar': 1,
+    'wednesday': 2, 'wed': 2, 'miercoles': 2, 'mie': 2,
+    'thursday': 3, 'thurs': 3, 'thur': 3, 'thu': 3, 'jueves': 3, 'jue': 3,
+    'friday': 4, 'fri': 4, 'viernes': 4, 'vie': 4,
+    'saturday': 5, 'sat': 5, 'sabado': 5, 'sab': 5,
+    'sunday': 6, 'sun': 6, 'domingo': 6, 'dom': 6,
+}
+_DAY = r'\b(?:' + '|'.join(sorted(_DAY_NAMES, key=len, reverse=True)) + r')\b\.?'
+_TIME = r'\d{1,2}(?:[:.h]\d{2})?h?\s*(?:am|pm|a\.m\.|p\.m\.)?'
+_TOKENS = re.compile(
+    r'(?P<always>\b24\s*(?:hours|horas|hrs|h)\b)'
+    r'|(?P<closed>\bclosed\b|\bcerrado\b)'
+    r'|(?P<everyday>\btodos los dias\b|\bdiario\b|\bdaily\b|\bevery ?day\b)'
+    r'|(?P<timerange>' + _TIME + r'\s*(?:-|to|a|hasta)\s*' + _TIME + r')'
+    r'|(?P<dayrange>' + _DAY + r'\s*(?:-|to|a|al|through)\s*' + _DAY + r')'
+    r'|(?P<day>' + _DAY + r')'
+)
+_TIME_PARTS = re.compile(r'(\d{1,2})(?:[:.h](\d{2}))?h?\s*(am|pm|a\.m\.|p\.m\.)?')
+_DAY_WORD = re.compile(_DAY)
+
+
+def _normalize(text):
+    # Los guiones largos se sustituyen antes de descartar los caracteres no ASCII
+    text = str(text).replace('–', '-').replace('—', '-').replace('\u202f', ' ')
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def _to_minutes(hour, minute, meridiem):
+    hour = int(hour)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.startswith('p') else 0)
+    return min(hour, 24) * 60 + int(minute or 0)
+
+
+def _parse_time_range(text):
+    (open_h, open_m, open_mer), (close_h, close_m, close_mer) = _TIME_PARTS.findall(text)[:2]
+    # "2 - 5 pm": la hora de apertura hereda el meridiano del cierre si sigue siendo anterior
+    if close_mer and not open_mer and _to_minutes(open_h, open_m, close_mer) < _to_minutes(close_h, close_m, close_mer):
+        open_mer = close_mer
+    return _to_minutes(open_h, open_m, open_mer), _to_minutes(close_h, close_m, close_mer)
+
+
+def _day_range(text):
+    first, last = [_DAY_NAMES[word.rstrip('.')] for word in _DAY_WORD.findall(text)[:2]]
+    return [(first + offset) % 7 for offset in range((last - first) % 7 + 1)]
+
+
+def compile_opening_hours(text):
+    # Texto libre ("Lunes a Viernes: 9:00 - 18:00, Sábado: 10-14", "Monday: 9 AM - 5 PM",
+    # "Abierto 24 horas") -> matriz booleana (7, SLOTS_PER_DAY) de franjas de 15 minutos
+    # completamente abiertas; None si no hay nada reconocible
+    schedule = np.zeros((7, SLOTS_PER_DAY), dtype=bool)
+    days = []
+    days_consumed = False
+    known = False
+
+    for match in _TOKENS.finditer(_normalize(text or '')):
+        kind = match.lastgroup
+        if kind in ('day', 'dayrange', 'everyday'):
+            if days_consumed:
+                days = []
+                days_consumed = False
+            if kind == 'day':
+                days.append(_DAY_NAMES[match.group().rstrip('.')])
+            elif kind == 'dayrange':
+                days.extend(_day_range(match.group()))
+            else:
+                days.extend(range(7))
+            continue
+
+        known = True
+        days_consumed = True
+        target_days = days or list(range(7))
+        if kind == 'always':
+            schedule[target_days, :] = True
+        elif kind == 'timerange':
+            opens, closes = _parse_time_range(match.group())
+            if closes <= opens:
+                closes += 24 * 60
+            first_slot = -(-opens // SLOT_MINUTES)
+            last_slot = closes // SLOT_MINUTES
+            for day in target_days:
+                for slot in range(first_slot, last_slot):
+                    # Los horarios que pasan de medianoche continúan en el día siguiente
+                    schedule[(day + slot // SLOTS_PER_DAY) % 7, slot % SLOTS_PER_DAY] = True
+
+    return schedule if known else None
+
+
+def _slot_bounds(weekday, start_minute, end_minute):
+    start = int(weekday) * SLOTS_PER_DAY + int(start_minute) // SLOT_MINUTES
+    end = int(weekday) * SLOTS_PER_DAY + -(-int(end_minute) // SLOT_MINUTES)
+    return start, max(end, start + 1)
+
+
+class OpeningHoursIndex:
+    # Horarios compilados una vez por carga del catálogo: una fila de bits empaquetados
+    # (7 días x 96 franjas = 84 bytes) por actividad, consultable en bloque con NumPy
+    def __init__(self):
+        # (rows, bits, known) en una sola tupla inmutable: se reemplaza con una asignación
+        # para que una consulta concurrente nunca mezcle filas de una carga con bits de otra
+        self._state = ({}, np.zeros((0, SLOTS_PER_WEEK // 8), dtype=np.uint8), np.zeros(0, dtype=bool))
+
+    @property
+    def ready(self):
+        rows, _, _ = self._state
+        return bool(rows)
+
+    def on_catalog_loaded(self, snapshot):
+        compiled = {}
+        rows = {}
+        bits = np.zeros((len(snapshot.items), SLOTS_PER_WEEK // 8), dtype=np.uint8)
+        known = np.zeros(len(snapshot.items), dtype=bool)
+        for row, item in enumerate(snapshot.items):
+            rows[item['principalId']] = row
+            text = str(item.get('opening_hours') or '')
+            # Muchos textos se repiten entre actividades: se compilan una sola vez
+            if text not in compiled:
+                schedule = compile_opening_hours(text)
+                compiled[text] = np.packbits(schedule.ravel()) if schedule is not None else None
+            if compiled[text] is not None:
+                bits[row] = compiled[text]
+                known[row] = True
+        self._state = (rows, bits, known)
+
+    def _lookup(self, principal_ids):
+        rows, bits, known = self._state
+        indexes = np.array([rows.get(principal_id, -1) for principal_id in principal_ids], dtype=np.int64)
+        found = indexes >= 0
+        found[found] = known[indexes[found]]
+        return indexes, found, bits
+
+    def open_during_pairs(self, principal_ids, weekdays, start_minutes, end_minutes, assume_open=True):
+        # Vectorizado sobre pares (actividad, franja): True si la actividad está abierta en
+        # todo [inicio, fin). Las actividades sin horario reconocible devuelven assume_open.
+        indexes, found, bits = self._lookup(principal_ids)
+        result = np.full(len(indexes), assume_open, dtype=bool)
+        if not found.any():
+            return result
+
+        weekdays = np.asarray(weekdays, dtype=np.int64)[found]
+        starts = np.asarray(start_minutes, dtype=np.int64)[found]
+        ends = np.asarray(end_minutes, dtype=np.int64)[found]
+        start_slots = weekdays * SLOTS_PER_DAY + starts // SLOT_MINUTES
+        end_slots = np.maximum(weekdays * SLOTS_PER_DAY + -(-ends // SLOT_MINUTES), start_slots + 1)
+
+        # Semana duplicada para franjas que cruzan el domingo a medianoche; la suma acumulada
+        # cuenta las franjas abiertas de cada ventana en O(1)
+        unique_rows, lines = np.unique(indexes[found], return_inverse=True)
+        schedule = np.unpackbits(bits[unique_rows], axis=1)
+        schedule = np.concatenate([schedule, schedule], axis=1)
+        cumulative = np.zeros((len(unique_rows), schedule.shape[1] + 1), dtype=np.int16)
+        np.cumsum(schedule, axis=1, out=cumulative[:, 1:])
+        open_slots = cumulative[lines, end_slots] - cumulative[lines, start_slots]
+        result[found] = open_slots == (end_slots - start_slots)
+        return result
+
+    def open_during(self, principal_ids, weekday, start_minute, end_minute, assume_open=True):
+        # Misma ventana para muchas actividades: solo se desempaquetan los bytes necesarios
+        indexes, found, bits = self._lookup(principal_ids)
+        result = np.full(len(indexes), assume_open, dtype=bool)
+        if not found.any():
+            return result
+        start, end = _slot_bounds(weekday, start_minute, end_minute)
+        schedule = np.unpackbits(bits[indexes[found]], axis=1)
+        if end > SLOTS_PER_WEEK:
+            schedule = np.concatenate([schedule, schedule], axis=1)
+        result[found] = schedule[:, start:end].all(axis=1)
+        return result
+
+    def is_open(self, principal_id, weekday, start_minute, end_minute, assume_open=True):
+        return bool(self.open_during([principal_id], weekday, start_minute, end_minute, assume_open)[0])
+
+
+opening_hours_index = OpeningHoursIndex()
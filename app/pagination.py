@@ -0,0 +1,133 @@
+import base64
+import binascii
+import json
+import re
+from decimal import Decimal
+
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 1000
+
+_ATTRIBUTE_NAME = re.compile(r'^[A-Za-z0-9_]+$')
+
+# Origen de los cursores de listado: DynamoDB (orden del scan/índice) o el catálogo en
+# memoria (orden por principalId). Un cursor no se puede continuar en el otro orden
+CURSOR_SOURCE_DYNAMODB = 'dynamodb'
+CURSOR_SOURCE_CATALOG = 'catalog'
+
+
+def _decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError
+
+
+def encode_cursor(last_evaluated_key):
+    # Cursor opaco para el cliente: LastEvaluatedKey de DynamoDB en base64 url-safe
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, default=_decimal_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')), parse_float=Decimal)
+    except (ValueError, binascii.Error, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def parse_fields(fields, allowed=None):
+    # "name,city" -> ['name', 'city']; valida contra los campos permitidos del endpoint
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    invalid = [
+        field for field in requested
+        if not _ATTRIBUTE_NAME.match(field) or (allowed is not None and field not in allowed)
+    ]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(invalid)}")
+    return requested
+
+
+def build_projection(attributes):
+    # Alias para todos los atributos: evita choques con palabras reservadas como "name"
+    names = {}
+    placeholders = []
+    for index, attribute in enumerate(dict.fromkeys(attributes)):
+        placeholder = f"#f{index}"
+        names[placeholder] = attribute
+        placeholders.append(placeholder)
+    return {
+        'ProjectionExpression': ', '.join(placeholders),
+        'ExpressionAttributeNames': names
+    }
+
+
+def _split_listing_cursor(cursor):
+    # (clave de inicio, origen, versión del catálogo) de un cursor de listado
+    start_key = decode_cursor(cursor)
+    if not start_key:
+        return None, None, None
+    return start_key, start_key.pop('_source', None), start_key.pop('_version', None)
+
+
+def _restart_listing():
+    return HTTPException(status_code=400, detail="Cursor expired: the activity listing changed, restart from the first page")
+
+
+def paginate(operation, params, limit=None, cursor=None):
+    # Sigue LastEvaluatedKey hasta completar "limit" elementos (o la tabla entera si no hay limit)
+    items = []
+    start_key, source, _ = _split_listing_cursor(cursor)
+    if start_key and source != CURSOR_SOURCE_DYNAMODB:
+        raise _restart_listing()
+    while True:
+        page_params = dict(params)
+        if start_key:
+            page_params['ExclusiveStartKey'] = start_key
+        if limit:
+            page_params['Limit'] = limit - len(items)
+
+        response = operation(**page_params)
+        items.extend(response.get('Items', []))
+        start_key = response.get('LastEvaluatedKey')
+
+        if not start_key or (limit and len(items) >= limit):
+            break
+
+    return items, encode_cursor({**start_key, '_source': CURSOR_SOURCE_DYNAMODB} if start_key else None)
+
+
+def paginate_catalog(catalog, limit=None, cursor=None, destination_id=None):
+    # Misma semántica de cursor que DynamoDB pero servida desde el catálogo en memoria;
+    # devuelve None si el catálogo no está cargado, no conoce el destino o el listado
+    # empezó en DynamoDB (se continúa allí). Un cursor de otro snapshot devuelve 400
+    start_key, source, version = _split_listing_cursor(cursor)
+    if start_key and source == CURSOR_SOURCE_DYNAMODB:
+        return None
+    if start_key and source != CURSOR_SOURCE_CATALOG:
+        raise _restart_listing()
+    page = catalog.list_page(
+        destination_id=destination_id,
+        limit=limit,
+        after_principal_id=start_key.get('principalId') if start_key else None
+    )
+    if page is None or (start_key and page[2] != version):
+        if start_key:
+            raise _restart_listing()
+        return None
+    items, last_principal_id, snapshot_version = page
+    if last_principal_id is None:
+        return items, None
+    next_key = {'principalId': last_principal_id, '_source': CURSOR_SOURCE_CATALOG, '_version': snapshot_version}
+    if destination_id is not None:
+        next_key['destinationId'] = destination_id
+    return items, encode_cursor(next_key)
@@ -0,0 +1,216 @@
+import json
+import queue
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
+
+from app import config
+from app.async_utils import run_blocking
+from app.db import db
+from app.metrics import record_stage
+
+# Errores de conexión o de pool agotado: se reintentan; el resto se considera definitivo
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+
+def insert_itineraries_bulk(rows):
+    # rows: [(itinerary_id, client_id, client_itinerary)] en un único INSERT multi-fila.
+    # Idempotente: si un reintento llega después de un commit cuya respuesta se perdió,
+    # las filas ya insertadas se ignoran en vez de fallar con UniqueViolation
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            execute_values(
+                cursor,
+                "INSERT INTO iti.client_itineraries (id, client_id, client_itinerary, created_at) VALUES %s "
+                "ON CONFLICT (id) DO NOTHING;",
+                [(itinerary_id, client_id, json.dumps(client_itinerary)) for itinerary_id, client_id, client_itinerary in rows],
+                template="(%s, %s, %s, CURRENT_TIMESTAMP)"
+            )
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db.release_connection(conn)
+
+
+class PersistenceQueueFull(Exception):
+    pass
+
+
+class ItineraryWriteQueue:
+    # Cola acotada drenada por un número fijo de hilos que agrupan las filas en INSERT
+    # multi-fila; al apagar se vacía antes de salir
+    def __init__(self, writer, max_queue, workers, batch_size, flush_interval_ms, max_retries):
+        self.writer = writer
+        self.max_queue = max_queue
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop_event.clear()
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"tutur-persist-{index}", daemon=True)
+                for index in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout):
+        # Los workers terminan de escribir lo pendiente antes de salir
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        pending = self._queue.qsize()
+        if pending:
+            print(f"Itinerarios sin persistir al apagar: {pending}")
+        self._threads = []
+
+    def enqueue(self, itinerary_id, client_id, client_itinerary, timeout=None, on_failure=None):
+        # Bloquea hasta timeout si la cola está llena (backpressure hacia el productor);
+        # on_failure(itinerary_id) se llama si la fila no se llega a escribir
+        self.start()
+        try:
+            self._queue.put(
+                (time.monotonic(), (itinerary_id, client_id, client_itinerary), on_failure), timeout=timeout
+            )
+        except queue.Full:
+            raise PersistenceQueueFull()
+        with self._stats_lock:
+            self.enqueued += 1
+
+    async def enqueue_async(self, itinerary_id, client_id, client_itinerary, timeout, on_failure=None):
+        # Camino rápido sin esperar; con la cola llena la espera ocurre en el executor
+        try:
+            self.enqueue(itinerary_id, client_id, client_itinerary, timeout=0, on_failure=on_failure)
+        except PersistenceQueueFull:
+            await run_blocking(self.enqueue, itinerary_id, client_id, client_itinerary, timeout, on_failure)
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stop_event.is_set():
+                    return
+                continue
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_with_retries(self, rows):
+        attempt = 0
+        while True:
+            try:
+                self.writer(rows)
+                return
+            except TRANSIENT_ERRORS:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(min(0.1 * 2 ** attempt, 5))
+
+    def _write(self, batch):
+        rows = [row for _, row, _ in batch]
+        failed_entries = []
+        try:
+            self._write_with_retries(rows)
+        except TRANSIENT_ERRORS as e:
+            print(f"Error al persistir {len(rows)} itinerarios: {e}")
+            failed_entries = batch
+        except Exception as e:
+            # Error definitivo: fila a fila para no perder el lote por un único registro
+            for entry in batch:
+                try:
+                    self._write_with_retries([entry[1]])
+                except Exception as row_error:
+                    failed_entries.append(entry)
+                    print(f"Error al persistir el itinerario {entry[1][0]}: {row_error} (lote: {e})")
+        failed = len(failed_entries)
+        written = len(rows) - failed
+
+        for _, row, on_failure in failed_entries:
+            if on_failure is not None:
+                try:
+                    on_failure(row[0])
+                except Exception as callback_error:
+                    print(f"Error al notificar el fallo del itinerario {row[0]}: {callback_error}")
+
+        flush_seconds = time.monotonic() - min(enqueued_at for enqueued_at, _, _ in batch)
+        # Desde que se encoló la fila más antigua del lote hasta que quedó escrita
+        record_stage('persistenceFlush', flush_seconds)
+        with self._stats_lock:
+            self.written += written
+            self.failed += failed
+            self.batches += 1
+            self.last_batch_size = len(rows)
+            self.flush_seconds += flush_seconds
+            self.max_flush_seconds = max(self.max_flush_seconds, flush_seconds)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queueDepth': self._queue.qsize(),
+                'maxQueue': self.max_queue,
+                'workers': self.workers,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'failed': self.failed,
+                'retries': self.retries,
+                'batches': self.batches,
+                'lastBatchSize': self.last_batch_size,
+                'avgBatchSize': round((self.written + self.failed) / self.batches, 2) if self.batches else 0.0,
+                'avgFlushLatencyMs': round(self.flush_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+                'maxFlushLatencyMs': round(self.max_flush_seconds * 1000, 2),
+            }
+
+
+itinerary_write_queue = ItineraryWriteQueue(
+    writer=insert_itineraries_bulk,
+    max_queue=config.PERSIST_QUEUE_MAX,
+    workers=config.PERSIST_WORKERS,
+    batch_size=config.PERSIST_BATCH_SIZE,
+    flush_interval_ms=config.PERSIST_FLUSH_INTERVAL_MS,
+    max_retries=config.PERSIST_MAX_RETRIES
+) if config.PERSIST_QUEUE_ENABLED else None
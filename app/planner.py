@@ -0,0 +1,180 @@
+import re
+from datetime import timedelta
+
+import numpy as np
+
+from app import config
+from app.activity_catalog import activity_catalog
+from app.geo_index import haversine_km, item_coordinates
+from app.opening_hours import opening_hours_index
+from app.retrieval import normalize_text, resolve_destination_ids
+
+MAX_DAY_MINUTES = 10 * 60
+DAY_START_MINUTES = 9 * 60
+DAY_END_MINUTES = 21 * 60
+DEFAULT_ACTIVITY_MINUTES = 90
+TRAVEL_MINUTES = 15
+
+_NUMBER = r'(\d+(?:[.,]\d+)?)'
+# Cada número (o rango) debe ir seguido de su unidad; las alternativas largas van primero
+_DURATION = re.compile(
+    _NUMBER + r'(?:\s*(?:-|a|–)\s*' + _NUMBER + r')?\s*'
+    r'(horas|hora|hours|hour|hrs|hr|h|minutos|minuto|minutes|minute|mins|min|m)(?![a-záéíóú])',
+    re.IGNORECASE
+)
+
+
+def parse_duration_minutes(estimated_time):
+    # "2 horas", "1.5 h", "2h 30min", "1-2 horas" -> minutos: se suman todos los pares
+    # número+unidad y en rangos se usa el máximo. Sin unidad ("90") es ambiguo: valor por defecto
+    minutes = 0.0
+    for low, high, unit in _DURATION.findall(str(estimated_time or '')):
+        value = float((high or low).replace(',', '.'))
+        minutes += value if unit.lower().startswith('m') else value * 60
+    return int(minutes) if minutes > 0 else DEFAULT_ACTIVITY_MINUTES
+
+
+def _matches_categories(item, categories):
+    values = item.get('category') or item.get('categories') or []
+    if isinstance(values, str):
+        values = [values]
+    return any(normalize_text(value) in categories for value in values)
+
+
+def _candidates(snapshot, request):
+    items = []
+    for destination_id in resolve_destination_ids(request.city):
+        items.extend(snapshot.by_destination.get(destination_id, []))
+    items = [item for item in items if item_coordinates(item) is not None]
+
+    categories = {normalize_text(activity) for activity in request.activities}
+    by_category = [item for item in items if _matches_categories(item, categories)]
+    if items and not by_category:
+        # Un itinerario con todo el destino ignoraría los intereses pedidos: se deja al LLM
+        print(f"Planificador sin actividades de las categorías {sorted(categories)} en {request.city}")
+    items = by_category
+
+    return sorted(
+        items,
+        key=lambda item: (-float(item.get('totalScore', 0) or 0), -int(item.get('reviewsCount', 0) or 0), item['principalId'])
+    )
+
+
+def _day_windows(start_dt, end_dt):
+    num_days = max((end_dt.date() - start_dt.date()).days + 1, 1)
+    windows = []
+    for offset in range(num_days):
+        day = start_dt.date() + timedelta(days=offset)
+        day_start = start_dt.hour * 60 + start_dt.minute if offset == 0 else DAY_START_MINUTES
+        day_end = end_dt.hour * 60 + end_dt.minute if offset == num_days - 1 else DAY_END_MINUTES
+        windows.append((day.weekday(), day_start, min(day_end, day_start + MAX_DAY_MINUTES)))
+    return windows
+
+
+class _Candidates:
+    # Arreglos paralelos ordenados por puntuación para evaluar todas las candidatas a la vez
+    def __init__(self, items):
+        self.items = items
+        self.ids = [item['principalId'] for item in items]
+        coordinates = [item_coordinates(item) for item in items]
+        self.lats = np.array([point[0] for point in coordinates], dtype=np.float64)
+        self.lngs = np.array([point[1] for point in coordinates], dtype=np.float64)
+        self.durations = np.array([parse_duration_minutes(item.get('estimated_time')) for item in items], dtype=np.int64)
+        self.available = np.ones(len(items), dtype=bool)
+
+
+def _plan_day(candidates, weekday, day_start, day_end):
+    # En cada paso se elige la candidata mejor puntuada que cabe en el día, está abierta
+    # en su franja y queda a menos de 5 km de todas las ya elegidas
+    chosen = []
+    within_distance = np.ones(len(candidates.ids), dtype=bool)
+    cursor = day_start
+    while True:
+        start = cursor + (TRAVEL_MINUTES if chosen else 0)
+        ends = start + candidates.durations
+        feasible = np.flatnonzero(candidates.available & within_distance & (ends <= day_end))
+        if not len(feasible):
+            break
+        open_now = opening_hours_index.open_during_pairs(
+            [candidates.ids[index] for index in feasible],
+            np.full(len(feasible), weekday),
+            np.full(len(feasible), start),
+            ends[feasible]
+        )
+        feasible = feasible[open_now]
+        if not len(feasible):
+            break
+
+        best = feasible[0]
+        chosen.append(candidates.items[best])
+        candidates.available[best] = False
+        within_distance &= haversine_km(
+            candidates.lats[best], candidates.lngs[best], candidates.lats, candidates.lngs
+        ) <= config.MAX_ACTIVITY_DISTANCE_KM
+        cursor = int(ends[best])
+    return chosen
+
+
+class ReplacementRules:
+    # Las reglas de _plan_day para elegir reemplazos fuera del planificador (reparación de 5 km):
+    # categoría pedida, abierta en su franja y dentro del presupuesto de tiempo del día
+    def __init__(self, categories, weekday, day_start, day_end):
+        self.categories = categories
+        self.weekday = weekday
+        self.day_start = day_start
+        self.day_end = day_end
+
+    def used_minutes(self, activities):
+        durations = [parse_duration_minutes(activity.get('estimated_time')) for activity in activities]
+        return sum(durations) + TRAVEL_MINUTES * max(len(durations) - 1, 0)
+
+    def filter(self, items, used_minutes):
+        # Candidatas (ordenadas) que caben a continuación de used_minutes ya ocupados del día
+        items = [item for item in items if _matches_categories(item, self.categories)]
+        if not items:
+            return []
+        start = self.day_start + used_minutes + (TRAVEL_MINUTES if used_minutes else 0)
+        ends = start + np.array([parse_duration_minutes(item.get('estimated_time')) for item in items], dtype=np.int64)
+        feasible = ends <= self.day_end
+        open_now = opening_hours_index.open_during_pairs(
+            [item['principalId'] for item in items],
+            np.full(len(items), self.weekday),
+            np.full(len(items), start),
+            ends
+        )
+        return [item for item, accepted in zip(items, feasible & open_now) if accepted]
+
+
+def replacement_rules(request, start_dt, end_dt, day_index):
+    windows = _day_windows(start_dt, end_dt)
+    if 0 <= day_index < len(windows):
+        weekday, day_start, day_end = windows[day_index]
+    else:
+        # Día fuera del rango pedido (el LLM generó de más): jornada estándar
+        weekday = (start_dt.date() + timedelta(days=day_index)).weekday()
+        day_start, day_end = DAY_START_MINUTES, min(DAY_END_MINUTES, DAY_START_MINUTES + MAX_DAY_MINUTES)
+    categories = {normalize_text(activity) for activity in request.activities}
+    return ReplacementRules(categories, weekday, day_start, day_end)
+
+
+def plan_itinerary(request, start_dt, end_dt):
+    # Selección voraz por puntuación con un máximo de 10 horas por día.
+    # Devuelve None si el catálogo no puede responder para el destino solicitado.
+    snapshot = activity_catalog.snapshot
+    if snapshot is None:
+        return None
+    items = _candidates(snapshot, request)
+    if not items:
+        return None
+
+    candidates = _Candidates(items)
+    itinerary = []
+    for index, (weekday, day_start, day_end) in enumerate(_day_windows(start_dt, end_dt)):
+        chosen = _plan_day(candidates, weekday, day_start, day_end)
+        if not chosen:
+            continue
+        itinerary.append({
+            'day': index + 1,
+            'activities': [{'principalId': item['principalId'], 'name': item.get('name', '')} for item in chosen]
+        })
+    return {'itinerary': itinerary} if itinerary else None
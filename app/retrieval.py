@@ -0,0 +1,257 @@
+import hashlib
+import re
+import unicodedata
+from contextvars import ContextVar
+from typing import Any, List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from app import config
+from app.destination_index import destination_index
+from app.metrics import Counter, registry, stage
+
+retrieval_fallbacks = registry.register(Counter(
+    'tutur_retrieval_filter_fallbacks_total',
+    'Búsquedas que tuvieron que relajar el filtro de metadatos (destination o unfiltered)', ('level',)
+))
+
+
+class RetrievalScope:
+    # Texto de búsqueda compacto y filtro de metadatos de una petición de guía
+    def __init__(self, query, metadata_filter=None, fallback_filter=None):
+        self.query = query
+        self.metadata_filter = metadata_filter
+        self.fallback_filter = fallback_filter
+
+    def filters(self):
+        # Del más estricto al más amplio; la última búsqueda va sin filtro para que un campo de
+        # metadatos ausente o con otro nombre no deje al LLM sin contexto
+        filters = [self.metadata_filter]
+        if self.fallback_filter is not None:
+            filters.append(self.fallback_filter)
+        if filters[-1] is not None:
+            filters.append(None)
+        return filters
+
+
+# Alcance de la petición en curso; lo lee el retriever dentro de la cadena de QA
+retrieval_scope = ContextVar("retrieval_scope", default=None)
+
+
+def normalize_text(value):
+    value = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', value).strip().lower()
+
+
+def _and(*conditions):
+    conditions = [condition for condition in conditions if condition]
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {'$and': conditions}
+
+
+def resolve_destination_ids(city):
+    # Ciudad del formulario -> destinationId a partir del índice de destinos
+    target = normalize_text(city)
+    return sorted({
+        destination['destinationId']
+        for destination in destination_index.destinations()
+        if destination.get('city') and normalize_text(destination['city']) == target
+    })
+
+
+def build_retrieval_scope(request):
+    query = f"{', '.join(request.activities)} en {request.city}, {request.country}"
+    if not config.RETRIEVAL_FILTER_ENABLED:
+        return RetrievalScope(query)
+
+    # Sin destino resuelto no se filtra por ciudad: el texto del formulario no está normalizado
+    # (mayúsculas, tildes) y un $eq sobre él no coincidiría con los metadatos
+    destination_ids = resolve_destination_ids(request.city)
+    destination_filter = {config.RETRIEVAL_DESTINATION_FIELD: {'$in': destination_ids}} if destination_ids else None
+
+    category_filter = None
+    if config.RETRIEVAL_CATEGORY_FIELD and request.activities:
+        category_filter = {config.RETRIEVAL_CATEGORY_FIELD: {'$in': list(request.activities)}}
+
+    # Si las categorías no coinciden con los metadatos se reintenta solo por destino
+    return RetrievalScope(
+        query,
+        metadata_filter=_and(destination_filter, category_filter),
+        fallback_filter=destination_filter if category_filter and destination_filter else None
+    )
+
+
+def _record_fallback(filters, position):
+    if position == 0:
+        return
+    if filters[position] is None:
+        print(f"Búsqueda sin filtro de metadatos: los filtros {filters[:position]} no devolvieron documentos")
+        retrieval_fallbacks.inc(level='unfiltered')
+    else:
+        retrieval_fallbacks.inc(level='destination')
+
+
+def dedupe_by_principal_id(documents, k):
+    unique = []
+    seen = set()
+    for document in documents:
+        principal_id = document.metadata.get('principalId')
+        if principal_id is not None:
+            if principal_id in seen:
+                continue
+            seen.add(principal_id)
+        unique.append(document)
+        if len(unique) >= k:
+            break
+    return unique
+
+
+class ScopedActivityRetriever(BaseRetriever):
+    # Busca con el texto y el filtro del alcance de la petición en lugar del prompt completo;
+    # sin alcance se comporta como el retriever sin filtros. La consulta se embebe una sola vez
+    # aunque haya que repetir la búsqueda con el filtro de respaldo.
+    vector_store: Any
+    embeddings: Any
+    k: int = 8
+    fetch_k: int = 24
+
+    def _search_kwargs(self, query):
+        scope = retrieval_scope.get()
+        if scope is None:
+            return query, [None]
+        return scope.query, scope.filters()
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        search_query, filters = self._search_kwargs(query)
+        with stage('embedding'):
+            vector = self.embeddings.embed_query(search_query)
+        documents = []
+        with stage('retrieval'):
+            for position, metadata_filter in enumerate(filters):
+                documents = self.vector_store.similarity_search_by_vector(vector, k=self.fetch_k, filter=metadata_filter)
+                if documents:
+                    _record_fallback(filters, position)
+                    break
+        return dedupe_by_principal_id(documents, self.k)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        search_query, filters = self._search_kwargs(query)
+        with stage('embedding'):
+            vector = await self.embeddings.aembed_query(search_query)
+        documents = []
+        with stage('retrieval'):
+            for position, metadata_filter in enumerate(filters):
+                documents = await self.vector_store.asimilarity_search_by_vector(
+                    vector, k=self.fetch_k, filter=metadata_filter
+                )
+                if documents:
+                    _record_fallback(filters, position)
+                    break
+        return dedupe_by_principal_id(documents, self.k)
+
+
+class HashingEmbeddings(Embeddings):
+    # Embeddings deterministas sin red (bolsa de palabras con hashing) para el vector store local
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in normalize_text(text).split():
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def _matches(metadata, metadata_filter):
+    # Subconjunto de la sintaxis de filtros de Pinecone: $and, $eq, $in
+    if not metadata_filter:
+        return True
+    for field, condition in metadata_filter.items():
+        if field == '$and':
+            if not all(_matches(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        value = metadata.get(field)
+        values = value if isinstance(value, list) else [value]
+        if '$eq' in condition and condition['$eq'] not in values:
+            return False
+        if '$in' in condition and not set(values) & set(condition['$in']):
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    # Sustituto en memoria de PineconeVectorStore para desarrollo y benchmarks sin red
+    def __init__(self, embedding):
+        self._embedding = embedding
+        self._documents = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.array(self._embedding.embed_documents(texts), dtype=np.float32)
+        self._vectors = vectors if not self._documents else np.vstack([self._vectors, vectors])
+        start = len(self._documents)
+        self._documents.extend(Document(page_content=text, metadata=dict(metadata)) for text, metadata in zip(texts, metadatas))
+        return [str(index) for index in range(start, len(self._documents))]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs) -> List[Document]:
+        if not self._documents:
+            return []
+        query_vector = np.array(embedding, dtype=np.float32)
+        scores = self._vectors @ query_vector
+        results = []
+        for index in np.argsort(-scores, kind='stable'):
+            document = self._documents[index]
+            if _matches(document.metadata, filter):
+                results.append(document)
+                if len(results) >= k:
+                    break
+        return results
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store = cls(embedding)
+        store.add_texts(texts, metadatas)
+        return store
+
+    @classmethod
+    def from_catalog(cls, snapshot, embedding=None):
+        texts = []
+        metadatas = []
+        for item in (snapshot.items if snapshot is not None else []):
+            texts.append(f"principalId: {item['principalId']}\nname: {item.get('name', '')}\n{item.get('description', '')}")
+            metadatas.append({
+                'principalId': item['principalId'],
+                config.RETRIEVAL_DESTINATION_FIELD: item.get('destinationId'),
+                config.RETRIEVAL_CITY_FIELD: item.get('city'),
+                config.RETRIEVAL_CATEGORY_FIELD: item.get('category'),
+            })
+        return cls.from_texts(texts, embedding or HashingEmbeddings(), metadatas)
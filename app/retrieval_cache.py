@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app import config
+from app.lru_cache import LRUCache
+from app.retrieval import normalize_text
+
+
+def _text_key(text):
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def _results_key(vector, metadata_filter, k):
+    vector_hash = hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()
+    return f"{vector_hash}|{json.dumps(metadata_filter, sort_keys=True)}|{k}"
+
+
+class _CacheStats:
+    # Aciertos por nivel y latencia media de los fallos para estimar el tiempo ahorrado
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def hit(self, disk=False):
+        with self._lock:
+            self.hits += 1
+            if disk:
+                self.disk_hits += 1
+
+    def miss(self, seconds):
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'avgMissLatencyMs': round(avg_miss * 1000, 2),
+                'estimatedSavedSeconds': round(avg_miss * self.hits, 3),
+            }
+
+
+class _MmapEmbeddingStore:
+    # vectors.f32 guarda los vectores float32 contiguos y keys.txt la clave de cada fila;
+    # las lecturas van por np.memmap, sin cargar el archivo completo en memoria
+    def __init__(self, directory, max_rows):
+        os.makedirs(directory, exist_ok=True)
+        self.max_rows = max_rows
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._keys_path = os.path.join(directory, 'keys.txt')
+        self._meta_path = os.path.join(directory, 'meta.json')
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._map = None
+        self._dimensions = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path) as meta_file:
+            self._dimensions = json.load(meta_file)['dimensions']
+        keys = []
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path) as keys_file:
+                keys = [line.strip() for line in keys_file if line.strip()]
+        row_bytes = self._dimensions * 4
+        stored_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        keys = keys[:stored_rows]
+        # Descartar un vector escrito sin su clave (proceso interrumpido a mitad de escritura)
+        with open(self._vectors_path, 'ab') as vectors_file:
+            vectors_file.truncate(len(keys) * row_bytes)
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        with self._lock:
+            if self._map is None or row >= self._map.shape[0]:
+                self._map = np.memmap(self._vectors_path, dtype=np.float32, mode='r').reshape(-1, self._dimensions)
+            return self._map[row].tolist()
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if key in self._rows or len(self._rows) >= self.max_rows:
+                return
+            if self._dimensions is None:
+                self._dimensions = int(vector.shape[0])
+                with open(self._meta_path, 'w') as meta_file:
+                    json.dump({'dimensions': self._dimensions}, meta_file)
+            if vector.shape[0] != self._dimensions:
+                return
+            # Primero el vector y luego la clave: una clave en keys.txt siempre tiene su fila
+            with open(self._vectors_path, 'ab') as vectors_file:
+                vectors_file.write(vector.tobytes())
+            with open(self._keys_path, 'a') as keys_file:
+                keys_file.write(key + '\n')
+            self._rows[key] = len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    # Texto normalizado -> vector de la consulta, en LRU de memoria y opcionalmente en disco
+    def __init__(self, inner, max_entries, disk_path=None, disk_max_rows=100000):
+        self.inner = inner
+        self._memory = LRUCache(max_entries)
+        self._disk = _MmapEmbeddingStore(disk_path, disk_max_rows) if disk_path else None
+        self._stats = _CacheStats()
+
+    def _lookup(self, key):
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._stats.hit()
+            return vector
+        if self._disk is not None:
+            vector = self._disk.get(key)
+            if vector is not None:
+                self._memory.put(key, vector)
+                self._stats.hit(disk=True)
+                return vector
+        return None
+
+    def _store(self, key, vector):
+        self._memory.put(key, vector)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, vector)
+            except OSError as e:
+                print(f"Error al guardar el embedding en disco: {e}")
+
+    def embed_query(self, text):
+        key = _text_key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            start_time = time.monotonic()
+            vector = self.inner.embed_query(text)
+            self._stats.miss(time.monotonic() - start_time)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        key = _text_key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            start_time = time.monotonic()
+            vector = await self.inner.aembed_query(text)
+            self._stats.miss(time.monotonic() - start_time)
+            self._store(key, vector)
+        return vector
+
+    def embed_documents(self, texts):
+        # Solo se cachean las consultas; los documentos se indexan fuera del servicio
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.inner.aembed_documents(texts)
+
+    def stats(self):
+        return {
+            **self._stats.snapshot(),
+            'entries': len(self._memory),
+            'diskEntries': len(self._disk) if self._disk is not None else 0,
+            'diskEnabled': self._disk is not None,
+        }
+
+
+class CachedVectorStore:
+    # (hash del embedding, filtro, k) -> documentos recuperados, con TTL para reflejar
+    # los cambios del índice vectorial
+    def __init__(self, inner, embeddings, max_entries, ttl_seconds):
+        self.inner = inner
+        self.embeddings = embeddings
+        self._results = LRUCache(max_entries, ttl_seconds)
+        self._stats = _CacheStats()
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter)
+
+    async def asimilarity_search(self, query, k=4, filter=None, **kwargs):
+        vector = await self.embeddings.aembed_query(query)
+        return await self.asimilarity_search_by_vector(vector, k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        key = _results_key(embedding, filter, k)
+        documents = self._results.get(key)
+        if documents is not None:
+            self._stats.hit()
+            return list(documents)
+        start_time = time.monotonic()
+        documents = self.inner.similarity_search_by_vector(embedding, k=k, filter=filter)
+        self._stats.miss(time.monotonic() - start_time)
+        self._results.put(key, documents)
+        return list(documents)
+
+    async def asimilarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        key = _results_key(embedding, filter, k)
+        documents = self._results.get(key)
+        if documents is not None:
+            self._stats.hit()
+            return list(documents)
+        start_time = time.monotonic()
+        documents = await self.inner.asimilarity_search_by_vector(embedding, k=k, filter=filter)
+        self._stats.miss(time.monotonic() - start_time)
+        self._results.put(key, documents)
+        return list(documents)
+
+    def stats(self):
+        return {
+            'embeddings': self.embeddings.stats(),
+            'results': {**self._stats.snapshot(), 'entries': len(self._results)},
+        }
+
+
+def wrap_embeddings(embeddings):
+    if not config.RETRIEVAL_CACHE_ENABLED:
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+        disk_path=config.EMBEDDING_CACHE_DISK_PATH or None,
+        disk_max_rows=config.EMBEDDING_CACHE_DISK_MAX_ROWS
+    )
+
+
+def wrap_vector_store(vector_store, embeddings):
+    if not isinstance(embeddings, CachedEmbeddings):
+        return vector_store
+    return CachedVectorStore(
+        vector_store,
+        embeddings,
+        max_entries=config.RETRIEVAL_RESULTS_CACHE_MAX_ENTRIES,
+        ttl_seconds=config.RETRIEVAL_RESULTS_CACHE_TTL_SECONDS
+    )
@@ -1,15 +1,96 @@
 import boto3
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    # Un único cliente de Secrets Manager por proceso (los clientes de boto3 son thread-safe)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client('secretsmanager', region_name=config.SECRETS_REGION)
+    return _client
+
+
+class SecretCache:
+    # Secretos en memoria con TTL. Si Secrets Manager falla al refrescar se sigue usando el valor
+    # anterior; refresh() fuerza la lectura cuando un secreto rotado deja de funcionar
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.rotations = 0
+
+    def _key_lock(self, secret_name):
+        with self._lock:
+            return self._locks.setdefault(secret_name, threading.Lock())
+
+    def _fetch(self, secret_name):
+        response = _get_client().get_secret_value(SecretId=secret_name)
+        return json.loads(response['SecretString']), response.get('VersionId')
+
+    def get(self, secret_name, force_refresh=False):
+        entry = self._entries.get(secret_name)
+        if entry is not None and not force_refresh and time.monotonic() - entry[2] < self.ttl_seconds:
+            return entry[0]
+
+        # Un solo hilo lee cada secreto; los demás esperan y reutilizan el resultado
+        with self._key_lock(secret_name):
+            current = self._entries.get(secret_name)
+            if current is not None and current is not entry and time.monotonic() - current[2] < self.ttl_seconds:
+                return current[0]
+            with self._lock:
+                self.fetches += 1
+            try:
+                value, version_id = self._fetch(secret_name)
+            except Exception as e:
+                if current is not None:
+                    print(f"Error al refrescar el secreto {secret_name}, se usa el valor anterior: {e}")
+                    return current[0]
+                raise Exception(f"Error getting secret: {e}")
+            if current is not None and version_id != current[1]:
+                with self._lock:
+                    self.rotations += 1
+                print(f"Secreto {secret_name} rotado (versión {version_id})")
+            self._entries[secret_name] = (value, version_id, time.monotonic())
+            return value
+
+    def refresh(self, secret_name):
+        # True si la versión cambió: quien llama puede reintentar con las credenciales nuevas
+        previous = self._entries.get(secret_name)
+        self.get(secret_name, force_refresh=True)
+        current = self._entries.get(secret_name)
+        return previous is None or current is None or previous[1] != current[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'secrets': len(self._entries),
+                'fetches': self.fetches,
+                'rotations': self.rotations,
+                'ttlSeconds': self.ttl_seconds,
+            }
+
+
+secret_cache = SecretCache(config.SECRETS_TTL_SECONDS)
+
 
 def get_secret(secret_name):
-    # Especifica la región
-    region_name = "us-east-1"  # Cambia a la región donde están tus secretos de AWS
-
-    client = boto3.client('secretsmanager', region_name=region_name)
-    
-    try:
-        get_secret_value_response = client.get_secret_value(SecretId=secret_name)
-        secret = get_secret_value_response['SecretString']
-        return json.loads(secret)
-    except Exception as e:
-        raise Exception(f"Error getting secret: {e}")
+    return secret_cache.get(secret_name)
+
+
+def get_secrets(secret_names):
+    # Resuelve varios secretos en paralelo con el cliente compartido
+    secret_names = list(secret_names)
+    with ThreadPoolExecutor(max_workers=max(1, len(secret_names)), thread_name_prefix="tutur-secrets") as executor:
+        return dict(zip(secret_names, executor.map(get_secret, secret_names)))
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from app import activities_service, config, destinations_service
+from app.activity_loader import dynamodb
+from app.async_utils import run_blocking
+
+
+class StartupTracker:
+    # Tiempos de cada fase del arranque y estado de readiness para /health
+    def __init__(self):
+        self.phases = {}
+        self.ready = False
+        self.started_at = None
+        self.total_ms = None
+
+    def begin(self):
+        self.started_at = time.monotonic()
+
+    async def run_phase(self, name, func, *args):
+        # Fase bloqueante en el executor; un error se registra pero no detiene el resto del arranque
+        started = time.monotonic()
+        try:
+            await run_blocking(func, *args)
+            self.phases[name] = {'ok': True, 'ms': round((time.monotonic() - started) * 1000, 1)}
+        except Exception as e:
+            print(f"Error en la fase de arranque {name}: {e}")
+            self.phases[name] = {'ok': False, 'ms': round((time.monotonic() - started) * 1000, 1), 'error': str(e)}
+
+    async def run_parallel(self, phases):
+        await asyncio.gather(*(self.run_phase(name, func, *args) for name, func, *args in phases))
+
+    def finish(self):
+        self.total_ms = round((time.monotonic() - self.started_at) * 1000, 1)
+        self.ready = True
+        print(f"Arranque completado en {self.total_ms} ms: {self.phases}")
+
+    def status(self):
+        if not self.ready:
+            state = "starting"
+        elif all(phase['ok'] for phase in self.phases.values()):
+            state = "ok"
+        else:
+            state = "degraded"
+        return {'status': state, 'totalMs': self.total_ms, 'phases': self.phases}
+
+
+def warm_dynamodb_clients():
+    # Resuelve credenciales y abre la conexión TLS de cada cliente con una consulta vacía
+    dynamodb.query(
+        TableName=config.ACTIVITIES_TABLE,
+        KeyConditionExpression='principalId = :p',
+        ExpressionAttributeValues={':p': {'S': '__warmup__'}},
+        Limit=1
+    )
+    for table in (activities_service.table, destinations_service.table):
+        table.meta.client.query(
+            TableName=table.name,
+            KeyConditionExpression='principalId = :p',
+            ExpressionAttributeValues={':p': {'S': '__warmup__'}},
+            Limit=1
+        )
+
+
+startup = StartupTracker()
@@ -1,8 +1,19 @@
 import json
 from app.db import db
-import datetime
+from app.async_utils import run_blocking, submit_background
+from app.id_allocator import format_itinerary_id, itinerary_id_allocator
+from app.persistence_queue import itinerary_write_queue
+from app import config
+from app.metrics import stage
 
 def generate_unique_id():
+    if itinerary_id_allocator is not None:
+        try:
+            return itinerary_id_allocator.next_id()
+        except Exception as e:
+            print(f"Error al generar el ID único: {e}")
+            return None
+
     try:
         # Obtener la conexión del pool
         conn = db.get_connection()
@@ -12,13 +23,8 @@ def generate_unique_id():
         cursor.execute("SELECT nextval('iti.tutur_seq_itinerary_id');")
         next_sequence = cursor.fetchone()[0]
 
-        # Obtener la fecha juliana en formato YYDDD (5 dígitos)
-        current_date = datetime.datetime.now().strftime('%y%j')
-
         # Combinar la fecha juliana con la secuencia para formar el ID de 16 dígitos
-        unique_id = f"{current_date}{str(next_sequence).zfill(11)}"
-
-        return unique_id
+        return format_itinerary_id(next_sequence)
 
     except Exception as e:
         print(f"Error al generar el ID único: {e}")
@@ -64,7 +70,8 @@ def insert_itinerary_in_background(itinerary_id,client_id, client_itinerary):
         with conn.cursor() as cursor:
             query = """
                 INSERT INTO iti.client_itineraries (id, client_id, client_itinerary, created_at)
-                VALUES (%s, %s, %s, CURRENT_TIMESTAMP);
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (id) DO NOTHING;
             """
             cursor.execute(query, (itinerary_id,client_id, json.dumps(client_itinerary)))
             conn.commit()
@@ -72,3 +79,34 @@ def insert_itinerary_in_background(itinerary_id,client_id, client_itinerary):
         db.release_connection(conn)
 
 
+async def generate_unique_id_async():
+    with stage('id'):
+        # Con IDs reservados en memoria no hace falta pasar por el executor
+        if itinerary_id_allocator is not None:
+            unique_id = itinerary_id_allocator.try_next_id()
+            if unique_id is not None:
+                return unique_id
+        return await run_blocking(generate_unique_id)
+
+
+def _insert_or_notify(itinerary_id, client_id, client_itinerary, on_failure):
+    try:
+        insert_itinerary_in_background(itinerary_id, client_id, client_itinerary)
+    except Exception:
+        if on_failure is not None:
+            on_failure(itinerary_id)
+        raise
+
+
+async def schedule_itinerary_insert(itinerary_id, client_id, client_itinerary, on_failure=None):
+    # Persistir sin bloquear la respuesta: la cola write-behind agrupa las filas en INSERT
+    # multi-fila; si está llena la petición espera (backpressure) hasta el timeout.
+    # on_failure(itinerary_id) se llama si la escritura falla después de responder
+    with stage('persistence'):
+        if itinerary_write_queue is None:
+            submit_background(_insert_or_notify, itinerary_id, client_id, client_itinerary, on_failure)
+            return
+        await itinerary_write_queue.enqueue_async(
+            itinerary_id, client_id, client_itinerary, config.PERSIST_ENQUEUE_TIMEOUT_SECONDS, on_failure
+        )
+
@@ -0,0 +1,116 @@
+"""Compara la serialización de actividades anterior contra la proyección compartida.
+
+Uso:
+    python -m benchmarks.bench_activity_projection --items 1500 --repeat 20
+
+Se mide el camino completo de un payload del catálogo en formato de bajo nivel de DynamoDB:
+antes, TypeDeserializer (Decimal) + filtrado + json.loads(json.dumps(default=decimal_default))
++ JSONResponse; ahora, decode_item (tipos JSON) + Projection + FastJSONResponse (orjson).
+"""
+import argparse
+import json
+import time
+from decimal import Decimal
+
+from benchmarks.fakes import FakeDynamoDB, install_offline_stubs, percentile, synthetic_catalog_items
+
+install_offline_stubs()
+
+from boto3.dynamodb.types import TypeDeserializer  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.activity_projection import ACTIVITY_PROJECTION, FastJSONResponse, decode_item, orjson  # noqa: E402
+
+
+def decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError
+
+
+def _money(value):
+    return format(float(value), '.2f') if value else '0.00'
+
+
+def legacy_format_activity_item(item):
+    # Mismos campos que el format_activity_item original (con la lectura de totalScore corregida)
+    return {
+        'principalId': item.get('principalId'),
+        'name': item.get('name', ''),
+        'totalScore': _money(item.get('totalScore')),
+        'reviewsCount': item.get('reviewsCount', 0),
+        'estimated_time': item.get('estimated_time'),
+        'destinationId': item.get('destinationId'),
+        'city': item.get('city'),
+        'description': item.get('description'),
+        'location_lat': item.get('location_lat'),
+        'location_lng': item.get('location_lng'),
+        'opening_hours': item.get('opening_hours'),
+        's3Images': item.get('s3Images'),
+        'fees_currency': item.get('fees_currency', ''),
+        'fees_entrance_fee': _money(item.get('fees_entrance_fee')),
+        'fees_reduced_entrance_fee': _money(item.get('fees_reduced_entrance_fee')),
+    }
+
+
+def legacy_path(raw_items):
+    deserializer = TypeDeserializer()
+    items = [{key: deserializer.deserialize(value) for key, value in raw.items()} for raw in raw_items]
+    filtered = [legacy_format_activity_item(item) for item in items]
+    payload = json.loads(json.dumps(filtered, default=decimal_default))
+    return JSONResponse({'activities': payload, 'nextCursor': None}).body
+
+
+def projection_path(raw_items):
+    items = [decode_item(raw) for raw in raw_items]
+    payload = ACTIVITY_PROJECTION.project_many(items)
+    return FastJSONResponse({'activities': payload, 'nextCursor': None}).body
+
+
+def measure(func, raw_items, repeat):
+    timings = []
+    body = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func(raw_items)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return body, {
+        'runs': repeat,
+        'p50Ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95Ms': round(percentile(timings, 0.95) * 1000, 3),
+        'minMs': round(timings[0] * 1000, 3),
+        'bodyBytes': len(body),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=300, help="actividades por destino sintético")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help="ruta opcional para guardar el resultado en JSON")
+    args = parser.parse_args()
+
+    database = FakeDynamoDB(synthetic_catalog_items(args.items))
+    raw_items = [database.serialize(item) for item in database.items]
+
+    legacy_body, legacy = measure(legacy_path, raw_items, args.repeat)
+    projection_body, projection = measure(projection_path, raw_items, args.repeat)
+    results = {
+        'items': len(raw_items),
+        'orjson': orjson is not None,
+        # Ambos caminos deben producir el mismo documento
+        'samePayload': json.loads(legacy_body) == json.loads(projection_body),
+        'legacy': legacy,
+        'projection': projection,
+        'speedup': round(legacy['p50Ms'] / projection['p50Ms'], 2) if projection['p50Ms'] else None,
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main_cli()
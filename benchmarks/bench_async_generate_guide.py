@@ -0,0 +1,154 @@
+"""Compara /generate-guide async contra el camino síncrono anterior.
+
+Uso:
+    python -m benchmarks.bench_async_generate_guide --requests 400 --concurrency 200 --llm-latency 2
+
+El LLM, DynamoDB y Postgres se sustituyen por fakes con latencia configurable,
+así que el resultado mide solo la capacidad de concurrencia del servidor.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import threading
+import time
+
+from benchmarks.fakes import (
+    FakeQAChain,
+    fake_activity_items,
+    install_offline_stubs,
+    percentile,
+)
+
+install_offline_stubs()
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+import app.main as main  # noqa: E402
+import app.utils as utils  # noqa: E402
+from app.persistence_queue import itinerary_write_queue  # noqa: E402
+
+PRINCIPAL_IDS = [f"act-{i}" for i in range(6)]
+
+GUIDE_REQUEST = {
+    'country': 'Peru',
+    'city': 'Lima',
+    'group': 'familia',
+    'participants': {'adultos': 2, 'niños': 1},
+    'activities': ['museos', 'parques'],
+    'startDatetime': '2024-10-07 09:00:00',
+    'endDatetime': '2024-10-08 18:00:00'
+}
+
+
+def install_fakes(llm_latency, dynamo_latency):
+    counter = iter(range(10 ** 9))
+
+    def fake_fetch(principal_ids):
+        time.sleep(dynamo_latency)
+        return fake_activity_items(principal_ids)
+
+    main.qa_chain = FakeQAChain(llm_latency, PRINCIPAL_IDS)
+    # El camino síncrono y el asíncrono leen las actividades con la misma latencia
+    main.fetch_enrichment_items = fake_fetch
+    main.activity_coalescer.fetch = fake_fetch
+    # Sin caché: cada petición debe pasar por el LLM
+    main.guide_cache = None
+    utils.generate_unique_id = lambda: f"24281{next(counter):011d}"
+    utils.insert_itinerary_in_background = lambda *args: time.sleep(dynamo_latency)
+    if itinerary_write_queue is not None:
+        itinerary_write_queue.writer = lambda rows: time.sleep(dynamo_latency)
+
+
+def query_dynamo_sync(principal_ids):
+    # Enriquecimiento del camino síncrono original: bloquea el hilo del handler
+    ids = main.remove_duplicates(principal_ids)
+    cached_items, missing_ids = main.activity_catalog.get_many(ids)
+    items = list(cached_items.values())
+    if missing_ids:
+        items.extend(main.fetch_enrichment_items(missing_ids).values())
+    return [main.format_enrichment_item(item) for item in items]
+
+
+def build_sync_app():
+    # Reproduce el handler síncrono original: ocupa un hilo de Starlette durante todo el flujo
+    sync_app = FastAPI()
+
+    @sync_app.post("/generate-guide")
+    def generate_guide_sync(request: main.GuideRequest):
+        start_dt, end_dt = main.parse_guide_dates(request)
+        main.initialize_services()
+        result = main.qa_chain.invoke({"query": main.build_guide_prompt(request, start_dt, end_dt)})
+        body = main.parse_model_output(result)
+        body = main.apply_activity_data(body, query_dynamo_sync(main.extract_principal_ids(body)))
+        tourist_guide_id = utils.generate_unique_id()
+        thread = threading.Thread(
+            target=utils.insert_itinerary_in_background,
+            args=(tourist_guide_id, request.clientId, body)
+        )
+        thread.start()
+        return {"touristGuideId": tourist_guide_id, "guideDetails": body}
+
+    return sync_app
+
+
+async def drive(asgi_app, total_requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one_request():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/generate-guide", json=GUIDE_REQUEST)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total_requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'elapsedSeconds': round(elapsed, 3),
+        'throughputRps': round(total_requests / elapsed, 2),
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--llm-latency', type=float, default=2.0, help="segundos por llamada al LLM")
+    parser.add_argument('--dynamo-latency', type=float, default=0.01, help="segundos por lectura/escritura")
+    parser.add_argument('--output', help="ruta opcional para guardar el resultado en JSON")
+    args = parser.parse_args()
+
+    install_fakes(args.llm_latency, args.dynamo_latency)
+
+    results = {}
+    # Silenciar los print del flujo de generación durante la medición
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['sync'] = asyncio.run(drive(build_sync_app(), args.requests, args.concurrency))
+        results['async'] = asyncio.run(drive(main.app, args.requests, args.concurrency))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,232 @@
+"""Compara calidad y latencia del planificador local contra el flujo del LLM.
+
+Uso:
+    python -m benchmarks.bench_planner_vs_llm --runs 20 --llm-latency 2
+    python -m benchmarks.bench_planner_vs_llm --live   # catálogo de DynamoDB y LLM reales
+
+Sin --live se usa un catálogo sintético y un LLM simulado que elige actividades del
+destino al azar (sin respetar horarios ni distancias), lo que sirve como línea base.
+Ambas salidas se evalúan con las mismas reglas del prompt: categorías, 5 km, 10 horas
+por día, horarios de apertura, actividades repetidas o inexistentes.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+from benchmarks.fakes import (
+    FakeQAChain,
+    SYNTHETIC_CATEGORIES,
+    SYNTHETIC_DESTINATIONS,
+    fake_itinerary_text,
+    install_offline_stubs,
+    percentile,
+    synthetic_catalog_items,
+)
+
+install_offline_stubs()
+
+import numpy as np  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app import config  # noqa: E402
+from app.activity_catalog import CatalogSnapshot, activity_catalog  # noqa: E402
+from app.destination_index import destination_index  # noqa: E402
+from app.geo_index import geo_index, haversine_km, item_coordinates  # noqa: E402
+from app.opening_hours import opening_hours_index  # noqa: E402
+from app.planner import MAX_DAY_MINUTES, TRAVEL_MINUTES, parse_duration_minutes, plan_itinerary  # noqa: E402
+from app.retrieval import normalize_text  # noqa: E402
+
+
+# Duraciones del catálogo que el puntaje de 10 horas por día depende de interpretar bien
+DURATION_CHECKS = {
+    '2 horas': 120,
+    '45 minutos': 45,
+    '2h 30min': 150,
+    '1 hora y 30 minutos': 90,
+    '1-2 horas': 120,
+    '90': 90,
+    '3': 90,
+    '': 90,
+    None: 90,
+}
+
+
+def check_duration_parsing():
+    failures = {
+        text: (parse_duration_minutes(text), expected)
+        for text, expected in DURATION_CHECKS.items()
+        if parse_duration_minutes(text) != expected
+    }
+    if failures:
+        raise SystemExit(f"parse_duration_minutes devuelve valores inesperados (obtenido, esperado): {failures}")
+
+
+def install_synthetic_catalog():
+    items = synthetic_catalog_items()
+    snapshot = CatalogSnapshot(items, version="synthetic", size_bytes=0)
+    activity_catalog._snapshot = snapshot
+    destination_index.rebuild(items)
+    geo_index.on_catalog_loaded(snapshot)
+    opening_hours_index.on_catalog_loaded(snapshot)
+    return snapshot
+
+
+def sample_requests(count, seed):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        _, city, _, _, _ = rng.choice(SYNTHETIC_DESTINATIONS)
+        start_day = rng.randint(1, 20)
+        days = rng.randint(1, 4)
+        requests.append(main.GuideRequest(
+            country='Peru',
+            city=city,
+            group='familia',
+            participants={'adultos': 2, 'niños': rng.randint(0, 3)},
+            activities=rng.sample(SYNTHETIC_CATEGORIES, rng.randint(1, 3)),
+            startDatetime=f"2024-10-{start_day:02d} 09:00:00",
+            endDatetime=f"2024-10-{start_day + days - 1:02d} 19:00:00",
+        ))
+    return requests
+
+
+def random_pick_chain(snapshot, request, start_dt, end_dt, latency, rng):
+    # LLM simulado: actividades del destino al azar, 3 por día
+    destination_items = [
+        item for item in snapshot.items if normalize_text(item.get('city', '')) == normalize_text(request.city)
+    ]
+    num_days = (end_dt.date() - start_dt.date()).days + 1
+    picked = [item['principalId'] for item in rng.sample(destination_items, min(len(destination_items), num_days * 3))]
+    chain = FakeQAChain(latency, picked)
+    chain.output = fake_itinerary_text(picked, days=num_days, per_day=3)
+    return chain
+
+
+def score_itinerary(body, snapshot, request, start_dt):
+    categories = {normalize_text(activity) for activity in request.activities}
+    seen = set()
+    # Franjas (actividad, día, inicio, fin) que se validan juntas contra los horarios compilados
+    slots = ([], [], [], [])
+    totals = {'days': 0, 'activities': 0, 'unknown': 0, 'duplicates': 0, 'inCategory': 0,
+              'open': 0, 'daysWithin5km': 0, 'daysWithin10h': 0, 'scoreSum': 0.0}
+
+    for offset, day in enumerate(body.get('itinerary', [])):
+        totals['days'] += 1
+        weekday = (start_dt.weekday() + offset) % 7
+        cursor = start_dt.hour * 60 + start_dt.minute if offset == 0 else 9 * 60
+        minutes = 0
+        points = []
+        for activity in day.get('activities', []):
+            totals['activities'] += 1
+            principal_id = activity.get('principalId')
+            if principal_id in seen:
+                totals['duplicates'] += 1
+            seen.add(principal_id)
+            item = snapshot.by_principal_id.get(principal_id)
+            if item is None:
+                totals['unknown'] += 1
+                continue
+            duration = parse_duration_minutes(item.get('estimated_time'))
+            if minutes:
+                cursor += TRAVEL_MINUTES
+            for values, value in zip(slots, (principal_id, weekday, cursor, cursor + duration)):
+                values.append(value)
+            cursor += duration
+            minutes += duration
+            if normalize_text(item.get('category', '')) in categories:
+                totals['inCategory'] += 1
+            totals['scoreSum'] += float(item.get('totalScore', 0))
+            coordinates = item_coordinates(item)
+            if coordinates:
+                points.append(coordinates)
+
+        lats = np.array([point[0] for point in points])
+        lngs = np.array([point[1] for point in points])
+        if all(haversine_km(lat, lng, lats, lngs).max() <= config.MAX_ACTIVITY_DISTANCE_KM for lat, lng in points):
+            totals['daysWithin5km'] += 1
+        if minutes <= MAX_DAY_MINUTES:
+            totals['daysWithin10h'] += 1
+
+    totals['open'] = int(opening_hours_index.open_during_pairs(*slots).sum()) if slots[0] else 0
+    return totals
+
+
+def summarize(latencies, scores):
+    latencies.sort()
+    totals = {key: sum(score[key] for score in scores) for key in scores[0]} if scores else {}
+    activities = totals.get('activities') or 1
+    days = totals.get('days') or 1
+    return {
+        'runs': len(latencies),
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'avgActivitiesPerDay': round(totals.get('activities', 0) / days, 2),
+        'categoryMatchRate': round(totals.get('inCategory', 0) / activities, 4),
+        'openRate': round(totals.get('open', 0) / activities, 4),
+        'unknownIdRate': round(totals.get('unknown', 0) / activities, 4),
+        'duplicateRate': round(totals.get('duplicates', 0) / activities, 4),
+        'daysWithin5kmRate': round(totals.get('daysWithin5km', 0) / days, 4),
+        'daysWithin10hRate': round(totals.get('daysWithin10h', 0) / days, 4),
+        'avgTotalScore': round(totals.get('scoreSum', 0.0) / activities, 3),
+    }
+
+
+async def run(args):
+    if args.live:
+        await main.run_blocking(activity_catalog.load)
+        await main.run_blocking(main.initialize_services)
+    else:
+        install_synthetic_catalog()
+    snapshot = activity_catalog.snapshot
+
+    rng = random.Random(args.seed)
+    results = {'planner': ([], []), 'llm': ([], [])}
+    for request in sample_requests(args.runs, args.seed):
+        start_dt, end_dt = main.parse_guide_dates(request)
+
+        started = time.perf_counter()
+        planned = plan_itinerary(request, start_dt, end_dt) or {'itinerary': []}
+        results['planner'][0].append(time.perf_counter() - started)
+        results['planner'][1].append(score_itinerary(planned, snapshot, request, start_dt))
+
+        if not args.live:
+            main.qa_chain = random_pick_chain(snapshot, request, start_dt, end_dt, args.llm_latency, rng)
+        started = time.perf_counter()
+        try:
+            generated = await main.generate_itinerary_with_llm(request, start_dt, end_dt)
+        except Exception as e:
+            print(f"Error en el flujo del LLM: {e!r}")
+            generated = {'itinerary': []}
+        results['llm'][0].append(time.perf_counter() - started)
+        results['llm'][1].append(score_itinerary(generated, snapshot, request, start_dt))
+
+    return {name: summarize(latencies, scores) for name, (latencies, scores) in results.items()}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--llm-latency', type=float, default=2.0, help="segundos por llamada al LLM simulado")
+    parser.add_argument('--live', action='store_true', help="usar DynamoDB, Pinecone y OpenAI reales")
+    parser.add_argument('--output', help="ruta opcional para guardar el resultado en JSON")
+    args = parser.parse_args()
+
+    check_duration_parsing()
+    # Silenciar los print del flujo de generación durante la medición
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,251 @@
+"""Suite de carga offline: /generate-guide y todas las rutas de /v1/tutur/info.
+
+Uso:
+    python -m benchmarks.bench_suite --requests 200 --concurrency 50 --output bench.json
+    python -m benchmarks.bench_suite --scenarios generate-guide --llm-latency 1.5
+    python -m benchmarks.bench_suite --no-catalog   # rutas servidas desde DynamoDB (fake)
+
+Todas las dependencias externas se sustituyen por dobles locales deterministas:
+DynamoDB por una tabla tutur-activities en memoria con un catálogo sintético, Pinecone por
+el vector store local, OpenAI por un modelo de chat falso con latencia configurable y
+Postgres por una secuencia y una tabla en proceso (o un Postgres local con --postgres-host).
+El resultado (throughput y p50/p95/p99 por escenario) se guarda en JSON para comparar commits.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.fakes import (
+    FakeDynamoDB,
+    InProcessPostgres,
+    SYNTHETIC_CATEGORIES,
+    SYNTHETIC_DESTINATIONS,
+    fake_chat_model_factory,
+    install_offline_stubs,
+    percentile,
+    synthetic_catalog_items,
+)
+
+INFO_PREFIX = "/v1/tutur/info"
+
+
+def configure_environment(args):
+    # La configuración de app.config se lee al importar: se fija antes de cargar la aplicación
+    os.environ['TUTUR_VECTOR_STORE'] = 'local'
+    os.environ['TUTUR_GUIDE_CACHE_ENABLED'] = '1' if args.guide_cache else '0'
+    os.environ['TUTUR_CATALOG_ENABLED'] = '0' if args.no_catalog else '1'
+    os.environ['TUTUR_DESTINATION_INDEX_PATH'] = ''
+    os.environ['TUTUR_EMBEDDING_CACHE_DISK_PATH'] = ''
+    if args.planner_mode:
+        os.environ['TUTUR_PLANNER_MODE'] = args.planner_mode
+
+
+def load_app(args, dynamodb):
+    import psycopg2
+
+    real_connect = psycopg2.connect
+    install_offline_stubs(dynamodb=dynamodb)
+
+    import app.main as main
+    import app.utils as utils
+    from app.id_allocator import itinerary_id_allocator
+    from app.persistence_queue import itinerary_write_queue
+    from app.secrets import secret_cache
+
+    main.ChatOpenAI = fake_chat_model_factory(args.llm_latency)
+
+    if args.postgres_host:
+        # Postgres local con el esquema de resources/databse.sql
+        psycopg2.connect = real_connect
+        main.db.host = args.postgres_host
+        main.db.database = args.postgres_db
+        credentials = {'username': args.postgres_user, 'password': args.postgres_password}
+        secret_cache._fetch = lambda secret_name: (credentials, 'local')
+        return main, None
+
+    postgres = InProcessPostgres(args.postgres_latency)
+    main.db.warm = lambda: None
+    utils.generate_unique_id = lambda: f"24281{postgres.next_block(1)[0]:011d}"
+    utils.insert_itinerary_in_background = lambda *row: postgres.write([row])
+    if itinerary_id_allocator is not None:
+        itinerary_id_allocator._fetch_block = lambda: postgres.next_block(itinerary_id_allocator.block_size)
+    if itinerary_write_queue is not None:
+        itinerary_write_queue.writer = postgres.write
+    return main, postgres
+
+
+def build_scenarios(items):
+    principal_ids = [item['principalId'] for item in items]
+
+    def guide_request(rng):
+        _, city, _, _, _ = rng.choice(SYNTHETIC_DESTINATIONS)
+        start_day = rng.randint(1, 20)
+        return {
+            'country': 'Peru',
+            'city': city,
+            'group': 'familia',
+            'participants': {'adultos': 2, 'niños': rng.randint(0, 3)},
+            'activities': rng.sample(SYNTHETIC_CATEGORIES, rng.randint(1, 3)),
+            'startDatetime': f"2024-10-{start_day:02d} 09:00:00",
+            'endDatetime': f"2024-10-{start_day + rng.randint(0, 3):02d} 19:00:00",
+        }
+
+    def nearby_params(rng):
+        _, _, _, lat, lng = rng.choice(SYNTHETIC_DESTINATIONS)
+        return {'lat': round(lat + rng.uniform(-0.05, 0.05), 5), 'lng': round(lng + rng.uniform(-0.05, 0.05), 5),
+                'radiusKm': 3, 'limit': 20}
+
+    # nombre -> (método, ruta, generador de {json|params})
+    return {
+        'generate-guide': ('POST', "/generate-guide", lambda rng: {'json': guide_request(rng)}),
+        'country-codes': ('GET', f"{INFO_PREFIX}/country-codes", lambda rng: {}),
+        'all-destinations': ('GET', f"{INFO_PREFIX}/all-destinations", lambda rng: {}),
+        'all-activities': ('GET', f"{INFO_PREFIX}/all-activities", lambda rng: {'params': {'limit': 100}}),
+        'activities-by-destination': (
+            'POST', f"{INFO_PREFIX}/activities-by-destination",
+            lambda rng: {'json': {'destinationId': rng.choice(SYNTHETIC_DESTINATIONS)[0]}, 'params': {'limit': 50}}
+        ),
+        'nearby-activities': ('GET', f"{INFO_PREFIX}/nearby-activities", lambda rng: {'params': nearby_params(rng)}),
+        'get-activity': (
+            'POST', f"{INFO_PREFIX}/get-activity", lambda rng: {'json': {'principalId': rng.choice(principal_ids)}}
+        ),
+        'activities-by-principal-ids': (
+            'POST', f"{INFO_PREFIX}/activities-by-principal-ids",
+            lambda rng: {'json': {'principalIds': rng.sample(principal_ids, 20)}}
+        ),
+    }
+
+
+def parse_server_timing(header):
+    stages = {}
+    for entry in (header or '').split(','):
+        name, _, duration = entry.strip().partition(';dur=')
+        if duration:
+            stages[name] = float(duration)
+    return stages
+
+
+async def run_scenario(client, scenario, total_requests, concurrency, seed):
+    method, path, make_kwargs = scenario
+    rng = random.Random(seed)
+    requests = [make_kwargs(rng) for _ in range(total_requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+    stages = {}
+
+    async def one_request(kwargs):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            for name, duration in parse_server_timing(response.headers.get('server-timing')).items():
+                stages.setdefault(name, []).append(duration)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request(kwargs) for kwargs in requests))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total_requests,
+        'concurrency': concurrency,
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'statusCodes': {str(status): count for status, count in sorted(statuses.items())},
+        'elapsedSeconds': round(elapsed, 3),
+        'throughputRps': round(total_requests / elapsed, 2),
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 2),
+        # Etapas de Server-Timing (p50 por etapa) para ver en qué se va la latencia
+        'stagesP50Ms': {name: round(percentile(sorted(values), 0.50), 2) for name, values in sorted(stages.items())},
+    }
+
+
+async def run(args, main, dynamodb):
+    from app.startup import startup
+
+    scenarios = build_scenarios(dynamodb.items)
+    selected = args.scenarios.split(',') if args.scenarios else list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        raise SystemExit(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    results = {}
+    async with main.lifespan(main.app):
+        while not startup.ready:
+            await asyncio.sleep(0.01)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for index, name in enumerate(selected):
+                results[name] = await run_scenario(
+                    client, scenarios[name], args.requests, args.concurrency, args.seed + index
+                )
+    return startup.status(), results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help="peticiones por escenario")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--scenarios', help="lista separada por comas (por defecto todos)")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--catalog-size', type=int, default=300, help="actividades por destino sintético")
+    parser.add_argument('--llm-latency', type=float, default=2.0, help="segundos por llamada al LLM falso")
+    parser.add_argument('--dynamo-latency', type=float, default=0.005, help="segundos por llamada a DynamoDB")
+    parser.add_argument('--postgres-latency', type=float, default=0.002, help="segundos por operación en Postgres")
+    parser.add_argument('--no-catalog', action='store_true', help="desactivar el catálogo en memoria")
+    parser.add_argument('--guide-cache', action='store_true', help="activar la caché de itinerarios")
+    parser.add_argument('--planner-mode', choices=['off', 'fallback', 'primary'])
+    parser.add_argument('--postgres-host', help="usar un Postgres local en lugar del fake en proceso")
+    parser.add_argument('--postgres-db', default='tutur_itinerary')
+    parser.add_argument('--postgres-user', default='postgres')
+    parser.add_argument('--postgres-password', default='')
+    parser.add_argument('--output', help="ruta opcional para guardar el resultado en JSON")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    dynamodb = FakeDynamoDB(synthetic_catalog_items(args.catalog_size, args.seed), args.dynamo_latency)
+
+    # Silenciar los print del servicio durante la medición
+    with contextlib.redirect_stdout(io.StringIO()):
+        main, _ = load_app(args, dynamodb)
+        startup_status, results = asyncio.run(run(args, main, dynamodb))
+
+    report = {
+        'meta': {
+            'gitCommit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key != 'postgres_password'},
+        },
+        'startup': startup_status,
+        'dynamodbCalls': dict(dynamodb.calls),
+        'scenarios': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main_cli()
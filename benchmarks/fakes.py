@@ -0,0 +1,332 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+
+def fake_get_secret(secret_name):
+    return {'api-key': 'offline', 'username': 'offline', 'password': 'offline'}
+
+
+def fake_connect(*args, **kwargs):
+    # Sustituto de psycopg2.connect: las conexiones reales nunca se usan
+    raise RuntimeError("Postgres no está disponible en el entorno de benchmark")
+
+
+def install_offline_stubs(dynamodb=None):
+    # Debe ejecutarse antes de importar app.main: los clientes de AWS y Postgres no deben salir a la red.
+    # Con dynamodb (FakeDynamoDB) los clientes y recursos de DynamoDB que crean los módulos usan la tabla en memoria
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'offline')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'offline')
+
+    import boto3
+    import psycopg2
+    import app.secrets
+
+    app.secrets.secret_cache._fetch = lambda secret_name: (fake_get_secret(secret_name), 'offline')
+    psycopg2.connect = fake_connect
+
+    if dynamodb is not None:
+        real_client, real_resource = boto3.client, boto3.resource
+
+        def client(service_name, *args, **kwargs):
+            return dynamodb.client() if service_name == 'dynamodb' else real_client(service_name, *args, **kwargs)
+
+        def resource(service_name, *args, **kwargs):
+            return dynamodb.resource() if service_name == 'dynamodb' else real_resource(service_name, *args, **kwargs)
+
+        boto3.client = client
+        boto3.resource = resource
+
+
+def fake_itinerary_text(principal_ids, days=2, per_day=3):
+    itinerary = []
+    for day in range(days):
+        chunk = principal_ids[day * per_day:(day + 1) * per_day]
+        itinerary.append({
+            'day': day + 1,
+            'activities': [{'principalId': pid, 'name': f"Actividad {pid}"} for pid in chunk]
+        })
+    return "```json\n" + json.dumps({'itinerary': itinerary}) + "\n```"
+
+
+class FakeQAChain:
+    # Imita RetrievalQA con una latencia fija para el LLM
+    def __init__(self, latency_seconds, principal_ids):
+        self.latency_seconds = latency_seconds
+        self.output = fake_itinerary_text(principal_ids)
+
+    def invoke(self, inputs, config=None):
+        time.sleep(self.latency_seconds)
+        return {'result': self.output, 'source_documents': []}
+
+    async def ainvoke(self, inputs, config=None):
+        await asyncio.sleep(self.latency_seconds)
+        return {'result': self.output, 'source_documents': []}
+
+
+def fake_activity_items(principal_ids):
+    # Items con el formato del recurso de DynamoDB (como los devuelve el catálogo)
+    return {
+        pid: {
+            'principalId': pid,
+            'name': f"Actividad {pid}",
+            'description': f"Descripción {pid}",
+            'location_lat': -12.05,
+            'location_lng': -77.04,
+            'totalScore': 4.5,
+            'reviewsCount': 120,
+            'estimated_time': '2 horas',
+            'opening_hours': '09:00 - 18:00',
+            's3Images': {},
+            'destinationId': 'LIM',
+            'city': 'Lima'
+        }
+        for pid in principal_ids
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+SYNTHETIC_DESTINATIONS = [
+    ('LIM', 'Lima', 'PE', -12.05, -77.04),
+    ('CUS', 'Cusco', 'PE', -13.52, -71.97),
+]
+SYNTHETIC_CATEGORIES = ['museos', 'parques', 'historia', 'gastronomia']
+SYNTHETIC_HOURS = ['09:00 - 18:00', '10:00 - 22:00', '08:00 - 13:00', '15:00 - 20:00', 'Abierto 24 horas']
+
+
+def synthetic_catalog_items(per_destination=300, seed=7):
+    # Catálogo reproducible con coordenadas dispersas (~10 km), horarios y duraciones variadas
+    rng = random.Random(seed)
+    items = []
+    for destination_id, city, country_code, lat, lng in SYNTHETIC_DESTINATIONS:
+        for index in range(per_destination):
+            items.append({
+                'principalId': f"{destination_id}-{index:04d}",
+                'name': f"Actividad {destination_id} {index}",
+                'description': f"Descripción de la actividad {index} en {city}",
+                'destinationId': destination_id,
+                'city': city,
+                'countryCode': country_code,
+                'category': rng.choice(SYNTHETIC_CATEGORIES),
+                'location_lat': Decimal(str(round(lat + rng.uniform(-0.09, 0.09), 6))),
+                'location_lng': Decimal(str(round(lng + rng.uniform(-0.09, 0.09), 6))),
+                'totalScore': Decimal(str(round(rng.uniform(3.0, 5.0), 1))),
+                'reviewsCount': rng.randint(5, 5000),
+                'estimated_time': rng.choice(['1 hora', '1.5 horas', '2 horas', '3 horas', '45 minutos']),
+                'opening_hours': rng.choice(SYNTHETIC_HOURS),
+                's3Images': {},
+            })
+    return items
+
+
+class FakeDynamoDB:
+    # Tabla tutur-activities en memoria con el subconjunto de la API de boto3 que usa el servicio:
+    # scan (con segmentos), query por principalId o DestinationIdIndex, batch_get_item y proyecciones
+    def __init__(self, items, latency_seconds=0.0, table_name='tutur-activities'):
+        from boto3.dynamodb.types import TypeSerializer
+
+        self.table_name = table_name
+        self.latency_seconds = latency_seconds
+        self.items = sorted(items, key=lambda item: item['principalId'])
+        self.by_principal_id = {item['principalId']: item for item in self.items}
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self._serializer = TypeSerializer()
+
+    def client(self):
+        return _FakeDynamoClient(self)
+
+    def resource(self):
+        return _FakeDynamoResource(self)
+
+    def _call(self, operation):
+        with self._calls_lock:
+            self.calls[operation] += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def _project(self, item, params):
+        expression = params.get('ProjectionExpression')
+        if not expression:
+            return dict(item)
+        names = params.get('ExpressionAttributeNames', {})
+        attributes = [names.get(part.strip(), part.strip()) for part in expression.split(',')]
+        return {attribute: item[attribute] for attribute in attributes if attribute in item}
+
+    def _page(self, items, params, low_level):
+        start_key = params.get('ExclusiveStartKey')
+        if start_key:
+            after = start_key['principalId']
+            after = after['S'] if low_level else after
+            items = [item for item in items if item['principalId'] > after]
+        limit = params.get('Limit')
+        page = items[:limit] if limit else items
+        response = {'Items': [self._project(item, params) for item in page], 'Count': len(page)}
+        if limit and len(items) > limit:
+            last = page[-1]
+            key = {'principalId': last['principalId']}
+            if params.get('IndexName'):
+                key['destinationId'] = last.get('destinationId')
+            response['LastEvaluatedKey'] = self.serialize(key) if low_level else key
+        if params.get('ReturnConsumedCapacity'):
+            response['ConsumedCapacity'] = {'TableName': self.table_name, 'CapacityUnits': max(1, len(page)) * 0.5}
+        return response
+
+    def serialize(self, item):
+        return {key: self._serializer.serialize(value) for key, value in item.items()}
+
+    def query_items(self, attribute, value):
+        if attribute == 'principalId':
+            item = self.by_principal_id.get(value)
+            return [item] if item else []
+        return [item for item in self.items if item.get(attribute) == value]
+
+
+class _FakeDynamoClient:
+    def __init__(self, database):
+        self.db = database
+
+    def scan(self, **params):
+        self.db._call('Scan')
+        segment, total = params.get('Segment', 0), params.get('TotalSegments', 1)
+        items = [item for index, item in enumerate(self.db.items) if index % total == segment]
+        response = self.db._page(items, params, low_level=True)
+        response['Items'] = [self.db.serialize(item) for item in response['Items']]
+        if 'ConsumedCapacity' in response:
+            response['ConsumedCapacity'] = [response['ConsumedCapacity']]
+        return response
+
+    def query(self, **params):
+        # Solo la forma "atributo = :valor" que usa el calentamiento del arranque
+        self.db._call('Query')
+        attribute, placeholder = [part.strip() for part in params['KeyConditionExpression'].split('=')]
+        value = list(params['ExpressionAttributeValues'][placeholder].values())[0]
+        response = self.db._page(self.db.query_items(attribute, value), params, low_level=True)
+        response['Items'] = [self.db.serialize(item) for item in response['Items']]
+        return response
+
+    def batch_get_item(self, RequestItems, ReturnConsumedCapacity=None):
+        self.db._call('BatchGetItem')
+        responses = {}
+        for table_name, table_request in RequestItems.items():
+            found = []
+            for key in table_request['Keys']:
+                item = self.db.by_principal_id.get(key['principalId']['S'])
+                if item is not None:
+                    found.append(self.db.serialize(self.db._project(item, table_request)))
+            responses[table_name] = found
+        response = {'Responses': responses, 'UnprocessedKeys': {}}
+        if ReturnConsumedCapacity:
+            units = sum(len(found) for found in responses.values()) * 0.5
+            response['ConsumedCapacity'] = [{'TableName': self.db.table_name, 'CapacityUnits': units}]
+        return response
+
+
+class _FakeDynamoTable:
+    def __init__(self, database, name):
+        self.db = database
+        self.name = name
+        self.meta = type('Meta', (), {'client': _FakeDynamoClient(database)})()
+
+    def scan(self, **params):
+        self.db._call('Scan')
+        return self.db._page(self.db.items, params, low_level=False)
+
+    def query(self, **params):
+        self.db._call('Query')
+        # Key('atributo').eq(valor) de boto3.dynamodb.conditions
+        key, value = params['KeyConditionExpression'].get_expression()['values']
+        return self.db._page(self.db.query_items(key.name, value), params, low_level=False)
+
+
+class _FakeDynamoResource:
+    def __init__(self, database):
+        self.db = database
+
+    def Table(self, name):
+        return _FakeDynamoTable(self.db, name)
+
+
+class InProcessPostgres:
+    # Secuencia de IDs y tabla iti.client_itineraries en memoria, con latencia por operación
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.rows = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_block(self, size):
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            first = self._sequence + 1
+            self._sequence += size
+        return list(range(first, first + size))
+
+    def write(self, rows):
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            for itinerary_id, client_id, client_itinerary in rows:
+                self.rows[itinerary_id] = (client_id, client_itinerary)
+
+
+_PROMPT_DATES = re.compile(r'entre (\d{4}-\d{2}-\d{2}) [\d:]+ y (\d{4}-\d{2}-\d{2})')
+_PROMPT_IDS = re.compile(r'principalId: (\S+)')
+
+
+def fake_itinerary_for_prompt(prompt, per_day=3):
+    # Respuesta determinista a partir del prompt: las actividades recuperadas, repartidas por día
+    dates = _PROMPT_DATES.search(prompt)
+    days = 1
+    if dates:
+        start, end = (datetime.strptime(value, '%Y-%m-%d') for value in dates.groups())
+        days = max(1, (end - start).days + 1)
+    principal_ids = list(dict.fromkeys(_PROMPT_IDS.findall(prompt)))
+    return fake_itinerary_text(principal_ids, days=days, per_day=per_day)
+
+
+def fake_chat_model_factory(latency_seconds):
+    # Sustituto de ChatOpenAI: mismo constructor, sin red y con latencia configurable
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class FakeItineraryChatModel(BaseChatModel):
+        latency_seconds: float = 0.0
+
+        @property
+        def _llm_type(self):
+            return 'fake-itinerary'
+
+        def _result(self, messages):
+            prompt = '\n'.join(str(message.content) for message in messages)
+            text = fake_itinerary_for_prompt(prompt)
+            usage = {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}
+            usage['total_tokens'] = usage['input_tokens'] + usage['output_tokens']
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.latency_seconds)
+            return self._result(messages)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(self.latency_seconds)
+            return self._result(messages)
+
+    def factory(**kwargs):
+        return FakeItineraryChatModel(latency_seconds=latency_seconds, callbacks=kwargs.get('callbacks'))
+
+    return factory
@@ -27,3 +27,19 @@ CREATE TABLE iti.client_itineraries (
     client_itinerary JSONB NOT NULL,   -- Itinerario en formato JSON
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP -- Timestamp de creación
 );
+
+-- Listado por cliente (/clients/{clientId}/itineraries): paginación keyset sobre
+-- (client_id, created_at, id) en el mismo orden que el ORDER BY, sin OFFSET ni sort
+CREATE INDEX idx_client_itineraries_client_created
+    ON iti.client_itineraries (client_id, created_at DESC, id DESC);
+
+-- Trabajos de generación de guías (/generate-guide/jobs) cuando TUTUR_GUIDE_JOB_STORE=postgres
+CREATE TABLE iti.guide_jobs (
+    job_id VARCHAR(32) PRIMARY KEY,           -- ID del trabajo
+    status VARCHAR(16) NOT NULL,              -- queued, running, succeeded, failed
+    request JSONB NOT NULL,                   -- GuideRequest original
+    result JSONB,                             -- Respuesta de /generate-guide
+    error JSONB,                              -- Estado y detalle del error
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);